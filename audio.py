@@ -0,0 +1,190 @@
+# audio.py
+import os, re, json, math, threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from compcache import atomic_write_text
+from jobs import Job, run_ffmpeg
+from metadata import MediaInfo
+
+# ============================================================
+# Per-clip audio for size-targeted encodes: copy, re-encode, mix or drop
+# ============================================================
+TRACKS = os.environ.get("CLIPVIEWER_AUDIO_TRACKS", "mix")     # mix | loudest | first
+COPY_CODECS = {"aac"}           # go into MP4 untouched
+COPY_SLACK  = 1.1               # copy when the source rate is within 10% of what we'd encode at
+SILENT_DB   = -60.0             # max_volume at or below this: nothing worth hearing on the track
+FLOOR_DB    = -200.0            # stands in for -inf (digital silence) in the cache
+AUDIO_SHARE = 0.2               # most of the total bit budget audio may take
+LADDER      = [(96, 2), (80, 2), (64, 2), (48, 1), (32, 1)]    # (kbps, channels), best first
+MONO_KBPS   = 64                # enough for a mono source (mic-only captures)
+MAX_TRACKS  = 4                 # analysed / mixed per clip
+MAX_ENTRIES = 5000
+ANALYSIS_SPAN = 0.03            # progress bar share of the silence pass (audio-only decode)
+
+_LEVEL = re.compile(r"Parsed_volumedetect_(\d+) @ [^\]]*\] (mean|max)_volume: (-?inf|-?[\d.]+) dB")
+
+
+@dataclass(frozen=True)
+class AudioPlan:
+    tracks: tuple[int, ...] = ()        # audio stream numbers (0:a:N) in the output; () = no audio
+    copy: bool = False
+    kbps: int = 0                       # what audio takes out of the size budget
+    channels: int | None = None         # downmix to this many (None = as the source)
+    dropped: int = 0                    # silent tracks left out
+
+    def args(self, video: str | None = "0:v:0", encoder: str = "aac") -> list[str]:
+        """Output args mapping `video` (None: audio-only output) plus the planned audio."""
+        out = ["-map", video] if video else ["-vn"]
+        if not self.tracks:
+            return out + ["-an"]
+        mix = self.mix_filter("[aout]")
+        if mix:
+            out += ["-filter_complex", mix, "-map", "[aout]"]
+        else:
+            out += ["-map", f"0:a:{self.tracks[0]}?"]
+        return out + self.codec_args(encoder)
+
+    def mix_filter(self, out: str) -> str | None:
+        """filter_complex chain summing the tracks into `out` (None for a single track)."""
+        n = len(self.tracks)
+        if n < 2:
+            return None
+        # amix scales every input by 1/n; restore the levels and limit the sum instead
+        return (f"{''.join(f'[0:a:{t}]' for t in self.tracks)}"
+                f"amix=inputs={n}:duration=longest:dropout_transition=0,volume={n},alimiter=limit=0.95{out}")
+
+    def codec_args(self, encoder: str = "aac") -> list[str]:
+        if not self.tracks:
+            return ["-an"]
+        if self.copy and encoder == "aac":
+            return ["-c:a", "copy"]
+        args = ["-c:a", encoder, "-b:a", f"{self.kbps}k"]
+        if self.channels:
+            args += ["-ac", str(self.channels)]
+        return args
+
+    def at_floor(self) -> "AudioPlan":
+        """The same tracks re-encoded at the bottom of LADDER (for clips too long for the planned rate)."""
+        if not self.tracks:
+            return self
+        kbps, channels = LADDER[-1]
+        return AudioPlan(self.tracks, False, min(self.kbps, kbps), channels, self.dropped)
+
+    def describe(self) -> str:
+        if not self.tracks:
+            return "no audio (silent)" if self.dropped else "no audio"
+        text = f"audio copy {self.kbps}k" if self.copy else f"audio {self.kbps}k"
+        if self.channels == 1:
+            text += " mono"
+        if len(self.tracks) > 1:
+            text += f", {len(self.tracks)} tracks mixed"
+        if self.dropped:
+            text += f", {self.dropped} silent dropped"
+        return text
+
+
+class AudioPlanner:
+    """
+    Picks the audio for one encode from the probed streams and a volumedetect
+    pass over the audio alone (all tracks in one ffmpeg run, cached per clip):
+    silent tracks are dropped, several live ones mixed or one picked
+    (CLIPVIEWER_AUDIO_TRACKS), AAC that already fits is copied, and long clips
+    get a lower rate or mono. Whatever audio doesn't take is left to video.
+    """
+
+    def __init__(self, ffmpeg: str, path: Path, tracks: str = TRACKS):
+        self.ffmpeg = ffmpeg
+        self.path = path
+        self.tracks = tracks if tracks in ("mix", "loudest", "first") else "mix"
+        self._lock = threading.Lock()
+        try:
+            self._cache: dict[str, list[list[float]]] = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._cache = {}
+
+    @staticmethod
+    def _key(info: MediaInfo) -> str:
+        return f"{os.path.normcase(str(info.path))}|{info.size}|{info.mtime_ns}"
+
+    def levels(self, info: MediaInfo) -> list[tuple[float, float]] | None:
+        """Cached (mean, max) dB per analysed track, None if the clip hasn't been analysed."""
+        with self._lock:
+            hit = self._cache.get(self._key(info))
+        return [(mean, peak) for mean, peak in hit] if hit is not None else None
+
+    def analyze(self, info: MediaInfo, job: Job | None = None) -> list[tuple[float, float]]:
+        hit = self.levels(info)
+        if hit is not None or not info.audio:
+            return hit or []
+        n = min(len(info.audio), MAX_TRACKS)
+        graph = ";".join(f"[0:a:{i}]volumedetect[v{i}]" for i in range(n))
+        cmd = [self.ffmpeg, "-y", "-i", str(info.path), "-filter_complex", graph]
+        for i in range(n):
+            cmd += ["-map", f"[v{i}]", "-f", "null", "-"]
+        log: list[str] = []
+        if job is not None:
+            job.set_span(0.0, ANALYSIS_SPAN)
+        run_ffmpeg(cmd, job, info.duration, log=log)
+
+        found: dict[int, dict[str, float]] = {}
+        for m in _LEVEL.finditer("".join(log)):
+            found.setdefault(int(m.group(1)), {})[m.group(2)] = max(FLOOR_DB, float(m.group(3)))
+        # a track that never produced samples reports nothing: treat it as silent
+        levels = [(found.get(i, {}).get("mean", FLOOR_DB), found.get(i, {}).get("max", FLOOR_DB))
+                  for i in range(n)]
+        self._store(self._key(info), levels)
+        return levels
+
+    def plan(self, info: MediaInfo, target_bytes: int) -> AudioPlan:
+        """Cheap: uses the cached analysis if there is one, else assumes every track is live."""
+        streams = info.audio[:MAX_TRACKS]
+        if not streams:
+            return AudioPlan()
+        levels = self.levels(info)
+        live = [i for i in range(len(streams)) if levels is None or i >= len(levels) or levels[i][1] > SILENT_DB]
+        dropped = len(streams) - len(live)
+        if not live:
+            return AudioPlan(dropped=dropped)
+        if len(live) > 1 and self.tracks == "loudest" and levels is not None:
+            live = [max(live, key=lambda i: levels[i][0])]
+        elif len(live) > 1 and self.tracks != "mix":
+            live = live[:1]
+
+        picked = [streams[i] for i in live]
+        kbps, channels = _rate(info.duration, target_bytes)
+        src_channels = max(s.channels or 2 for s in picked)
+        if len(picked) == 1:
+            s = picked[0]
+            if (s.codec in COPY_CODECS and s.bit_rate and src_channels <= channels
+                    and s.bit_rate <= kbps * 1000 * COPY_SLACK):
+                return AudioPlan(tuple(live), True, math.ceil(s.bit_rate / 1000), dropped=dropped)
+            if s.bit_rate:      # never spend more than the source had
+                kbps = max(LADDER[-1][0], min(kbps, math.ceil(s.bit_rate / 1000)))
+        if src_channels == 1:
+            kbps = min(kbps, MONO_KBPS)
+        return AudioPlan(tuple(live), False, kbps, channels if src_channels > channels else None, dropped)
+
+    # ---------- Internals ----------
+    def _store(self, key: str, levels: list[tuple[float, float]]):
+        with self._lock:
+            self._cache[key] = [list(lv) for lv in levels]
+            while len(self._cache) > MAX_ENTRIES:
+                self._cache.pop(next(iter(self._cache)))
+            text = json.dumps(self._cache)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self.path, text)
+        except OSError:
+            pass
+
+
+def _rate(duration: float | None, target_bytes: int) -> tuple[int, int]:
+    """Best LADDER step within AUDIO_SHARE of the clip's total bitrate (the last one at worst)."""
+    if not duration:
+        return LADDER[0]
+    total_kbps = target_bytes * 8 / 1000 / duration
+    for kbps, channels in LADDER:
+        if kbps <= total_kbps * AUDIO_SHARE:
+            return kbps, channels
+    return LADDER[-1]
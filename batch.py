@@ -0,0 +1,164 @@
+# batch.py
+import os, sys, time, shutil, argparse, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from bootstrap import load_layout
+from compcache import app_cache_dir
+from engine import DISCORD_SOFT_LIMIT, OUTPUT_SUFFIX, VIDEO_EXTS, DiscordEngine
+from jobs import Job, JobCancelled
+from planner import MODES
+import tracing
+
+# ============================================================
+# Headless bulk compression:  main.py batch <folder|files...>
+# ============================================================
+THREADS_PER_JOB = 4     # x264 scales well up to ~4 threads per encode
+
+
+def cpu_budget(cpus: int | None, jobs: int | None, threads: int | None) -> tuple[int, int]:
+    """(concurrent encodes, ffmpeg -threads each) so that jobs × threads ≈ the CPU budget."""
+    cpus = max(1, cpus or os.cpu_count() or 1)
+    if jobs and threads:
+        return jobs, threads
+    if jobs:
+        return jobs, max(1, cpus // jobs)
+    threads = max(1, min(threads or THREADS_PER_JOB, cpus))
+    return max(1, cpus // threads), threads
+
+
+def collect(paths: list[str]) -> list[Path]:
+    files: list[Path] = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            files += sorted(f for f in p.iterdir() if f.is_file() and f.suffix.lower() in VIDEO_EXTS)
+        elif p.is_file():
+            files.append(p)
+        else:
+            print(f"skip {p}: not found")
+    # never feed our own outputs back in
+    return list(dict.fromkeys(f.resolve() for f in files if not f.name.endswith(OUTPUT_SUFFIX)))
+
+
+def output_for(src: Path, out_dir: Path | None) -> Path:
+    return (out_dir or src.parent / "discord") / (src.stem + OUTPUT_SUFFIX)
+
+
+def is_done(src: Path, out: Path) -> bool:
+    """Finished by an earlier run (outputs only appear complete, via rename)."""
+    try:
+        return out.stat().st_mtime_ns >= src.stat().st_mtime_ns
+    except OSError:
+        return False
+
+
+def publish(result: Path, out: Path):
+    """Hard-link (or copy) the cached encode to `out`, atomically."""
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(out.name + ".part")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(result, tmp)
+    except OSError:
+        shutil.copyfile(result, tmp)
+    os.replace(tmp, out)
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(prog="main.py batch", description="Compress clips over the Discord size limit.")
+    ap.add_argument("paths", nargs="+", help="folders and/or video files")
+    ap.add_argument("-o", "--out", type=Path, help="output folder (default: <clip folder>/discord)")
+    ap.add_argument("--cpus", type=int, help="CPU budget (default: all cores)")
+    ap.add_argument("-j", "--jobs", type=int, help="concurrent encodes")
+    ap.add_argument("-t", "--threads", type=int, help="ffmpeg threads per encode")
+    ap.add_argument("--priority", choices=list(MODES), default="quality",
+                    help="encode time budget per clip (default: quality, no deadline)")
+    ap.add_argument("--idle", action="store_true", help="run ffmpeg at idle priority")
+    ap.add_argument("--force", action="store_true", help="redo clips that already have an output")
+    return ap.parse_args(argv)
+
+
+def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    layout = load_layout()
+    jobs_n, threads = cpu_budget(args.cpus, args.jobs, args.threads)
+    files = collect(args.paths)
+
+    todo: list[tuple[Path, Path, int]] = []
+    small = resumed = 0
+    for src in files:
+        size = src.stat().st_size
+        out = output_for(src, args.out)
+        if size <= DISCORD_SOFT_LIMIT:
+            small += 1
+        elif not args.force and is_done(src, out):
+            resumed += 1
+        else:
+            todo.append((src, out, size))
+    print(f"{len(files)} clips: {len(todo)} to compress, {small} already under the limit, "
+          f"{resumed} done earlier — {jobs_n} encodes × {threads} threads")
+    if not todo:
+        return 0
+
+    engine = DiscordEngine(layout.ffmpeg, layout.ffprobe, encode_mode="single", threads=threads)
+    engine.priority = args.priority
+    lock = threading.Lock()
+    running: list[Job] = []
+    done = failed = 0
+    in_bytes = out_bytes = 0
+    t0 = time.monotonic()
+
+    def work(src: Path, out: Path) -> Path:
+        job = Job(("batch", str(src)), src.name)
+        job.set_background(args.idle)
+        with lock:
+            running.append(job)
+        try:
+            result = engine.compress(src, job)
+            publish(result, out)
+            return result
+        finally:
+            with lock:
+                running.remove(job)
+
+    pool = ThreadPoolExecutor(max_workers=jobs_n, thread_name_prefix="batch")
+    futures = {pool.submit(work, src, out): (src, out, size) for src, out, size in todo}
+    try:
+        for f in as_completed(futures):
+            src, out, size = futures[f]
+            n = done + failed + 1
+            try:
+                f.result()
+                done += 1
+                in_bytes += size
+                out_bytes += out.stat().st_size
+                report = engine.reports.get(str(f.result()))
+                print(f"[{n}/{len(todo)}] {src.name}: {size / 1e6:.1f} MB -> {out.stat().st_size / 1e6:.1f} MB"
+                      + (f"  ({report.summary()})" if report is not None else ""))
+            except JobCancelled:
+                failed += 1
+            except Exception as e:
+                failed += 1
+                print(f"[{n}/{len(todo)}] {src.name}: FAILED: {e}")
+    except KeyboardInterrupt:
+        print("Interrupted; finished clips are kept and skipped on the next run.")
+        for f in futures:
+            f.cancel()
+        with lock:
+            for job in running:
+                job.cancel()
+        return 130
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        engine.close()
+        elapsed = time.monotonic() - t0
+        if elapsed > 0:
+            print(f"{done} compressed, {failed} failed in {elapsed / 60:.1f} min — "
+                  f"{done / (elapsed / 60):.1f} clips/min, {in_bytes / 1e6 / elapsed:.1f} MB/s in, "
+                  f"{out_bytes / 1e6:.0f} MB written")
+        tracing.dump(app_cache_dir() / "traces")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,300 @@
+# bench.py
+import os, sys, json, time, shutil, argparse, platform, tempfile, threading, subprocess, contextlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from bootstrap import load_layout
+from compcache import CompressionCache, app_cache_dir
+from engine import DISCORD_SOFT_LIMIT, DISCORD_TARGET, DiscordEngine
+from folderindex import FolderIndex
+from jobs import run_ffmpeg
+from metadata import MetadataService
+
+# ============================================================
+# Benchmarks on synthetic clips (offline: ffmpeg lavfi sources only)
+#   python bench.py run [--quick] [-o results.json]
+#   python bench.py compare old.json new.json [--threshold 0.10]
+# ============================================================
+BENCH_VERSION = 1
+REGRESSION_THRESHOLD = 0.10     # relative
+NOISE_FLOOR = {"s": 0.005, "ratio": 0.005, "count": 0}    # absolute differences below this are ignored
+FOLDER_FILES = 500
+
+# complexity -> lavfi video source (size/rate/duration filled in)
+SOURCES = {
+    "low":    "testsrc2=size={w}x{h}:rate=30:duration={d}",
+    "medium": "mandelbrot=size={w}x{h}:rate=30,trim=duration={d}",
+    "high":   "color=c=gray:size={w}x{h}:rate=30:duration={d},noise=alls=60:allf=t+u",
+}
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+@dataclass
+class ClipSpec:
+    complexity: str
+    resolution: str
+    duration: int
+
+    @property
+    def name(self) -> str:
+        return f"{self.complexity}-{self.resolution}-{self.duration}s"
+
+    @property
+    def source_kbps(self) -> int:
+        # comfortably over the soft limit so every clip needs compressing
+        return int(DISCORD_SOFT_LIMIT * 8 * 2.5 / self.duration / 1000)
+
+
+def matrix(quick: bool) -> list[ClipSpec]:
+    if quick:
+        return [ClipSpec("low", "720p", 20), ClipSpec("high", "720p", 20)]
+    return [ClipSpec(c, r, d) for c in SOURCES for r in RESOLUTIONS for d in (20, 60)]
+
+
+def generate(ffmpeg: str, spec: ClipSpec, folder: Path) -> Path:
+    """Synthetic clip with a sine track; CBR so the source size is predictable. Reused across runs."""
+    out = folder / f"{spec.name}.mp4"
+    if out.exists():
+        return out
+    w, h = RESOLUTIONS[spec.resolution]
+    kbps = spec.source_kbps
+    tmp = folder / f"{spec.name}.tmp.mp4"
+    run_ffmpeg([ffmpeg, "-y", "-f", "lavfi", "-i", SOURCES[spec.complexity].format(w=w, h=h, d=spec.duration),
+                "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={spec.duration}",
+                "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+                "-b:v", f"{kbps}k", "-minrate", f"{kbps}k", "-maxrate", f"{kbps}k", "-bufsize", f"{kbps}k",
+                "-x264-params", "nal-hrd=cbr", "-c:a", "aac", "-b:a", "128k", "-shortest", str(tmp)],
+               duration=spec.duration)
+    os.replace(tmp, out)
+    return out
+
+
+def _children_cpu() -> float:
+    t = os.times()
+    return t.children_user + t.children_system
+
+
+def bench_probe(ffprobe: str, clip: Path) -> dict:
+    svc = MetadataService(ffprobe)      # no db: every run starts cold
+    try:
+        t0 = time.perf_counter()
+        info = svc.get(clip)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        svc.get(clip)
+        warm = time.perf_counter() - t0
+    finally:
+        svc.close()
+    return {"probe_cold_s": cold, "probe_warm_s": warm, "duration_ok": int(bool(info and info.duration))}
+
+
+def bench_compress(ffmpeg: str, ffprobe: str, clip: Path, work: Path) -> dict:
+    """Cold compression: empty cache and rate model, so each run does the same work."""
+    state = Path(tempfile.mkdtemp(dir=work))
+    engine = DiscordEngine(ffmpeg, ffprobe, cache=CompressionCache(state / "cache"), state_dir=state)
+    try:
+        cpu0, t0 = _children_cpu(), time.perf_counter()
+        out = engine.compress(clip)
+        wall, cpu = time.perf_counter() - t0, _children_cpu() - cpu0
+        report = engine.reports[str(out)]
+        size = out.stat().st_size
+        duration = engine.probe_duration(clip) or 0.0
+    finally:
+        engine.close()
+        shutil.rmtree(state, ignore_errors=True)
+    return {
+        "compress_wall_s": wall, "compress_cpu_s": cpu, "attempts": report.attempts,
+        "strategy": report.strategy, "size_bytes": size,
+        "size_error": abs(size - DISCORD_TARGET) / DISCORD_TARGET,
+        "over_limit": int(size > DISCORD_SOFT_LIMIT),
+        "realtime_x": duration / wall if wall else 0.0,
+    }
+
+
+def bench_folder(work: Path, n: int = FOLDER_FILES) -> dict:
+    """open_folder's path: cold refresh (new index), cached listing, refresh with nothing changed."""
+    folder = work / "folder"
+    folder.mkdir(exist_ok=True)
+    for i in range(n):
+        (folder / f"clip{i:05d}.mp4").touch()
+    db = work / "folders.sqlite3"
+    db.unlink(missing_ok=True)
+    index = FolderIndex(db, {".mp4"})
+    try:
+        t0 = time.perf_counter()
+        index.refresh(folder)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index.cached(folder)
+        cached = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        index.refresh(folder)
+        rescan = time.perf_counter() - t0
+    finally:
+        index.close()
+    return {"index_cold_s": cold, "index_cached_s": cached, "index_rescan_s": rescan, "files_count": n}
+
+
+def bench_url(clip: Path, work: Path) -> dict:
+    """URL ingestion against a loopback stand-in CDN: first bytes (and the tail, where moov lives) vs the whole file."""
+    from urlcache import UrlCache, serve_files
+    server, base = serve_files({clip.name: clip})
+    cache = UrlCache(work / "downloads")
+    try:
+        t0 = time.perf_counter()
+        d = cache.open(f"{base}/{clip.name}")
+        d.wait_range(0, 1, 30)
+        first = time.perf_counter() - t0
+        d.wait_range(clip.stat().st_size - 1, 1, 30)
+        tail = time.perf_counter() - t0
+        d.wait()
+        total = time.perf_counter() - t0
+    finally:
+        cache.close()
+        server.shutdown()
+        server.server_close()
+    return {"url_first_chunk_s": first, "url_tail_s": tail, "url_download_s": total}
+
+
+def bench_switch(clips: list[Path]) -> dict:
+    """_load_current's path: set_media + play until libVLC reports Playing, plain vs pre-parsed pool."""
+    try:
+        import vlc
+        from mediapool import MediaPool
+        instance = vlc.Instance("--intf=dummy", "--vout=dummy", "--aout=dummy", "--no-video-title-show")
+        player = instance.media_player_new()
+    except Exception as e:
+        return {"skipped": f"libVLC unavailable: {e}"}
+
+    playing = threading.Event()
+    player.event_manager().event_attach(vlc.EventType.MediaPlayerPlaying, lambda _e: playing.set())
+
+    def switch(media) -> float:
+        playing.clear()
+        t0 = time.perf_counter()
+        player.set_media(media)
+        player.play()
+        playing.wait(10)
+        dt = time.perf_counter() - t0
+        player.stop()
+        return dt
+
+    plain = [switch(instance.media_new(str(c))) for c in clips]
+    pool = MediaPool(instance)
+    pooled = []
+    for i in range(1, len(clips)):
+        # step i-1 -> i the way the app does; the preparser gets the time the user spends watching
+        pool.update(clips, i - 1)
+        time.sleep(0.5)
+        pooled.append(switch(pool.get(clips[i])))
+    pool.clear()
+    player.release()
+    return {"switch_plain_s": _median(plain), "switch_pooled_s": _median(pooled)}
+
+
+def _median(xs: list[float]) -> float:
+    xs = sorted(xs)
+    return xs[len(xs) // 2] if xs else 0.0
+
+
+def _ffmpeg_version(ffmpeg: str) -> str:
+    try:
+        r = subprocess.run([ffmpeg, "-version"], capture_output=True, text=True, timeout=10)
+        return (r.stdout.splitlines() or [""])[0]
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run(args) -> dict:
+    layout = load_layout()
+    clips_dir = app_cache_dir() / "bench"
+    clips_dir.mkdir(parents=True, exist_ok=True)
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="clipviewer-bench-") as tmp:
+        work = Path(tmp)
+        clips = []
+        for spec in matrix(args.quick):
+            print(f"[bench] {spec.name}", file=sys.stderr)
+            clip = generate(layout.ffmpeg, spec, clips_dir)
+            clips.append(clip)
+            r = {"source_bytes": clip.stat().st_size}
+            r.update(bench_probe(layout.ffprobe, clip))
+            r.update(bench_compress(layout.ffmpeg, layout.ffprobe, clip, work))
+            results[f"clip/{spec.name}"] = r
+        results["folder"] = bench_folder(work)
+        results["url"] = bench_url(max(clips, key=lambda c: c.stat().st_size), work)
+        results["switch"] = bench_switch(clips)
+    return {
+        "version": BENCH_VERSION,
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "ffmpeg": _ffmpeg_version(layout.ffmpeg),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+
+
+def _kind(metric: str) -> str | None:
+    """Which metrics are lower-is-better, and in what unit (for the noise floor)."""
+    if metric.endswith("_s"):
+        return "s"
+    if metric in ("size_error",):
+        return "ratio"
+    if metric in ("attempts", "over_limit"):
+        return "count"
+    return None
+
+
+def compare(old: dict, new: dict, threshold: float = REGRESSION_THRESHOLD) -> list[str]:
+    """Human-readable regressions of `new` against `old` (empty list = none)."""
+    out = []
+    for name, o in old.get("results", {}).items():
+        n = new.get("results", {}).get(name)
+        if n is None:
+            continue
+        for metric, ov in o.items():
+            nv = n.get(metric)
+            kind = _kind(metric)
+            if kind is None or not isinstance(ov, (int, float)) or not isinstance(nv, (int, float)):
+                continue
+            if nv - ov > NOISE_FLOOR[kind] and nv > ov * (1 + threshold):
+                change = f"+{(nv / ov - 1) * 100:.0f}%" if ov else "new"
+                out.append(f"{name} {metric}: {ov:.4g} -> {nv:.4g} ({change})")
+    return out
+
+
+def main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(prog="bench.py", description="ClipViewer benchmarks on synthetic clips.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--quick", action="store_true", help="two small clips instead of the full matrix")
+    r.add_argument("-o", "--out", type=Path, help="write JSON here (default: stdout)")
+    c = sub.add_parser("compare")
+    c.add_argument("old", type=Path)
+    c.add_argument("new", type=Path)
+    c.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "run":
+        with contextlib.redirect_stdout(sys.stderr):     # keep stdout for the JSON
+            text = json.dumps(run(args), indent=2)
+        if args.out:
+            args.out.write_text(text, encoding="utf-8")
+        else:
+            print(text)
+        return 0
+
+    old = json.loads(args.old.read_text(encoding="utf-8"))
+    new = json.loads(args.new.read_text(encoding="utf-8"))
+    if old.get("meta", {}).get("cpus") != new.get("meta", {}).get("cpus"):
+        print("note: runs come from machines with different core counts")
+    regressions = compare(old, new, args.threshold)
+    for line in regressions:
+        print("REGRESSION", line)
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
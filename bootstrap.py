@@ -0,0 +1,256 @@
+# bootstrap.py
+import os, sys, json, time, threading
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+
+import tracing
+from compcache import app_cache_dir, atomic_write_text
+
+# ============================================================
+# Startup: locate VLC/FFmpeg once, remember it, load libVLC off the UI thread
+# ============================================================
+STARTED = time.perf_counter()       # as early as main.py can take it (first import)
+LAYOUT_CACHE = "bootstrap.json"
+LAYOUT_VERSION = 1
+IS_WINDOWS = sys.platform.startswith("win")
+
+
+def resource_path(rel: str) -> str:
+    """Return absolute path to resource, working for dev and PyInstaller."""
+    if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
+        base = Path(sys._MEIPASS)           # _internal during runtime
+    else:
+        base = Path(__file__).resolve().parent
+    return str((base / rel).resolve())
+
+
+def exe_dir() -> Path:
+    if getattr(sys, "frozen", False):
+        return Path(sys.executable).resolve().parent
+    return Path(__file__).resolve().parent
+
+
+BASE = exe_dir()
+INTERNAL = BASE / "_internal"
+VENDOR = BASE / "vendor"
+
+
+def search_roots() -> list[Path]:
+    roots: list[Path] = []
+    if INTERNAL.exists():
+        roots.append(INTERNAL)
+    roots.append(BASE)
+    if VENDOR.exists():
+        roots.append(VENDOR)
+    return roots
+
+
+def find_tool(name: str, roots: list[Path] | None = None) -> str:
+    """Bundled ffmpeg/ffprobe if present, else the bare name for PATH lookup (no .exe off Windows)."""
+    names = [name] if IS_WINDOWS else [name.removesuffix(".exe"), name]
+    for r in roots if roots is not None else search_roots():
+        for n in names:
+            p = r / "ffmpeg" / n
+            if p.exists():
+                return str(p)
+    return names[0]
+
+
+@dataclass
+class Layout:
+    vlc_dll: str | None = None
+    vlc_plugins: str | None = None
+    ffmpeg: str = "ffmpeg"
+    ffprobe: str = "ffprobe"
+    instance_args: list[str] | None = None      # args that last produced a working instance
+    stamps: dict[str, int | None] = field(default_factory=dict)
+    from_cache: bool = False
+
+
+def resolve_layout() -> Layout:
+    """One pass over the candidate folders (no DLL loading here)."""
+    roots = search_roots()
+    layout = Layout(ffmpeg=find_tool("ffmpeg.exe", roots), ffprobe=find_tool("ffprobe.exe", roots))
+    for r in roots:
+        # A: dll in root, plugins in root/plugins or root/vlc/plugins
+        # B: dll under vlc/, plugins under vlc/plugins
+        for dll, plugins in ((r / "libvlc.dll", (r / "plugins", r / "vlc" / "plugins")),
+                             (r / "vlc" / "libvlc.dll", (r / "vlc" / "plugins",))):
+            if dll.exists():
+                layout.vlc_dll = str(dll)
+                layout.vlc_plugins = next((str(p) for p in plugins if p.exists()), None)
+                return layout
+    return layout
+
+
+def _stamp_paths(layout: Layout) -> list[Path]:
+    """Everything whose change could move the winning layout (the roots' mtimes catch added files)."""
+    paths = [BASE, INTERNAL, VENDOR, INTERNAL / "vlc", BASE / "vlc", VENDOR / "vlc",
+             INTERNAL / "ffmpeg", BASE / "ffmpeg", VENDOR / "ffmpeg"]
+    for p in (layout.vlc_dll, layout.vlc_plugins, layout.ffmpeg, layout.ffprobe):
+        if p and os.path.isabs(p):
+            paths.append(Path(p))
+    if getattr(sys, "frozen", False):
+        paths.append(Path(sys.executable))
+    return paths
+
+
+def _mtime(p: Path) -> int | None:
+    try:
+        return p.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _stamps(layout: Layout) -> dict[str, int | None]:
+    return {str(p): _mtime(p) for p in _stamp_paths(layout)}
+
+
+def load_layout(cache_dir: Path | None = None) -> Layout:
+    """Cached layout if nothing it depends on changed since it was written, else a fresh resolve."""
+    with tracing.span("bootstrap.layout") as sp:
+        layout = _load_layout(cache_dir)
+        sp.set(cached=layout.from_cache)
+        return layout
+
+
+def _load_layout(cache_dir: Path | None) -> Layout:
+    path = (cache_dir or app_cache_dir()) / LAYOUT_CACHE
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") == LAYOUT_VERSION and data.get("base") == str(BASE):
+            layout = Layout(**data["layout"])
+            if layout.stamps and all(_mtime(Path(p)) == m for p, m in layout.stamps.items()):
+                layout.from_cache = True
+                return layout
+    except (OSError, ValueError, TypeError, KeyError):
+        pass
+    return resolve_layout()
+
+
+def save_layout(layout: Layout, cache_dir: Path | None = None):
+    cache_dir = cache_dir or app_cache_dir()
+    layout.stamps = _stamps(layout)
+    data = asdict(layout)
+    data.pop("from_cache")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(cache_dir / LAYOUT_CACHE,
+                          json.dumps({"version": LAYOUT_VERSION, "base": str(BASE), "layout": data}))
+    except OSError as e:
+        print("Could not save startup layout:", e)
+
+
+def prepare_environment(layout: Layout):
+    """Make the DLL and plugins visible to the loader and to python-vlc before `import vlc`."""
+    if layout.vlc_dll:
+        dll_dir = str(Path(layout.vlc_dll).parent)
+        if hasattr(os, "add_dll_directory"):
+            try:
+                os.add_dll_directory(dll_dir)
+            except Exception:
+                pass
+        os.environ["PATH"] = dll_dir + os.pathsep + os.environ.get("PATH", "")
+        os.environ["PYTHON_VLC_LIB_PATH"] = layout.vlc_dll
+    elif IS_WINDOWS:
+        print("⚠ libvlc.dll not found under _internal/, next to EXE, or vendor/. Will try system VLC if available.")
+    if layout.vlc_plugins:
+        # python-vlc older/newer env names + VLC native arg
+        os.environ["VLC_PLUGIN_PATH"] = layout.vlc_plugins
+        os.environ["PYTHON_VLC_MODULE_PATH"] = layout.vlc_plugins
+
+
+def instance_attempts(layout: Layout) -> list[list[str]]:
+    """Init styles to try, best first; a cached winner goes before everything else."""
+    attempts: list[list[str]] = []
+    if layout.instance_args is not None:
+        attempts.append(list(layout.instance_args))
+    plugins = []
+    if layout.vlc_plugins:
+        plugins.append(Path(layout.vlc_plugins))
+    if layout.vlc_dll:
+        # also try a folder named "plugins" next to the DLL (common requirement)
+        plugins.append(Path(layout.vlc_dll).parent / "plugins")
+    for p in dict.fromkeys(p.resolve() for p in plugins if p.exists()):
+        attempts.append(["--no-video-title-show", f"--plugin-path={p}"])
+    attempts += [["--no-video-title-show"], []]
+    unique: list[list[str]] = []
+    for a in attempts:
+        if a not in unique:
+            unique.append(a)
+    return unique
+
+
+def _failure_message(layout: Layout) -> str:
+    lines = [
+        "Failed to create VLC instance (vlc.Instance() returned None).",
+        "Searched for libvlc.dll under:",
+        f"  {INTERNAL}\n  {BASE}\n  {VENDOR/'vlc'}",
+        "Make sure libvlc.dll is 64-bit and that a 'plugins' folder exists.",
+        "Tip: If plugins are inside '\\vlc\\plugins', try moving/copying them to a folder named just 'plugins' next to libvlc.dll.",
+    ]
+    # what PyInstaller actually packed
+    try:
+        from glob import glob
+        dll_dir = Path(layout.vlc_dll).parent if layout.vlc_dll else Path(".")
+        lines.append("DLLs found: " + ", ".join(Path(p).name for p in glob(str(dll_dir / "*.dll"))[:20]))
+    except Exception:
+        pass
+    return "\n".join(lines)
+
+
+def create_instance(layout: Layout):
+    """Import python-vlc and build the libVLC instance; remembers the winning args."""
+    import vlc
+    for args in instance_attempts(layout):
+        try:
+            instance = vlc.Instance(*args)
+        except Exception as e:
+            print(f"[VLC] Instance{tuple(args)} error: {e}")
+            instance = None
+        if instance is not None:
+            if not layout.from_cache or args != layout.instance_args:
+                layout.instance_args = args
+                save_layout(layout)
+            return instance
+    raise RuntimeError(_failure_message(layout))
+
+
+class VlcLoader:
+    """
+    Loads libVLC (DLL + plugin cache scan, the slow part of startup) on a
+    thread while Tk builds the window; instance() waits for it.
+    """
+
+    def __init__(self, layout: Layout):
+        self.layout = layout
+        self._instance = None
+        self._error: BaseException | None = None
+        self.seconds = 0.0
+        self._thread = threading.Thread(target=self._load, name="vlc-init", daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        t0 = time.perf_counter()
+        try:
+            self._instance = create_instance(self.layout)
+        except BaseException as e:
+            self._error = e
+        self.seconds = time.perf_counter() - t0
+        tracing.record("bootstrap.vlc", t0, self.seconds, ok=self._error is None)
+
+    def instance(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._instance
+
+
+def report_first_window(loader: VlcLoader | None = None):
+    """Print time from process start (bootstrap import) to the first mapped window."""
+    msg = f"[startup] first window after {(time.perf_counter() - STARTED) * 1000:.0f} ms"
+    if loader is not None:
+        msg += (f" (libVLC {loader.seconds * 1000:.0f} ms in parallel, "
+                f"layout {'cached' if loader.layout.from_cache else 'resolved'})")
+    print(msg)
+    tracing.record("startup.first_window", STARTED, time.perf_counter() - STARTED)
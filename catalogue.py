@@ -0,0 +1,176 @@
+# catalogue.py
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Iterable
+
+# ============================================================
+# Compact clip listing: column arrays instead of one Path object per file
+# ============================================================
+SORTS = {                   # user-facing name -> (column, descending)
+    "date": ("mtime", True),
+    "size": ("size", True),
+    "length": ("duration", True),
+    "name": ("name", False),
+}
+
+
+class Catalogue(Sequence):
+    """
+    One folder's clips stored column-wise: the folder once, every name in a
+    single NUL-separated string (offsets in array('q')), sizes / mtimes in
+    array('q'), durations in array('d') (NaN = not probed). Sort orders are
+    computed once per column and reused; filtering searches the name buffer
+    directly. Indexing goes through the current view and builds a Path on
+    demand, so it stands in for the old list[Path].
+    """
+
+    def __init__(self, folder: Path, rows: Iterable[tuple[str, int, int, float | None]]):
+        """`rows`: (name, size, mtime_ns, duration) in date order, newest first (FolderIndex.rows)."""
+        self.folder = folder
+        names: list[str] = []
+        self.sizes = array("q")
+        self.mtimes = array("q")
+        self.durations = array("d")
+        for name, size, mtime_ns, duration in rows:
+            names.append(name)
+            self.sizes.append(size)
+            self.mtimes.append(mtime_ns)
+            self.durations.append(duration if duration is not None else math.nan)
+        self._buf = "\0".join(names) + "\0"
+        self._offsets = array("q", [0])
+        for name in names:
+            self._offsets.append(self._offsets[-1] + len(name) + 1)
+        self._lower: str | None = None
+        self._orders: dict[str, array] = {"mtime": array("l", range(len(names)))}
+        self.sort = "date"
+        self.query = ""
+        self.view = self._orders["mtime"]
+
+    # ---------- Sequence of Paths (through the view) ----------
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.path(r) for r in self.view[i]]
+        return self.path(self.view[i])
+
+    def __contains__(self, path) -> bool:
+        return self.index_of(path) is not None
+
+    def index(self, path, start: int = 0, stop: int | None = None) -> int:
+        i = self.index_of(path)
+        if i is None or i < start or (stop is not None and i >= stop):
+            raise ValueError(f"{path} is not listed")
+        return i
+
+    # ---------- Rows ----------
+    @property
+    def rows(self) -> int:
+        return len(self.sizes)
+
+    def name(self, row: int) -> str:
+        return self._buf[self._offsets[row]:self._offsets[row + 1] - 1]
+
+    def path(self, row: int) -> Path:
+        return self.folder / self.name(row)
+
+    def row_of(self, path: Path) -> int | None:
+        """Binary search over the name order (no name -> row dict to keep resident)."""
+        if path.parent != self.folder:
+            return None
+        name = path.name
+        key = name.casefold()
+        order = self._order("name", False)
+        i = bisect_left(order, key, key=lambda r: self.name(r).casefold())
+        while i < len(order) and self.name(order[i]).casefold() == key:
+            if self.name(order[i]) == name:
+                return order[i]
+            i += 1
+        return None
+
+    def index_of(self, path: Path) -> int | None:
+        """Position of `path` in the current view (C-speed scans, no Paths built)."""
+        row = self.row_of(path)
+        if row is None:
+            return None
+        try:
+            return self.view.index(row)
+        except ValueError:
+            return None
+
+    def label(self, i: int) -> tuple[str, str]:
+        """(name, size / length) for row i of the view, for list widgets."""
+        row = self.view[i]
+        meta = f"{self.sizes[row] / 1e6:.1f} MB"
+        d = self.durations[row]
+        if not math.isnan(d):
+            meta += f"  {int(d) // 60}:{int(d) % 60:02d}"
+        return self.name(row), meta
+
+    def set_duration(self, path: Path, duration: float | None):
+        row = self.row_of(path)
+        if row is not None and duration is not None:
+            self.durations[row] = duration
+            self._orders.pop("duration+", None)
+            self._orders.pop("duration-", None)
+
+    # ---------- View ----------
+    def set_view(self, sort: str | None = None, query: str | None = None, keep: Path | None = None):
+        """
+        Re-sort / re-filter. `query` matches anywhere in the name, case-insensitive;
+        a leading ^ anchors it to the start. `keep` stays listed even if it doesn't match.
+        """
+        self.sort = sort if sort in SORTS else self.sort
+        self.query = self.query if query is None else query.strip()
+        order = self._order(*SORTS[self.sort])
+        if not self.query:
+            self.view = order
+            return
+        hit = self._matches(self.query)
+        row = self.row_of(keep) if keep is not None else None
+        if row is not None:
+            hit[row] = 1
+        self.view = array("l", (r for r in order if hit[r]))
+
+    def _order(self, column: str, descending: bool) -> array:
+        key = column + ("-" if descending else "+")
+        order = self._orders.get(key)
+        if order is not None:
+            return order
+        n = self.rows
+        if column == "mtime":
+            base = self._orders["mtime"]       # rows arrive newest first
+            order = base if descending else array("l", reversed(base))
+        elif column == "name":
+            order = array("l", sorted(range(n), key=lambda r: self.name(r).casefold(), reverse=descending))
+        else:
+            values = self.sizes if column == "size" else self.durations
+            # unknown durations (NaN) go last either way
+            order = array("l", sorted(range(n), key=lambda r: (math.isnan(values[r]), -values[r] if descending
+                                                               else values[r])))
+        self._orders[key] = order
+        return order
+
+    def _matches(self, query: str) -> bytearray:
+        """Row bitmap of names containing `query`: str.find over the whole buffer, one bisect per hit."""
+        hit = bytearray(self.rows)
+        if self._lower is None:
+            self._lower = self._buf.casefold()
+            if len(self._lower) != len(self._buf):
+                # a few characters fold to two (İ, ß): keep those as is so offsets still line up
+                self._lower = "".join(c if len(c.casefold()) != 1 else c.casefold() for c in self._buf)
+        q = query.casefold()
+        # anchored: "\0foo" in "\0" + buffer matches at the offset where the name starts
+        needle, hay = ("\0" + q[1:], "\0" + self._lower) if q.startswith("^") else (q, self._lower)
+        if not needle.strip("\0"):
+            return bytearray(b"\x01" * self.rows)
+        pos = hay.find(needle)
+        while pos >= 0:
+            row = bisect_right(self._offsets, pos) - 1
+            hit[row] = 1
+            pos = hay.find(needle, self._offsets[row + 1])
+        return hit
@@ -0,0 +1,210 @@
+# clipboard.py
+import os, sys, json, time, queue, base64, shutil, threading, subprocess
+from pathlib import Path
+from typing import Callable
+
+import tracing
+
+# ============================================================
+# Copying files to the system clipboard (off the UI thread)
+# ============================================================
+BACKEND = os.environ.get("CLIPVIEWER_CLIPBOARD", "auto")     # auto | powershell | wl-copy | xclip | fake
+HELPER_TIMEOUT_S = 10.0
+
+# One long-lived PowerShell: reads a JSON array of paths per line, answers "ok" or "err <message>".
+# Paths arrive ASCII-escaped (json.dumps), so the console code page doesn't matter.
+_PS_LOOP = r"""
+$ErrorActionPreference = 'Stop'
+while ($true) {
+    $line = [Console]::In.ReadLine()
+    if ($line -eq $null) { break }
+    try {
+        $paths = @($line | ConvertFrom-Json)
+        Set-Clipboard -LiteralPath $paths
+        [Console]::Out.WriteLine('ok')
+    } catch {
+        [Console]::Out.WriteLine('err ' + ($_.Exception.Message -replace '\s+', ' '))
+    }
+    [Console]::Out.Flush()
+}
+"""
+
+
+class ClipboardBackend:
+    name = "none"
+
+    def copy_files(self, paths: list[Path]):
+        """Blocking; raises RuntimeError on failure. Called from the clipboard thread only."""
+        raise RuntimeError("No clipboard support on this system.")
+
+    def close(self):
+        pass
+
+
+class PowerShellBackend(ClipboardBackend):
+    """
+    Keeps one `powershell` process alive and feeds it copy requests over stdin,
+    so a copy costs a pipe round trip instead of a PowerShell cold start. The
+    helper is started right away (warm by the first copy) and restarted if it dies.
+    """
+    name = "powershell"
+
+    def __init__(self, exe: str = "powershell"):
+        self.exe = exe
+        self._proc: subprocess.Popen | None = None
+        self._lines: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._ensure, name="clipboard-warmup", daemon=True).start()
+
+    def _ensure(self) -> subprocess.Popen:
+        with self._lock:
+            if self._proc is not None and self._proc.poll() is None:
+                return self._proc
+            script = base64.b64encode(_PS_LOOP.encode("utf-16-le")).decode("ascii")
+            self._proc = subprocess.Popen(
+                [self.exe, "-NoProfile", "-NonInteractive", "-Sta", "-EncodedCommand", script],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, encoding="ascii", errors="replace", bufsize=1,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+            self._lines = queue.SimpleQueue()
+            threading.Thread(target=self._read, args=(self._proc, self._lines),
+                             name="clipboard-helper", daemon=True).start()
+            return self._proc
+
+    @staticmethod
+    def _read(proc: subprocess.Popen, lines: queue.SimpleQueue):
+        for line in proc.stdout:
+            lines.put(line.strip())
+
+    def copy_files(self, paths: list[Path]):
+        for attempt in (1, 2):      # a dead helper gets one restart
+            proc = self._ensure()
+            try:
+                proc.stdin.write(json.dumps([str(p) for p in paths]) + "\n")
+                proc.stdin.flush()
+                reply = self._lines.get(timeout=HELPER_TIMEOUT_S)
+            except (OSError, queue.Empty):
+                proc.kill()
+                if attempt == 2:
+                    raise RuntimeError("The clipboard helper (PowerShell) is not responding.")
+                continue
+            if reply == "ok":
+                return
+            raise RuntimeError(reply.removeprefix("err ").strip() or "Set-Clipboard failed.")
+
+    def close(self):
+        with self._lock:
+            if self._proc is not None and self._proc.poll() is None:
+                try:
+                    self._proc.stdin.close()
+                    self._proc.wait(timeout=2)
+                except (OSError, subprocess.TimeoutExpired):
+                    self._proc.kill()
+
+
+class UriListBackend(ClipboardBackend):
+    """Linux: files as text/uri-list through wl-copy (Wayland) or xclip (X11), which own the selection."""
+
+    def __init__(self, tool: str):
+        self.name = tool
+        if tool == "wl-copy":
+            self.cmd = ["wl-copy", "--type", "text/uri-list"]
+        else:
+            self.cmd = ["xclip", "-selection", "clipboard", "-t", "text/uri-list", "-i"]
+
+    def copy_files(self, paths: list[Path]):
+        uris = "".join(p.resolve().as_uri() + "\r\n" for p in paths)
+        try:
+            # the tool forks a selection owner and returns; don't wait on its inherited pipes
+            r = subprocess.run(self.cmd, input=uris, text=True, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, timeout=HELPER_TIMEOUT_S)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise RuntimeError(f"{self.name}: {e}") from e
+        if r.returncode != 0:
+            raise RuntimeError(r.stderr.strip() or f"{self.name} exited with {r.returncode}")
+
+
+class FakeBackend(ClipboardBackend):
+    """In-memory clipboard for headless runs and benchmarks; `delay` / `fail` simulate a slow or broken one."""
+    name = "fake"
+
+    def __init__(self, delay: float = 0.0, fail: str | None = None):
+        self.delay = delay
+        self.fail = fail
+        self.copies: list[list[Path]] = []
+
+    def copy_files(self, paths: list[Path]):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(self.fail)
+        self.copies.append(list(paths))
+
+
+def create_backend(name: str = BACKEND) -> ClipboardBackend:
+    if name == "fake":
+        return FakeBackend()
+    if name == "powershell" or (name == "auto" and sys.platform.startswith("win")):
+        return PowerShellBackend()
+    if name in ("wl-copy", "xclip"):
+        return UriListBackend(name)
+    if name == "auto":
+        if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wl-copy"):
+            return UriListBackend("wl-copy")
+        if shutil.which("xclip"):
+            return UriListBackend("xclip")
+    return ClipboardBackend()
+
+
+class Clipboard:
+    """
+    Runs copies on one background thread so the UI never waits on the backend.
+    Only the newest pending request is kept (older ones would be overwritten
+    anyway). Each copy is a "clipboard" span; failures are "clipboard.error"
+    events, and on_done(paths, error) runs through `dispatch` (Tk thread) —
+    that is where the caller reports them; nothing is printed here.
+    """
+
+    def __init__(self, backend: ClipboardBackend, dispatch: Callable[..., None] | None = None):
+        self.backend = backend
+        self._dispatch = dispatch or (lambda fn, *args: fn(*args))
+        self._cond = threading.Condition()
+        self._pending: tuple[list[Path], Callable | None] | None = None
+        self._closed = False
+        self.last_seconds: float | None = None
+        self._thread = threading.Thread(target=self._loop, name="clipboard", daemon=True)
+        self._thread.start()
+
+    def copy(self, paths: list[Path], on_done: Callable[[list[Path], BaseException | None], None] | None = None):
+        with self._cond:
+            self._pending = (list(paths), on_done)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=HELPER_TIMEOUT_S)
+        self.backend.close()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                paths, on_done = self._pending
+                self._pending = None
+            error = None
+            t0 = time.perf_counter()
+            try:
+                with tracing.span("clipboard", backend=self.backend.name, files=len(paths)):
+                    self.backend.copy_files(paths)
+            except Exception as e:
+                error = e
+                tracing.event("clipboard.error", backend=self.backend.name, error=str(e))
+            self.last_seconds = time.perf_counter() - t0
+            if on_done is not None:
+                self._dispatch(on_done, paths, error)
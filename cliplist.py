@@ -0,0 +1,151 @@
+# cliplist.py
+import tkinter as tk
+from typing import Callable
+
+# ============================================================
+# Virtualized clip list (only the visible rows exist as canvas items)
+# ============================================================
+ROW_HEIGHT = 20
+SELECT_BG = "#2f5fa8"
+
+
+class ClipList(tk.Frame):
+    """
+    A Canvas holding one name/detail text pair per *visible* row; scrolling
+    re-points those items at other clips instead of creating any, so a redraw
+    costs the window height whatever the list length, and jumping anywhere
+    (see/select) is O(1). `label(i) -> (name, detail)` supplies row text;
+    `on_scroll(middle)` hears about user scrolling with the index mid-window.
+    """
+
+    def __init__(self, master, on_select: Callable[[int], None],
+                 on_scroll: Callable[[int], None] | None = None, row_height: int = ROW_HEIGHT, **kw):
+        super().__init__(master, **kw)
+        self.on_select = on_select
+        self.on_scroll = on_scroll
+        self.row_h = row_height
+        self.count = 0
+        self.label: Callable[[int], tuple[str, str]] = lambda i: ("", "")
+        self.top = 0            # first visible index
+        self.selected = -1
+        self._rows: list[tuple[int, int]] = []     # (name item, detail item) per visible slot
+
+        self.canvas = tk.Canvas(self, highlightthickness=0, bg="white", takefocus=1)
+        self.scroll = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._yview)
+        self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._sel = self.canvas.create_rectangle(0, 0, 0, 0, fill=SELECT_BG, width=0, state=tk.HIDDEN)
+
+        self.canvas.bind("<Configure>", lambda _e: self._layout())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self._scroll_by(-e.delta // 40 or (-1 if e.delta > 0 else 1)))
+        self.canvas.bind("<Button-4>", lambda _e: self._scroll_by(-3))
+        self.canvas.bind("<Button-5>", lambda _e: self._scroll_by(3))
+        for key, step in (("<Up>", -1), ("<Down>", 1), ("<Prior>", "-page"), ("<Next>", "page"),
+                          ("<Home>", "home"), ("<End>", "end")):
+            self.canvas.bind(key, lambda _e, s=step: self._key(s))
+
+    # ---------- Public ----------
+    def set_source(self, count: int, label: Callable[[int], tuple[str, str]], selected: int = -1):
+        """New or re-sorted / filtered data; keeps the scroll position where possible."""
+        self.count = count
+        self.label = label
+        self.selected = selected
+        self.top = max(0, min(self.top, count - self._visible()))
+        if 0 <= selected:
+            self.see(selected)
+        self._draw()
+
+    def select(self, i: int):
+        self.selected = i
+        self.see(i)
+        self._draw()
+
+    def see(self, i: int):
+        """Scroll so row i is visible (centred if it was off screen)."""
+        vis = self._visible()
+        if not (self.top <= i < self.top + vis - 1):
+            self.top = max(0, min(i - vis // 2, self.count - vis + 1))
+        self._draw()
+
+    # ---------- Internals ----------
+    def _visible(self) -> int:
+        return max(1, self.canvas.winfo_height() // self.row_h + 1)
+
+    def _layout(self):
+        vis = self._visible()
+        width = self.canvas.winfo_width()
+        while len(self._rows) < vis:
+            y = len(self._rows) * self.row_h + self.row_h // 2
+            self._rows.append((self.canvas.create_text(6, y, anchor="w"),
+                               self.canvas.create_text(width - 6, y, anchor="e", fill="gray40")))
+        while len(self._rows) > vis:
+            for item in self._rows.pop():
+                self.canvas.delete(item)
+        for _name, detail in self._rows:
+            self.canvas.coords(detail, width - 6, self.canvas.coords(detail)[1])
+        self._draw()
+
+    def _draw(self):
+        for k, (name, detail) in enumerate(self._rows):
+            i = self.top + k
+            if i < self.count:
+                text, info = self.label(i)
+                fg = "white" if i == self.selected else "black"
+                self.canvas.itemconfigure(name, text=text, fill=fg, state=tk.NORMAL)
+                self.canvas.itemconfigure(detail, text=info, fill="gray85" if i == self.selected else "gray40",
+                                          state=tk.NORMAL)
+            else:
+                self.canvas.itemconfigure(name, state=tk.HIDDEN)
+                self.canvas.itemconfigure(detail, state=tk.HIDDEN)
+        k = self.selected - self.top
+        if 0 <= self.selected < self.count and 0 <= k < len(self._rows):
+            self.canvas.coords(self._sel, 0, k * self.row_h, self.canvas.winfo_width(), (k + 1) * self.row_h)
+            self.canvas.itemconfigure(self._sel, state=tk.NORMAL)
+            self.canvas.tag_lower(self._sel)
+        else:
+            self.canvas.itemconfigure(self._sel, state=tk.HIDDEN)
+        if self.count:
+            self.scroll.set(self.top / self.count, min(1.0, (self.top + self._visible()) / self.count))
+        else:
+            self.scroll.set(0.0, 1.0)
+
+    def _scroll_by(self, rows: int):
+        self.top = max(0, min(self.top + rows, self.count - self._visible() + 1))
+        self._draw()
+        self._scrolled()
+
+    def _yview(self, *args):
+        if args[0] == "moveto":
+            self.top = max(0, min(int(float(args[1]) * self.count), self.count - self._visible() + 1))
+            self._draw()
+            self._scrolled()
+        elif args[0] == "scroll":
+            n = int(args[1])
+            self._scroll_by(n * (self._visible() - 1) if args[2] == "pages" else n)
+
+    def _scrolled(self):
+        if self.on_scroll is not None and self.count:
+            self.on_scroll(min(self.top + self._visible() // 2, self.count - 1))
+
+    def _on_click(self, evt):
+        self.canvas.focus_set()
+        i = self.top + evt.y // self.row_h
+        if 0 <= i < self.count:
+            self.on_select(i)
+
+    def _key(self, step):
+        if not self.count:
+            return
+        i = max(0, self.selected)
+        if step == "home":
+            i = 0
+        elif step == "end":
+            i = self.count - 1
+        elif step in ("page", "-page"):
+            i += (self._visible() - 1) * (1 if step == "page" else -1)
+        else:
+            i += step
+        i = max(0, min(i, self.count - 1))
+        if i != self.selected:
+            self.on_select(i)
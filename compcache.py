@@ -0,0 +1,173 @@
+# compcache.py
+import os, sys, json, time, hashlib, threading
+from collections import OrderedDict
+from pathlib import Path
+
+# ============================================================
+# Persistent, content-addressed cache for compressed clips
+# ============================================================
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3   # 2 GB
+PARTIAL_HASH_BYTES = 1 << 20        # hash 1 MB from head and tail of the source
+INDEX_NAME = "index.json"
+IDENT_MEMO_MAX = 4096               # source identities remembered (LRU) for the session
+
+
+def app_cache_dir() -> Path:
+    """Per-user cache folder (LOCALAPPDATA on Windows, XDG cache elsewhere)."""
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA") or str(Path.home() / "AppData" / "Local")
+        return Path(base) / "ClipViewer" / "cache"
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "clipviewer"
+
+
+def atomic_write_text(path: Path, text: str):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CompressionCache:
+    """
+    Compressed outputs keyed by source identity (size + mtime + partial hash)
+    and encode parameters. Entries live in <root>/<key>/<name> so the file
+    keeps a readable name when pasted into Discord.
+    """
+
+    def __init__(self, root: Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root else app_cache_dir() / "compressed"
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._index_path = self.root / INDEX_NAME
+        self._lock = threading.RLock()
+        self._dirty = False
+        # key -> {"file": relative path, "size": bytes}; order = LRU (oldest first)
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._ident_memo: OrderedDict[tuple, str] = OrderedDict()
+        self._load_index()
+
+    # ---------- Keys ----------
+    def source_identity(self, src: Path) -> str:
+        st = src.stat()
+        memo_key = (str(src), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            ident = self._ident_memo.get(memo_key)
+            if ident is not None:
+                self._ident_memo.move_to_end(memo_key)
+                return ident
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+        with open(src, "rb") as f:
+            h.update(f.read(PARTIAL_HASH_BYTES))
+            if st.st_size > 2 * PARTIAL_HASH_BYTES:
+                f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+                h.update(f.read(PARTIAL_HASH_BYTES))
+        ident = h.hexdigest()
+        with self._lock:
+            self._ident_memo[memo_key] = ident
+            while len(self._ident_memo) > IDENT_MEMO_MAX:
+                self._ident_memo.popitem(last=False)
+        return ident
+
+    def key_for(self, src: Path, **params) -> str:
+        """Cache key for `src` encoded with `params` (target bytes, codec, audio kbps, ...)."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.source_identity(src).encode())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    # ---------- Lookup / store ----------
+    def get(self, key: str) -> Path | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            path = self.root / entry["file"]
+            if not path.exists():
+                del self._entries[key]
+                self._dirty = True
+                return None
+            self._entries.move_to_end(key)
+            self._dirty = True
+            return path
+
+    def temp_path(self, key: str, suffix: str = ".mp4") -> Path:
+        """Scratch path on the cache volume; hand it back to put() once written."""
+        return self.tmp_dir / f"{key}.{os.getpid()}.{threading.get_ident()}{suffix}"
+
+    def put(self, key: str, tmp: Path, name: str) -> Path:
+        """Atomically move a finished file into the cache and evict if over budget."""
+        final_dir = self.root / key
+        final_dir.mkdir(parents=True, exist_ok=True)
+        final = final_dir / name
+        os.replace(tmp, final)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old and old["file"] != f"{key}/{name}":
+                _unlink_quiet(self.root / old["file"])
+            self._entries[key] = {"file": f"{key}/{name}", "size": final.stat().st_size}
+            self._evict(keep=key)
+            self._save_index()
+        return final
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e["size"] for e in self._entries.values())
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    # ---------- Internals ----------
+    def _evict(self, keep: str | None = None):
+        total = sum(e["size"] for e in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            entry = self._entries.pop(key)
+            total -= entry["size"]
+            path = self.root / entry["file"]
+            _unlink_quiet(path)
+            try:
+                path.parent.rmdir()
+            except OSError:
+                pass
+
+    def _load_index(self):
+        try:
+            data = json.loads(self._index_path.read_text(encoding="utf-8"))
+            for key, entry in data.get("entries", []):
+                self._entries[key] = entry
+        except (OSError, ValueError, TypeError):
+            self._entries.clear()
+        # leftovers from an interrupted encode (old enough not to belong to a live one)
+        cutoff = time.time() - 6 * 3600
+        for p in self.tmp_dir.iterdir():
+            try:
+                if p.stat().st_mtime < cutoff:
+                    p.unlink()
+            except OSError:
+                pass
+
+    def _save_index(self):
+        data = {"version": 1, "entries": list(self._entries.items())}
+        try:
+            atomic_write_text(self._index_path, json.dumps(data))
+            self._dirty = False
+        except OSError:
+            pass
+
+
+def _unlink_quiet(path: Path):
+    try:
+        path.unlink()
+    except OSError:
+        pass
@@ -0,0 +1,236 @@
+# engine.py
+from pathlib import Path
+
+import tracing
+from audio import AudioPlan, AudioPlanner
+from compcache import CompressionCache, app_cache_dir
+from jobs import Job, run_ffmpeg, fmt_time
+from metadata import MediaInfo, MetadataService
+from planner import DEFAULT_MODE, MODES, EncodePlan, EncodePlanner, ThroughputProfile
+from estimator import SizeEstimate, SizeEstimator
+from export import ExportTarget, Exporter
+from sizing import (MIN_VIDEO_KBPS, STRATEGY_MODEL, STRATEGY_TWOPASS, SizeReport, SizeTargeter, demux_duration,
+                    too_long)
+from segments import SegmentedEncoder, should_segment
+from trim import Trimmer
+
+# ============================================================
+# Discord compression pipeline (no Tk, no VLC: shared by the app and `batch`)
+# ============================================================
+VIDEO_EXTS = {".mp4", ".avi", ".mkv", ".mov", ".wmv", ".webm", ".m4v"}
+DISCORD_SOFT_LIMIT = 10_000_000  # 10 MB
+DISCORD_TARGET     = 9_500_000   # ~9.5 MB target
+AUDIO_KBPS         = 96             # only when the clip can't be probed (see audio.AudioPlanner)
+SEED_RATIO_RANGE   = (0.6, 1.5)     # sample ABR ratios outside this are too noisy to trust
+OUTPUT_SUFFIX      = "_dc9p5mb.mp4"
+GIF_PREVIEW_SECONDS = 6
+
+EXPORT_BUNDLES = {          # name -> outputs produced from one decode
+    "mp4+gif":  [ExportTarget("mp4", DISCORD_TARGET), ExportTarget("gif", DISCORD_TARGET, GIF_PREVIEW_SECONDS)],
+    "mp4+webm": [ExportTarget("mp4", DISCORD_TARGET), ExportTarget("webm", DISCORD_TARGET)],
+    "all":      [ExportTarget("mp4", DISCORD_TARGET), ExportTarget("webm", DISCORD_TARGET),
+                 ExportTarget("gif", DISCORD_TARGET, GIF_PREVIEW_SECONDS)],
+}
+
+
+class DiscordEngine:
+    """
+    Cache lookup -> duration -> segmented or size-targeted encode -> cache.
+    Methods run on worker threads and never touch any UI or print; decisions
+    are tracing events ("engine.*") and the last size report per output path
+    is kept in `reports` for the caller to show.
+    """
+
+    def __init__(self, ffmpeg: str, ffprobe: str, cache: CompressionCache | None = None,
+                 meta: MetadataService | None = None, encode_mode: str = "auto", threads: int | None = None,
+                 state_dir: Path | None = None):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.cache = cache or CompressionCache()
+        self._own_meta = meta is None
+        self.meta = meta or MetadataService(ffprobe, app_cache_dir() / "probes.sqlite3")
+        self.encode_mode = encode_mode      # auto | single | segmented
+        self.threads = threads              # ffmpeg -threads per encode (None = ffmpeg decides)
+        self.sizer = SizeTargeter(ffmpeg, state_dir or app_cache_dir())    # rate model + pass-1 logs
+        self.profile = ThroughputProfile((state_dir or app_cache_dir()) / "throughput.json")
+        self.planner = EncodePlanner(self.profile, threads)
+        self.priority = DEFAULT_MODE        # speed | balanced | quality (see planner.MODES)
+        self.estimator = SizeEstimator(ffmpeg, (state_dir or app_cache_dir()) / "estimates.json")
+        self.audio = AudioPlanner(ffmpeg, (state_dir or app_cache_dir()) / "audio.json")
+        self.segmenter = SegmentedEncoder(ffmpeg, ffprobe, self.sizer, probe=self.meta.get)
+        self.trimmer = Trimmer(ffmpeg, ffprobe, probe=self.meta.get)
+        self.exporter = Exporter(ffmpeg, self.cache, self.sizer, threads)
+        self.reports: dict[str, SizeReport] = {}
+
+    def close(self):
+        if self._own_meta:
+            self.meta.close()
+        self.cache.flush()
+
+    def probe_duration(self, path: Path) -> float | None:
+        info = self.meta.get(path)
+        return info.duration if info else None
+
+    def audio_plan(self, info: MediaInfo, ident: str = "") -> AudioPlan:
+        """
+        Audio for a Discord-sized encode (cheap; silent tracks are known once compress/export
+        analysed them). Drops to the bottom of the audio ladder when the planned rate would
+        leave video no size / fps that fits.
+        """
+        audio = self.audio.plan(info, DISCORD_TARGET)
+        if audio.tracks and info.duration:
+            plan = self._video_plan(info, ident, audio)
+            if plan is not None and not plan.fits:
+                return audio.at_floor()
+        return audio
+
+    def plan_for(self, src: Path, info: MediaInfo | None = None, ident: str = "") -> EncodePlan | None:
+        """
+        Preset / output size / fps for the current priority. Cheap (no I/O once the clip
+        is probed), so the UI can show it before encoding; without `ident` the global
+        size model stands in for the per-clip one.
+        """
+        info = info or self.meta.get(src)
+        if info is None or not info.duration:
+            return None
+        return self._video_plan(info, ident, self.audio_plan(info, ident))
+
+    def _video_plan(self, info: MediaInfo, ident: str, audio: AudioPlan) -> EncodePlan | None:
+        twopass = not self.sizer.model.has_clip(ident)
+        size_plan = self.sizer.plan(ident, info.duration, DISCORD_TARGET, audio.kbps,
+                                    STRATEGY_TWOPASS if twopass else STRATEGY_MODEL)
+        # the unclamped budget: a long clip gets a smaller frame / fps rather than the floor bitrate
+        return self.planner.plan(info, size_plan.budget_kbps, twopass, MODES.get(self.priority))
+
+    def cached_estimate(self, src: Path, info: MediaInfo | None = None) -> SizeEstimate | None:
+        info = info or self.meta.peek(src)
+        plan = self.plan_for(src, info) if info is not None else None
+        return self.estimator.cached(info, plan) if plan is not None else None
+
+    def estimate(self, src: Path, job: Job | None = None) -> SizeEstimate | None:
+        """
+        Sample-encode the clip at its current plan. The measured size ratio seeds the
+        rate model for this clip, so the real encode starts from a calibrated bitrate
+        (one pass instead of two).
+        """
+        info = self.meta.get(src)
+        plan = self.plan_for(src, info) if info is not None else None
+        if plan is None or not plan.fits:
+            return None
+        ident = self.cache.source_identity(src)
+        est = self.estimator.estimate(info, plan, self.audio_plan(info, ident).kbps,
+                                      not self.sizer.model.has_clip(ident), job)
+        if SEED_RATIO_RANGE[0] <= est.size_ratio <= SEED_RATIO_RANGE[1]:
+            self.sizer.model.seed(ident, STRATEGY_MODEL, est.size_ratio)
+        return est
+
+    def compress(self, src: Path, job: Job | None = None) -> Path:
+        """Cached Discord-sized copy of `src` (encodes on a miss)."""
+        # keyed by the priority, not the plan: the plan drifts as the throughput profile learns
+        key = self.cache.key_for(src, target=DISCORD_TARGET, vcodec="libx264", audio=self.audio.tracks,
+                                 priority=self.priority)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        duration = self.probe_duration(src)
+        if not duration:
+            duration = demux_duration(self.ffmpeg, src, lambda cmd: run_ffmpeg(cmd, job))
+        if not duration:
+            raise RuntimeError(f"Could not determine the duration of {src.name}.")
+
+        out = self.cache.temp_path(key)
+        ident = self.cache.source_identity(src)
+        info = self.meta.get(src)
+        if info is not None:
+            # silent tracks are found first so their bits go to video in the plan below
+            self.audio.analyze(info, job)
+            audio = self.audio_plan(info, ident)
+        else:
+            audio = AudioPlan((0,), kbps=AUDIO_KBPS)
+        plan = self.plan_for(src, info, ident) if info is not None else None
+        tracing.event("engine.plan", file=src.name, audio=audio.describe(),
+                      plan=plan.describe() if plan is not None else None)
+        if plan is not None and not plan.fits:
+            # checked before any encode: even the smallest frame needs more than the target allows
+            raise too_long(src, duration, DISCORD_TARGET, plan.min_kbps)
+        min_kbps = plan.min_kbps if plan is not None else MIN_VIDEO_KBPS
+        preset = plan.preset if plan else "veryfast"
+        filters = plan.filters() if plan else []
+        threads = ["-threads", str(self.threads)] if self.threads else []
+        video_args = lambda kbps: [
+            *filters, "-c:v", "libx264", "-preset", preset,
+            "-b:v", f"{kbps}k", "-maxrate", f"{kbps}k", "-bufsize", f"{kbps*2}k", *threads,
+        ]
+
+        def run(cmd: list[str], dur: float | None):
+            last = run_ffmpeg(cmd, job, dur)
+            # final passes feed the throughput profile (pass 1 runs a faster analysis mode)
+            if plan is not None and not ("-pass" in cmd and cmd[cmd.index("-pass") + 1] == "1"):
+                try:
+                    self.profile.learn(preset, float(last.get("fps") or 0), plan.width, plan.height, self.threads)
+                except ValueError:
+                    pass
+            return last
+
+        try:
+            report = None
+            mode = self.encode_mode
+            if mode == "segmented" or (mode == "auto" and should_segment(duration)):
+                report = self.segmenter.encode(src, out, ident, duration, DISCORD_TARGET,
+                                               video_args, audio.args(video=None), audio.kbps, job,
+                                               min_kbps=min_kbps)
+            if report is None:
+                report = self.sizer.encode(
+                    src, out, ident, duration, DISCORD_TARGET, video_args, audio.args(), audio.kbps,
+                    run=run, set_span=job.set_span if job else (lambda lo, hi: None), min_kbps=min_kbps,
+                )
+        except BaseException:
+            out.unlink(missing_ok=True)
+            raise
+
+        if not out.exists():
+            raise RuntimeError("ffmpeg did not produce output.")
+        tracing.event("engine.size", file=src.name, summary=report.summary())
+        final = self.cache.put(key, out, src.stem + OUTPUT_SUFFIX)
+        self.reports[str(final)] = report
+        return final
+
+    def export(self, src: Path, bundle: str = "mp4+gif", job: Job | None = None) -> dict[str, Path]:
+        """Every format in EXPORT_BUNDLES[bundle] from a single decode of `src` (fmt -> cached path)."""
+        info = self.meta.get(src)
+        if info is None:
+            raise RuntimeError(f"Could not probe {src.name}.")
+        # one pass for everything, so plan as single-pass
+        plan_for = lambda kbps: self.planner.plan(info, kbps, False, MODES.get(self.priority))
+        self.audio.analyze(info, job)
+        results = self.exporter.export(src, info, EXPORT_BUNDLES[bundle], plan_for, self.audio_plan(info), job,
+                                       variant=f"{self.priority}|{self.audio.tracks}")
+        tracing.event("engine.export", file=src.name, bundle=bundle,
+                      sizes={fmt: path.stat().st_size for fmt, path in results.items()})
+        return results
+
+    def trim(self, src: Path, start: float, end: float | None, job: Job | None = None) -> Path:
+        """Cut the range (stream copy / smart cut), then compress only if still too big."""
+        if end is None:
+            end = self.probe_duration(src)
+            if not end:
+                raise RuntimeError(f"Could not determine the duration of {src.name}.")
+        key = self.cache.key_for(src, kind="trim", start=round(start, 3), end=round(end, 3))
+        trimmed = self.cache.get(key)
+        if trimmed is None:
+            out = self.cache.temp_path(key)
+            if job:
+                job.set_span(0.0, 1.0)
+            try:
+                mode = self.trimmer.export(src, out, start, end, job)
+            except BaseException:
+                out.unlink(missing_ok=True)
+                raise
+            tracing.event("engine.trim", file=src.name, start=start, end=end, mode=mode)
+            name = f"{src.stem}_{fmt_time(int(start * 1000))}-{fmt_time(int(end * 1000))}.mp4".replace(":", ".")
+            trimmed = self.cache.put(key, out, name)
+
+        if trimmed.stat().st_size <= DISCORD_SOFT_LIMIT:
+            return trimmed
+        return self.compress(trimmed, job)
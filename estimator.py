@@ -0,0 +1,152 @@
+# estimator.py
+import os, json, time, shutil, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+from compcache import atomic_write_text
+from jobs import Job, run_ffmpeg
+from metadata import MediaInfo
+from planner import TWOPASS_COST, EncodePlan
+
+# ============================================================
+# Size / quality / time estimates from a few short sample encodes
+# ============================================================
+SAMPLE_COUNT   = 6
+SAMPLE_SECONDS = 2.0
+QUALITY_CRF    = 23         # "looks clean" reference for the bitrate the content needs
+MAX_ENTRIES    = 2000
+
+
+@dataclass
+class SizeEstimate:
+    budget_kbps: int        # video bitrate the size target allows
+    needed_kbps: int        # what the content takes at QUALITY_CRF
+    est_bytes: int          # full clip at the budget (samples' actual/nominal applied)
+    size_ratio: float       # actual/nominal seen on the samples (ABR over/undershoot)
+    est_seconds: float      # full encode time on this machine
+    sample_seconds: float   # how long the estimate itself took
+
+    @property
+    def verdict(self) -> str:
+        r = self.budget_kbps / max(1, self.needed_kbps)
+        if r >= 0.9:
+            return "clean"
+        if r >= 0.5:
+            return "soft"
+        return "blocky"
+
+    def describe(self) -> str:
+        return (f"≈{self.est_bytes / 1e6:.1f} MB, {self.verdict} "
+                f"(needs {self.needed_kbps / 1000:.1f} Mbps, gets {self.budget_kbps / 1000:.1f}), "
+                f"~{self.est_seconds:.0f} s")
+
+
+def sample_starts(duration: float, n: int = SAMPLE_COUNT, length: float = SAMPLE_SECONDS) -> list[float]:
+    """Evenly spaced, centred in n equal slices; fewer samples for short clips."""
+    n = max(1, min(n, int(duration // length)))
+    slot = duration / n
+    return [max(0.0, i * slot + (slot - length) / 2) for i in range(n)]
+
+
+class SizeEstimator:
+    """
+    Encodes SAMPLE_COUNT short slices of the clip in parallel, twice each: at
+    the planned ABR bitrate (size ratio + speed) and at QUALITY_CRF (the
+    bitrate the content needs). Results are cached per clip + plan.
+    """
+
+    def __init__(self, ffmpeg: str, path: Path):
+        self.ffmpeg = ffmpeg
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            self._cache: dict[str, dict] = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._cache = {}
+
+    @staticmethod
+    def _key(info: MediaInfo, plan: EncodePlan) -> str:
+        k = plan.key()
+        return (f"{os.path.normcase(str(info.path))}|{info.size}|{info.mtime_ns}|"
+                f"{k['preset']}|{k['h']}|{k['fps']}|{plan.video_kbps}")
+
+    def cached(self, info: MediaInfo, plan: EncodePlan) -> SizeEstimate | None:
+        with self._lock:
+            d = self._cache.get(self._key(info, plan))
+        return SizeEstimate(**d) if d else None
+
+    def estimate(self, info: MediaInfo, plan: EncodePlan, audio_kbps: int, twopass: bool,
+                 job: Job | None = None) -> SizeEstimate:
+        hit = self.cached(info, plan)
+        if hit is not None:
+            return hit
+        t0 = time.monotonic()
+        starts = sample_starts(info.duration)
+        tmp = Path(tempfile.mkdtemp(prefix="clipviewer-est-"))
+        try:
+            runs = []
+            for i, s in enumerate(starts):
+                runs.append((s, ["-b:v", f"{plan.video_kbps}k", "-maxrate", f"{plan.video_kbps}k",
+                                 "-bufsize", f"{plan.video_kbps * 2}k"], tmp / f"abr{i}.mp4"))
+                runs.append((s, ["-crf", str(QUALITY_CRF)], tmp / f"crf{i}.mp4"))
+            # one thread per process: the samples themselves are the parallelism; each run
+            # gets its own child job so cancelling reaches every ffmpeg, not just the last
+            if job is not None:
+                job.clear_children()
+            subs = [job.child(f"sample {i + 1}", min(SAMPLE_SECONDS, info.duration - s)) if job is not None else None
+                    for i, (s, _rc, _out) in enumerate(runs)]
+            with ThreadPoolExecutor(max_workers=min(len(runs), os.cpu_count() or 1)) as pool:
+                futures = [pool.submit(self._encode, info, plan, s, rc, out, sub)
+                           for (s, rc, out), sub in zip(runs, subs)]
+                try:
+                    for f in futures:
+                        f.result()
+                except BaseException:
+                    for sub in subs:
+                        if sub is not None:
+                            sub.cancel()
+                    raise
+            wall = time.monotonic() - t0
+
+            sampled = sum(min(SAMPLE_SECONDS, info.duration - s) for s in starts)
+            abr_bytes = sum((tmp / f"abr{i}.mp4").stat().st_size for i in range(len(starts)))
+            crf_bytes = sum((tmp / f"crf{i}.mp4").stat().st_size for i in range(len(starts)))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        nominal = plan.video_kbps * 1000 / 8 * sampled
+        ratio = abr_bytes / nominal if nominal else 1.0
+        # ABR and CRF runs were split evenly; half the wall time covers the ABR ones
+        frames_per_s = sampled * plan.fps / (wall / 2) if wall else 0.0
+        est_seconds = info.duration * plan.fps / frames_per_s if frames_per_s else 0.0
+        if twopass:
+            est_seconds *= TWOPASS_COST
+        est = SizeEstimate(
+            budget_kbps=plan.video_kbps,
+            needed_kbps=int(crf_bytes * 8 / sampled / 1000),
+            est_bytes=int((plan.video_kbps * ratio + audio_kbps) * 1000 / 8 * info.duration),
+            size_ratio=ratio,
+            est_seconds=est_seconds,
+            sample_seconds=wall,
+        )
+        self._store(self._key(info, plan), est)
+        return est
+
+    # ---------- Internals ----------
+    def _encode(self, info: MediaInfo, plan: EncodePlan, start: float, rate: list[str], out: Path, job: Job | None):
+        run_ffmpeg([self.ffmpeg, "-y", "-ss", f"{start:.3f}", "-i", str(info.path), "-t", f"{SAMPLE_SECONDS:.3f}",
+                    "-map", "0:v:0", "-an", *plan.filters(), "-c:v", "libx264", "-preset", plan.preset,
+                    *rate, "-threads", "1", str(out)], job, min(SAMPLE_SECONDS, info.duration - start))
+
+    def _store(self, key: str, est: SizeEstimate):
+        with self._lock:
+            self._cache[key] = asdict(est)
+            while len(self._cache) > MAX_ENTRIES:
+                self._cache.pop(next(iter(self._cache)))
+            text = json.dumps(self._cache)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self.path, text)
+        except OSError:
+            pass
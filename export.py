@@ -0,0 +1,250 @@
+# export.py
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import tracing
+from audio import AudioPlan
+from compcache import CompressionCache
+from jobs import Job, run_ffmpeg
+from metadata import MediaInfo
+from planner import EncodePlan
+from sizing import MAX_RETRIES, MIN_VIDEO_KBPS, STRATEGY_MODEL, SizeReport, SizeTargeter, too_long
+
+# ============================================================
+# Export bundles: one decode, several outputs (split filter), each with its own size target
+# ============================================================
+NAME_SUFFIX = {"mp4": "_dc9p5mb.mp4", "webm": "_dc9p5mb.webm", "gif": "_preview.gif"}
+STRATEGY_VP9 = "vp9"        # rate model keys for the non-x264 outputs
+STRATEGY_GIF = "gif"
+
+GIF_FPS = 12
+GIF_WIDTHS = [640, 480, 360, 240]
+GIF_SEED_BPP = 0.15         # bytes per pixel per frame after LZW (bayer dither, rectangle diffs); learned
+PALETTE_WIDTH = 320         # palette stats don't depend on size, so it's built small and reused at any width
+VP9_ARGS = ["-deadline", "good", "-cpu-used", "4", "-row-mt", "1"]
+
+
+@dataclass(frozen=True)
+class ExportTarget:
+    fmt: str                        # mp4 | webm | gif
+    target_bytes: int
+    max_seconds: float | None = None    # from the start (GIF previews)
+
+
+@dataclass
+class _Output:
+    target: ExportTarget
+    tmp: Path
+    chain: str              # filters between the split branch and the output, "" for none
+    strategy: str
+    nominal_bytes: int
+    expected_bytes: int
+    video_kbps: int = 0
+    audio_kbps: int = 0
+    preset: str = "veryfast"
+    width: int = 0
+    min_kbps: int = MIN_VIDEO_KBPS
+
+
+class Exporter:
+    """
+    Decodes the source once and fans out to every requested format through
+    `split`: x264 MP4 and VP9 WEBM at bitrates from the rate model, and a GIF
+    preview whose palette (palettegen) is cached per clip. The video outputs
+    share one AudioPlan (a mix is built once and asplit). Outputs that land
+    over their target are redone on their own, smaller; one that still can't
+    fit raises instead of being cached.
+    """
+
+    def __init__(self, ffmpeg: str, cache: CompressionCache, sizer: SizeTargeter, threads: int | None = None):
+        self.ffmpeg = ffmpeg
+        self.cache = cache
+        self.sizer = sizer
+        self.threads = threads
+
+    def export(self, src: Path, info: MediaInfo, targets: list[ExportTarget],
+               plan_for: Callable[[int], EncodePlan | None], audio: AudioPlan, job: Job | None = None,
+               variant: str = "") -> dict[str, Path]:
+        """fmt -> cached output path; `plan_for(video_kbps)` gives preset / size / fps for the video outputs."""
+        if info.video is None or not info.duration:
+            raise RuntimeError(f"{src.name} has no video stream to export.")
+        ident = self.cache.source_identity(src)
+        keys = {t: self.cache.key_for(src, kind="export", fmt=t.fmt, target=t.target_bytes,
+                                      seconds=t.max_seconds, variant=variant) for t in targets}
+        results: dict[str, Path] = {}
+        todo: list[ExportTarget] = []
+        for t in targets:
+            hit = self.cache.get(keys[t])
+            if hit is not None:
+                results[t.fmt] = hit
+            else:
+                todo.append(t)
+        if not todo:
+            return results
+
+        gif_seconds = [t.max_seconds or info.duration for t in todo if t.fmt == "gif"]
+        palette = self._palette(src, info, max(gif_seconds), job) if gif_seconds else None
+        outputs = [self._output(t, ident, info, plan_for, audio, keys[t]) for t in todo]
+        try:
+            t0 = time.monotonic()
+            self._run(src, info, outputs, palette, audio, job)
+            for o in outputs:
+                o = self._check(src, info, ident, o, palette, audio, job, time.monotonic() - t0)
+                results[o.target.fmt] = self.cache.put(keys[o.target], o.tmp, src.stem + NAME_SUFFIX[o.target.fmt])
+        finally:
+            for o in outputs:
+                o.tmp.unlink(missing_ok=True)
+        return results
+
+    # ---------- Internals ----------
+    def _output(self, t: ExportTarget, ident: str, info: MediaInfo, plan_for, audio: AudioPlan, key: str) -> _Output:
+        tmp = self.cache.temp_path(key, "." + t.fmt)
+        seconds = min(info.duration, t.max_seconds or info.duration)
+        if t.fmt == "gif":
+            w = self._gif_width(ident, info, t.target_bytes, seconds)
+            h = _even(w * info.video.height / info.video.width)
+            nominal = int(w * h * GIF_FPS * seconds * GIF_SEED_BPP)
+            ratio, _n = self.sizer.model.ratio(ident, STRATEGY_GIF)
+            trim = f"trim=duration={t.max_seconds:g},setpts=PTS-STARTPTS," if t.max_seconds else ""
+            chain = f"{trim}fps={GIF_FPS},scale={w}:-2:flags=lanczos"
+            return _Output(t, tmp, chain, STRATEGY_GIF, nominal, int(nominal * ratio), width=w)
+
+        strategy = STRATEGY_MODEL if t.fmt == "mp4" else STRATEGY_VP9
+        size_plan = self.sizer.plan(ident, seconds, t.target_bytes, audio.kbps, strategy)
+        plan = plan_for(size_plan.budget_kbps)
+        if plan is not None and not plan.fits:
+            raise too_long(info.path, seconds, t.target_bytes, plan.min_kbps)
+        return _Output(t, tmp, plan.vf() if plan else "", strategy, size_plan.nominal_bytes,
+                       size_plan.expected_bytes, video_kbps=plan.video_kbps if plan else size_plan.video_kbps,
+                       audio_kbps=audio.kbps, preset=plan.preset if plan else "veryfast",
+                       min_kbps=plan.min_kbps if plan else MIN_VIDEO_KBPS)
+
+    def _codec_args(self, o: _Output, audio: AudioPlan) -> list[str]:
+        kbps = o.video_kbps
+        if o.target.fmt == "gif":
+            return ["-f", "gif"]
+        if o.target.fmt == "mp4":
+            return ["-c:v", "libx264", "-preset", o.preset,
+                    "-b:v", f"{kbps}k", "-maxrate", f"{kbps}k", "-bufsize", f"{kbps*2}k",
+                    *audio.codec_args("aac"), "-movflags", "+faststart"]
+        return ["-c:v", "libvpx-vp9", *VP9_ARGS, "-b:v", f"{kbps}k", *audio.codec_args("libopus")]
+
+    def _gif_width(self, ident: str, info: MediaInfo, target_bytes: int, seconds: float) -> int:
+        """Widest GIF_WIDTHS entry (never upscaled) whose expected size fits."""
+        ratio, _n = self.sizer.model.ratio(ident, STRATEGY_GIF)
+        aspect = info.video.height / info.video.width
+        widths = [w for w in GIF_WIDTHS if w <= info.video.width] or [info.video.width]
+        for w in widths:
+            if w * _even(w * aspect) * GIF_FPS * seconds * GIF_SEED_BPP * ratio <= target_bytes:
+                return w
+        return widths[-1]
+
+    def _palette(self, src: Path, info: MediaInfo, seconds: float, job: Job | None) -> Path:
+        """palettegen over the preview's frames, cached per source clip (a short partial decode)."""
+        key = self.cache.key_for(src, kind="palette", fps=GIF_FPS, width=PALETTE_WIDTH, seconds=seconds)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+        tmp = self.cache.temp_path(key, ".png")
+        try:
+            run_ffmpeg([self.ffmpeg, "-y", "-t", f"{seconds:g}", "-i", str(src), "-map", "0:v:0",
+                        "-vf", f"fps={GIF_FPS},scale={min(PALETTE_WIDTH, info.video.width)}:-2,"
+                               f"palettegen=stats_mode=diff",
+                        "-frames:v", "1", "-update", "1", str(tmp)], job)
+            return self.cache.put(key, tmp, "palette.png")
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def _run(self, src: Path, info: MediaInfo, outputs: list[_Output], palette: Path | None,
+             audio: AudioPlan, job: Job | None):
+        """
+        One ffmpeg process: [0:v] is split once per distinct filter chain (MP4 and WEBM
+        at the same size share one scaler), then again per output on that chain.
+        """
+        chains: dict[str, list[int]] = {}
+        for i, o in enumerate(outputs):
+            chains.setdefault(o.chain, []).append(i)
+        graph = [_split("[0:v]", [f"[s{j}]" for j in range(len(chains))])]
+        labels: dict[int, str] = {}
+        for j, (chain, members) in enumerate(chains.items()):
+            branch = f"[s{j}]"
+            if chain:
+                graph.append(f"{branch}{chain}[c{j}]")
+                branch = f"[c{j}]"
+            if len(members) > 1:
+                graph.append(_split(branch, [f"[c{j}_{i}]" for i in members]))
+                labels.update((i, f"[c{j}_{i}]") for i in members)
+            else:
+                labels[members[0]] = branch
+        for i, o in enumerate(outputs):
+            if o.target.fmt == "gif":
+                graph.append(f"{labels[i]}[1:v]paletteuse=dither=bayer:bayer_scale=5:diff_mode=rectangle[g{i}]")
+                labels[i] = f"[g{i}]"
+        media = [i for i, o in enumerate(outputs) if o.target.fmt != "gif"]
+        sound = {i: f"0:a:{audio.tracks[0]}?" for i in media} if audio.tracks else {}
+        mix = audio.mix_filter("[amix]") if media else None
+        if mix:
+            graph.append(mix)
+            sound = {i: f"[a{i}]" for i in media} if len(media) > 1 else {media[0]: "[amix]"}
+            if len(media) > 1:
+                graph.append(f"[amix]asplit={len(media)}{''.join(sound.values())}")
+
+        cmd = [self.ffmpeg, "-y", "-i", str(src)]
+        if palette is not None:
+            cmd += ["-i", str(palette)]
+        cmd += ["-filter_complex", ";".join(graph)]
+        for i, o in enumerate(outputs):
+            cmd += ["-map", labels[i]]
+            if o.target.fmt != "gif":
+                if i in sound:
+                    cmd += ["-map", sound[i]]
+                if o.target.max_seconds:
+                    cmd += ["-t", f"{o.target.max_seconds:g}"]
+                if self.threads:
+                    cmd += ["-threads", str(self.threads)]
+            cmd += [*self._codec_args(o, audio), str(o.tmp)]
+        longest = max(min(info.duration, o.target.max_seconds or info.duration) for o in outputs)
+        run_ffmpeg(cmd, job, longest)
+
+    def _check(self, src, info, ident, o: _Output, palette, audio: AudioPlan, job, seconds: float) -> _Output:
+        """Feed the rate model; redo (alone) anything over its target, smaller each time, and raise if it won't fit."""
+        if not o.tmp.exists():
+            raise RuntimeError(f"ffmpeg did not produce the {o.target.fmt} output.")
+        actual = o.tmp.stat().st_size
+        self.sizer.model.learn(ident, SizeReport(o.strategy, o.target.target_bytes, o.nominal_bytes,
+                                                 o.expected_bytes, actual, 1, seconds))
+        redos = 0
+        while actual > o.target.target_bytes:
+            if o.target.fmt == "gif":
+                smaller = [w for w in GIF_WIDTHS if w < o.width]
+                if not smaller:
+                    raise _oversize(src, o, actual, f"{o.width} px wide")
+                o.chain = o.chain.replace(f"scale={o.width}:", f"scale={smaller[0]}:")
+                o.width = smaller[0]
+            else:
+                goal = o.target.target_bytes * (1 - self.sizer.tolerance / 2)
+                total = (o.video_kbps + o.audio_kbps) * goal / actual
+                new_kbps = max(o.min_kbps, int(total - o.audio_kbps))
+                if redos >= MAX_RETRIES or new_kbps >= o.video_kbps:
+                    raise _oversize(src, o, actual, f"{o.video_kbps} kbps")
+                o.video_kbps = new_kbps
+            tracing.event("export.redo", file=src.name, fmt=o.target.fmt, actual=actual, target=o.target.target_bytes)
+            redos += 1
+            self._run(src, info, [o], palette if o.target.fmt == "gif" else None, audio, job)
+            actual = o.tmp.stat().st_size
+        return o
+
+
+def _oversize(src: Path, o: _Output, actual: int, at: str) -> RuntimeError:
+    return RuntimeError(f"Could not get the {o.target.fmt.upper()} of {src.name} under "
+                        f"{o.target.target_bytes / 1e6:.1f} MB ({actual / 1e6:.2f} MB at {at}).")
+
+
+def _split(src: str, outs: list[str]) -> str:
+    return f"{src}split={len(outs)}{''.join(outs)}" if len(outs) > 1 else f"{src}null{outs[0]}"
+
+
+def _even(x: float) -> int:
+    return max(2, int(round(x / 2)) * 2)
@@ -0,0 +1,251 @@
+# folderindex.py
+import os, sys, time, sqlite3, threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+# ============================================================
+# Persistent folder index + live watcher for new clips
+# ============================================================
+WATCH_POLL_SECONDS = 2.0
+POLL_FULL_EVERY    = 15         # ticks between scans the folder mtime would skip (files rewritten in place)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    folder   TEXT NOT NULL,
+    name     TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration REAL,
+    vcodec   TEXT,
+    PRIMARY KEY (folder, name)
+);
+CREATE INDEX IF NOT EXISTS clips_by_mtime ON clips (folder, mtime_ns DESC);
+"""
+
+
+@dataclass
+class ClipEntry:
+    path: Path
+    size: int
+    mtime_ns: int
+    duration: float | None = None
+    vcodec: str | None = None
+
+
+def scan_dir(folder: Path, exts: set[str]) -> dict[str, tuple[int, int]]:
+    """name -> (size, mtime_ns) in one scandir pass (stat comes with the listing on Windows)."""
+    found: dict[str, tuple[int, int]] = {}
+    with os.scandir(folder) as it:
+        for e in it:
+            if os.path.splitext(e.name)[1].lower() not in exts:
+                continue
+            try:
+                if not e.is_file():
+                    continue
+                st = e.stat()
+            except OSError:
+                continue
+            found[e.name] = (st.st_size, st.st_mtime_ns)
+    return found
+
+
+class FolderIndex:
+    """SQLite-backed listing of clip folders; rescans only write what changed."""
+
+    def __init__(self, db_path: Path, exts: set[str]):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.exts = exts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def _key(folder: Path) -> str:
+        return os.path.normcase(str(folder.resolve()))
+
+    def cached(self, folder: Path) -> list[ClipEntry]:
+        """Last known listing, newest first, without touching the folder."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, size, mtime_ns, duration, vcodec FROM clips WHERE folder=? ORDER BY mtime_ns DESC",
+                (self._key(folder),)
+            ).fetchall()
+        return [ClipEntry(folder / n, s, m, d, c) for n, s, m, d, c in rows]
+
+    def rows(self, folder: Path) -> list[tuple[str, int, int, float | None]]:
+        """(name, size, mtime_ns, duration) newest first: cached() without an object per clip (Catalogue)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT name, size, mtime_ns, duration FROM clips WHERE folder=? ORDER BY mtime_ns DESC",
+                (self._key(folder),)
+            ).fetchall()
+
+    def refresh(self, folder: Path) -> tuple[list[Path], list[Path]]:
+        """Rescan and apply the diff. Returns (added newest first, removed); reads back no rows."""
+        key = self._key(folder)
+        found = scan_dir(folder, self.exts)
+        with self._lock:
+            known = {n: (s, m) for n, s, m in self._db.execute(
+                "SELECT name, size, mtime_ns FROM clips WHERE folder=?", (key,))}
+            added = [n for n in found if n not in known]
+            changed = [n for n in found if n in known and known[n] != found[n]]
+            removed = [n for n in known if n not in found]
+            if not (added or changed or removed):
+                return [], []
+            self._db.execute("BEGIN")
+            # a changed file loses its probe results
+            self._db.executemany(
+                "INSERT OR REPLACE INTO clips (folder, name, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                [(key, n, *found[n]) for n in added + changed])
+            self._db.executemany("DELETE FROM clips WHERE folder=? AND name=?", [(key, n) for n in removed])
+            self._db.execute("COMMIT")
+        added_paths = sorted((folder / n for n in added), key=lambda p: found[p.name][1], reverse=True)
+        return added_paths, [folder / n for n in removed]
+
+    def store_probe(self, path: Path, size: int, mtime_ns: int, duration: float | None, vcodec: str | None = None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE clips SET duration=?, vcodec=COALESCE(?, vcodec) WHERE folder=? AND name=? AND size=? AND mtime_ns=?",
+                (duration, vcodec, self._key(path.parent), path.name, size, mtime_ns)
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class FolderWatcher:
+    """
+    Background thread calling on_change(added, removed) when the folder's clips
+    change. Uses inotify on Linux, otherwise polls every WATCH_POLL_SECONDS and
+    only reports once the listing held still for one interval (so a clip the
+    recorder is still writing isn't picked up half-done).
+    """
+
+    def __init__(self, folder: Path, index: FolderIndex, on_change: Callable[[list[Path], list[Path]], None],
+                 initial_refresh: bool = False):
+        self.folder = folder
+        self.index = index
+        self.on_change = on_change
+        self._stop = threading.Event()
+        self._initial_refresh = initial_refresh
+        self._thread = threading.Thread(target=self._run, name="folderwatch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _emit(self, added: list[Path], removed: list[Path]):
+        if (added or removed) and not self._stop.is_set():
+            self.on_change(added, removed)
+
+    def _run(self):
+        try:
+            if sys.platform.startswith("linux") and _Inotify.available():
+                self._run_inotify()
+            else:
+                self._catch_up()
+                self._run_poll()
+        except Exception as e:
+            print("Folder watcher stopped:", e)
+
+    def _catch_up(self):
+        if self._initial_refresh:
+            added, removed = self.index.refresh(self.folder)
+            self._emit(added, removed)
+
+    def _run_poll(self):
+        """
+        Compares scans against the listing the index last settled on (read once), so
+        SQLite is only touched when something changed. While nothing is settling and
+        the folder's mtime (bumped by adds / removes / renames) holds, the scandir is
+        skipped too, except every POLL_FULL_EVERY ticks.
+        """
+        settled = {name: (size, mtime_ns) for name, size, mtime_ns, _d in self.index.rows(self.folder)}
+        last: dict[str, tuple[int, int]] | None = None
+        dir_mtime: int | None = None
+        tick = 0
+        while not self._stop.wait(WATCH_POLL_SECONDS):
+            tick += 1
+            try:
+                mtime_ns = os.stat(self.folder).st_mtime_ns
+            except OSError:
+                continue
+            if mtime_ns == dir_mtime and last == settled and tick % POLL_FULL_EVERY:
+                continue
+            dir_mtime = mtime_ns
+            found = scan_dir(self.folder, self.index.exts)
+            if found != last:
+                last = found           # still changing (or first look): wait for it to settle
+                continue
+            if found != settled:
+                added, removed = self.index.refresh(self.folder)
+                settled = found
+                self._emit(added, removed)
+
+    def _run_inotify(self):
+        with _Inotify(self.folder) as ino:
+            self._catch_up()    # after the watch is armed, so nothing slips between
+            while not self._stop.is_set():
+                if ino.wait(timeout=1.0):
+                    added, removed = self.index.refresh(self.folder)
+                    self._emit(added, removed)
+
+
+class _Inotify:
+    """Minimal ctypes inotify: wakes up on files finished writing / moved in / deleted."""
+    IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_DELETE = 0x08, 0x40, 0x80, 0x200
+    IN_NONBLOCK = 0x800
+
+    _libc = None
+
+    @classmethod
+    def available(cls) -> bool:
+        if cls._libc is None:
+            try:
+                import ctypes, ctypes.util
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                ok = hasattr(libc, "inotify_init1") and hasattr(libc, "inotify_add_watch")
+                cls._libc = libc if ok else False
+            except (OSError, AttributeError):
+                cls._libc = False
+        return bool(cls._libc)
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+
+    def __enter__(self):
+        libc = self._libc
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError("inotify_init1 failed")
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(self.folder)), mask) < 0:
+            os.close(self.fd)
+            raise OSError("inotify_add_watch failed")
+        return self
+
+    def wait(self, timeout: float) -> bool:
+        """True if any event arrived (events are drained, we only need the wake-up)."""
+        import select
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r:
+            return False
+        got = False
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            got = True
+        if got:
+            time.sleep(0.2)     # coalesce bursts (e.g. a recorder finishing several files)
+        return got
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
@@ -0,0 +1,360 @@
+# jobs.py
+import os, sys, time, queue, threading, subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import tracing
+
+# ============================================================
+# Background ffmpeg jobs (worker pool + Tk marshalling)
+# ============================================================
+DEFAULT_WORKERS = max(1, min(3, (os.cpu_count() or 2) // 4))
+
+# process priority for speculative (background) encodes
+_WIN_IDLE_PRIORITY   = 0x00000040
+_WIN_NORMAL_PRIORITY = 0x00000020
+_POSIX_NICE          = 15
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class UiDispatcher:
+    """
+    Queue callbacks from worker threads and run them on the Tk thread via after().
+    post() only queues — it never calls into Tcl, so libVLC event threads and
+    workers can't block on a busy Tk thread. The pump (Tk thread only) runs at
+    `min_ms` while callbacks keep arriving and backs off to `max_ms` when idle,
+    so an idle window hardly wakes up; poke() brings it back to the fast rate.
+    """
+
+    def __init__(self, root, min_ms: int = 30, max_ms: int = 500):
+        self.root = root
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self._interval = min_ms
+        self._q: queue.SimpleQueue = queue.SimpleQueue()
+        self._closed = False
+        self._after_id = self.root.after(self.min_ms, self._pump)
+
+    def post(self, fn: Callable, *args):
+        """Any thread."""
+        self._q.put((fn, args))
+
+    def poke(self):
+        """Tk thread only: expect activity soon (e.g. playback started), go back to the fast rate."""
+        if self._interval > self.min_ms and self._after_id and not self._closed:
+            self.root.after_cancel(self._after_id)
+            self._interval = self.min_ms
+            self._after_id = self.root.after(0 if not self._q.empty() else self.min_ms, self._pump)
+
+    def _pump(self):
+        self._after_id = None
+        handled = 0
+        while True:
+            try:
+                fn, args = self._q.get_nowait()
+            except queue.Empty:
+                break
+            handled += 1
+            try:
+                fn(*args)
+            except Exception as e:
+                print("UI callback failed:", e)
+        if self._closed:
+            return
+        self._interval = self.min_ms if handled else min(self.max_ms, self._interval * 2)
+        self._after_id = self.root.after(self._interval, self._pump)
+
+    def close(self):
+        """Tk thread: stops the pump; anything posted afterwards is never run."""
+        self._closed = True
+        if self._after_id:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+
+class Job:
+    def __init__(self, key, label: str):
+        self.key = key
+        self.label = label
+        self.fraction = 0.0
+        self.eta: float | None = None
+        self.speed: float | None = None
+        self.started = time.monotonic()
+        self.done = False
+        self.result = None
+        self.error: BaseException | None = None
+        self.background = False
+        self._span = (0.0, 1.0)
+        self._cancel = threading.Event()
+        self._proc: subprocess.Popen | None = None
+        self._progress_cbs: list[Callable] = []
+        self._done_cbs: list[Callable] = []
+        self._notify: Callable[[], None] | None = None
+        self._parent: Job | None = None
+        self._weight = 1.0
+        self._children: list[Job] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.terminate()
+            except OSError:
+                pass
+        for sub in list(self._children):
+            sub.cancel()
+
+    def set_background(self, on: bool):
+        """Background jobs run ffmpeg at idle priority; claiming one bumps it back."""
+        self.background = on
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            _set_priority(proc, low=on)
+        for sub in list(self._children):
+            sub.set_background(on)
+
+    def child(self, label: str, weight: float = 1.0) -> "Job":
+        """Sub-step run concurrently with its siblings; progress rolls up into this job."""
+        sub = Job(self.key, label)
+        sub.background = self.background
+        sub._parent = self
+        sub._weight = weight
+        self._children.append(sub)
+        if self.cancelled:
+            sub._cancel.set()
+        return sub
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.label)
+
+    def set_span(self, lo: float, hi: float):
+        """Map the next step's 0..1 progress onto [lo, hi] of the whole job (multi-pass work)."""
+        self._span = (lo, hi)
+
+    def report(self, fraction: float, speed: float | None = None):
+        """Called from the worker; computes ETA from elapsed wall time."""
+        lo, hi = self._span
+        self.fraction = max(0.0, min(1.0, lo + (hi - lo) * fraction))
+        self.speed = speed
+        elapsed = time.monotonic() - self.started
+        self.eta = elapsed * (1 - self.fraction) / self.fraction if self.fraction > 0.01 else None
+        if self._parent is not None:
+            self._parent._rollup()
+        if self._notify:
+            self._notify()
+
+    def clear_children(self):
+        self._children = []
+
+    def _rollup(self):
+        children = list(self._children)
+        total = sum(c._weight for c in children) or 1.0
+        self.report(sum(c.fraction * c._weight for c in children) / total)
+
+
+class JobQueue:
+    """
+    Bounded pool for long-running work (ffmpeg encodes). Submitting a key that
+    is already queued or running attaches to the in-flight job instead of
+    starting a second one. Callbacks run through `dispatch` (UI thread).
+    """
+
+    def __init__(self, dispatch: Callable[..., None] | None = None, max_workers: int = DEFAULT_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clipjob")
+        self._dispatch = dispatch or (lambda fn, *args: fn(*args))
+        self._lock = threading.Lock()
+        self._jobs: dict = {}
+
+    def submit(self, key, label: str, fn: Callable[[Job], object],
+               on_done: Callable[[Job], None] | None = None,
+               on_progress: Callable[[Job], None] | None = None,
+               background: bool = False) -> Job:
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = Job(key, label)
+                job.background = background
+                job._notify = lambda j=job: self._notify_progress(j)
+                self._jobs[key] = job
+                fresh = True
+            else:
+                fresh = False
+            if on_done:
+                job._done_cbs.append(on_done)
+            if on_progress:
+                job._progress_cbs.append(on_progress)
+        if fresh:
+            self._pool.submit(self._run, job, fn)
+        return job
+
+    def get(self, key) -> Job | None:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def active(self) -> list[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, key):
+        job = self.get(key)
+        if job:
+            job.cancel()
+
+    def shutdown(self):
+        for job in self.active():
+            job.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _notify_progress(self, job: Job):
+        for cb in list(job._progress_cbs):
+            self._dispatch(cb, job)
+
+    def _run(self, job: Job, fn: Callable[[Job], object]):
+        job.started = time.monotonic()
+        try:
+            job.check_cancelled()
+            job.result = fn(job)
+        except BaseException as e:
+            job.error = e
+        finally:
+            job.done = True
+            with self._lock:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+            for cb in list(job._done_cbs):
+                self._dispatch(cb, job)
+
+
+# ---------- ffmpeg with -progress ----------
+def run_ffmpeg(cmd: list[str], job: Job | None = None, duration: float | None = None,
+               log: list[str] | None = None) -> dict[str, str]:
+    """
+    Run ffmpeg, parsing `-progress pipe:1` to update `job` (fraction/ETA).
+    Returns the last progress block; `log` receives the stderr tail (where
+    filters like volumedetect report). Raises JobCancelled if the job is
+    cancelled, RuntimeError on failure.
+    """
+    with tracing.span("ffmpeg", args=" ".join(cmd[1:])[:400]) as sp:
+        last, err_tail = _run_ffmpeg(cmd, job, duration)
+        if log is not None:
+            log.extend(err_tail)
+        # ffmpeg's own view of the run; the stderr tail is otherwise dropped on success
+        sp.set(speed=last.get("speed"), fps=last.get("fps"), out_time_s=parse_out_time(last),
+               stderr="".join(list(err_tail)[-8:]) if tracing.ENABLED else None)
+        return last
+
+
+def _run_ffmpeg(cmd: list[str], job: Job | None, duration: float | None) -> tuple[dict[str, str], deque]:
+    full = [cmd[0], "-hide_banner", "-nostats", "-progress", "pipe:1"] + cmd[1:]
+    low = job is not None and job.background
+    kwargs = {}
+    if sys.platform.startswith("win"):
+        kwargs["creationflags"] = getattr(subprocess, "CREATE_NO_WINDOW", 0) | (_WIN_IDLE_PRIORITY if low else 0)
+    elif low:
+        kwargs["preexec_fn"] = lambda: os.nice(_POSIX_NICE)
+    proc = subprocess.Popen(
+        full, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+        text=True, errors="ignore", **kwargs,
+    )
+    if job is not None:
+        job._proc = proc
+        if job.cancelled:
+            proc.terminate()
+
+    # drain stderr in the background so the pipe never fills up
+    err_tail: deque[str] = deque(maxlen=60)
+    err_thread = threading.Thread(target=lambda: err_tail.extend(proc.stderr), daemon=True)
+    err_thread.start()
+
+    block: dict[str, str] = {}
+    last: dict[str, str] = {}
+    for line in proc.stdout:
+        k, _, v = line.strip().partition("=")
+        if not k:
+            continue
+        block[k] = v
+        if k != "progress":
+            continue
+        # one progress block finished
+        if job is not None and duration:
+            out_s = parse_out_time(block)
+            if out_s is not None:
+                job.report(out_s / duration, parse_speed(block.get("speed")))
+        last, block = block, {}
+
+    rc = proc.wait()
+    err_thread.join(timeout=2)
+    if job is not None:
+        job._proc = None
+        job.check_cancelled()
+    if rc != 0:
+        raise RuntimeError("ffmpeg failed:\n" + "".join(err_tail))
+    return last, err_tail
+
+
+def _set_priority(proc: subprocess.Popen, low: bool):
+    try:
+        if sys.platform.startswith("win"):
+            import ctypes
+            prio = _WIN_IDLE_PRIORITY if low else _WIN_NORMAL_PRIORITY
+            ctypes.windll.kernel32.SetPriorityClass(int(proc._handle), prio)  # type: ignore[attr-defined]
+        else:
+            # raising priority back needs privileges on POSIX; best effort
+            os.setpriority(os.PRIO_PROCESS, proc.pid, _POSIX_NICE if low else 0)
+    except Exception:
+        pass
+
+
+def parse_out_time(block: dict[str, str]) -> float | None:
+    # out_time_us is the accurate one; out_time_ms is also microseconds in ffmpeg
+    for k in ("out_time_us", "out_time_ms"):
+        v = block.get(k)
+        if v and v != "N/A":
+            try:
+                return int(v) / 1_000_000
+            except ValueError:
+                pass
+    v = block.get("out_time")
+    if v and v != "N/A":
+        try:
+            h, m, s = v.split(":")
+            return int(h) * 3600 + int(m) * 60 + float(s)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_speed(v: str | None) -> float | None:
+    if not v or v == "N/A":
+        return None
+    try:
+        return float(v.strip().rstrip("x"))
+    except ValueError:
+        return None
+
+
+def fmt_time(ms: int | None) -> str:
+    if ms is None or ms < 0:
+        return "00:00"
+    s = int(ms // 1000)
+    return f"{s//60:02d}:{s%60:02d}"
+
+
+def fmt_eta(seconds: float | None) -> str:
+    if seconds is None:
+        return "--:--"
+    s = int(seconds)
+    return f"{s//60:d}:{s%60:02d}"
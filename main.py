@@ -1,267 +1,43 @@
 # main.py
-import os, sys, subprocess, tempfile, shutil, ctypes
+import os, sys
+
+# headless mode: `main.py batch <folder|files...>` must not load Tk or VLC
+if __name__ == "__main__" and sys.argv[1:2] == ["batch"]:
+    from batch import main as batch_main
+    sys.exit(batch_main(sys.argv[2:]))
+
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from pathlib import Path
 
-# -------- Robust VLC bootstrap (handles _internal\vlc\plugins and _internal\plugins) --------
-import os, sys, ctypes
-from pathlib import Path
-
-
-def resource_path(rel: str) -> str:
-    """Return absolute path to resource, working for dev and PyInstaller."""
-    if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
-        base = Path(sys._MEIPASS)           # _internal during runtime
-    else:
-        base = Path(__file__).resolve().parent
-    return str((base / rel).resolve())
-
-
-def exe_dir() -> Path:
-    if getattr(sys, "frozen", False):
-        return Path(sys.executable).resolve().parent
-    return Path(__file__).resolve().parent
-
-BASE = exe_dir()
-INTERNAL = BASE / "_internal"
-VENDOR = BASE / "vendor"
-
-roots: list[Path] = []
-if INTERNAL.exists():
-    roots.append(INTERNAL)
-roots.append(BASE)
-if VENDOR.exists():
-    roots.append(VENDOR)
-
-VLC_DLL: Path | None = None
-VLC_PLUGINS: Path | None = None
-
-for r in roots:
-    # A: dll in root, plugins in root/plugins or root/vlc/plugins
-    dll_root = r / "libvlc.dll"
-    if dll_root.exists():
-        VLC_DLL = dll_root
-        # two possible plugin layouts
-        if (r / "plugins").exists():
-            VLC_PLUGINS = r / "plugins"
-        elif (r / "vlc" / "plugins").exists():
-            VLC_PLUGINS = r / "vlc" / "plugins"
-        break
-    # B: dll under vlc/, plugins under vlc/plugins
-    dll_nested = r / "vlc" / "libvlc.dll"
-    if dll_nested.exists():
-        VLC_DLL = dll_nested
-        if (r / "vlc" / "plugins").exists():
-            VLC_PLUGINS = r / "vlc" / "plugins"
-        break
-
-# Prepare environment and force-load DLL
-if VLC_DLL:
-    if hasattr(os, "add_dll_directory"):
-        try:
-            os.add_dll_directory(str(VLC_DLL.parent))
-        except Exception:
-            pass
-    os.environ["PATH"] = str(VLC_DLL.parent) + os.pathsep + os.environ.get("PATH", "")
-else:
-    print("⚠ libvlc.dll not found under _internal/, next to EXE, or vendor/. Will try system VLC if available.")
-
-# Find ffmpeg tools too (used later)
-def find_tool(name: str) -> str:
-    candidates = [
-        INTERNAL / "ffmpeg" / name,
-        BASE / "ffmpeg" / name,
-        VENDOR / "ffmpeg" / name,
-    ]
-    for p in candidates:
-        if p.exists():
-            return str(p)
-    return name
-
-FFMPEG  = find_tool("ffmpeg.exe")
-FFPROBE = find_tool("ffprobe.exe")
-
-# Now import python-vlc
-import vlc
-
-# Build list of candidate plugin paths to try
-plugin_candidates = []
-if VLC_PLUGINS:
-    plugin_candidates.append(Path(VLC_PLUGINS))
-# also try a folder named "plugins" next to the DLL (common requirement)
-if VLC_DLL:
-    plugin_candidates.append(VLC_DLL.parent / "plugins")
-
-# De-duplicate while preserving order
-seen = set()
-clean_candidates = []
-for c in plugin_candidates:
-    p = c.resolve()
-    if p not in seen and p.exists():
-        clean_candidates.append(p)
-        seen.add(p)
-
-# Try initializing libVLC with several arg styles and plugin paths
-_instance = None
-for cand in clean_candidates + [None]:  # final None = try with no explicit plugin path
-    args = ["--no-video-title-show"]
-    if cand is not None:
-        args.append(f"--plugin-path={cand}")
-        os.environ["VLC_PLUGIN_PATH"] = str(cand)               # env for libvlc
-        os.environ["PYTHON_VLC_MODULE_PATH"] = str(cand)        # env some python-vlc versions read
-    try:
-        # ensure DLL is actually loadable (bitness problems would raise here)
-        if VLC_DLL:
-            ctypes.CDLL(str(VLC_DLL))
-        _instance = vlc.Instance(*args)
-    except Exception:
-        _instance = None
-    if _instance is not None:
-        break
-
-if _instance is None:
-    raise RuntimeError(
-        "Failed to create VLC instance (vlc.Instance() returned None).\n"
-        f"Searched for libvlc.dll under:\n"
-        f"  {INTERNAL}\n  {BASE}\n  {VENDOR/'vlc'}\n"
-        "Make sure libvlc.dll is 64-bit and that a 'plugins' folder exists.\n"
-        "Tip: If plugins are inside '\\vlc\\plugins', try moving/copying them to a folder named just 'plugins' next to libvlc.dll."
-    )
-
-# Now import python-vlc
-import vlc
-
-# Build list of candidate plugin paths to try
-plugin_candidates = []
-if VLC_PLUGINS:
-    plugin_candidates.append(Path(VLC_PLUGINS))
-# also try a folder named "plugins" next to the DLL (common requirement)
-if VLC_DLL:
-    plugin_candidates.append(VLC_DLL.parent / "plugins")
-
-# De-duplicate while preserving order
-seen = set()
-clean_candidates = []
-for c in plugin_candidates:
-    p = c.resolve()
-    if p not in seen and p.exists():
-        clean_candidates.append(p)
-        seen.add(p)
-
-# Try initializing libVLC with several arg styles and plugin paths
-_instance = None
-for cand in clean_candidates + [None]:  # final None = try with no explicit plugin path
-    args = ["--no-video-title-show"]
-    if cand is not None:
-        args.append(f"--plugin-path={cand}")
-        os.environ["VLC_PLUGIN_PATH"] = str(cand)               # env for libvlc
-        os.environ["PYTHON_VLC_MODULE_PATH"] = str(cand)        # env some python-vlc versions read
-    try:
-        # ensure DLL is actually loadable (bitness problems would raise here)
-        if VLC_DLL:
-            ctypes.CDLL(str(VLC_DLL))
-        _instance = vlc.Instance(*args)
-    except Exception:
-        _instance = None
-    if _instance is not None:
-        break
-
-if _instance is None:
-    raise RuntimeError(
-        "Failed to create VLC instance (vlc.Instance() returned None).\n"
-        f"Searched for libvlc.dll under:\n"
-        f"  {INTERNAL}\n  {BASE}\n  {VENDOR/'vlc'}\n"
-        "Make sure libvlc.dll is 64-bit and that a 'plugins' folder exists.\n"
-        "Tip: If plugins are inside '\\vlc\\plugins', try moving/copying them to a folder named just 'plugins' next to libvlc.dll."
-    )
-
-# Safe to import vlc now
-import vlc
-
-# Create a libVLC instance with explicit plugin path (when we know it)
-def _debug(msg: str):
-    try:
-        print(msg)
-    except Exception:
-        pass
-
-# Make sure python-vlc sees both the DLL and plugins
-if VLC_DLL:
-    os.environ["PYTHON_VLC_LIB_PATH"] = str(VLC_DLL)
-if VLC_PLUGINS:
-    # python-vlc older/newer env names + VLC native arg
-    os.environ["VLC_PLUGIN_PATH"] = str(VLC_PLUGINS)
-    os.environ["PYTHON_VLC_MODULE_PATH"] = str(VLC_PLUGINS)
-
-# Also help Windows loader
-if VLC_DLL and hasattr(os, "add_dll_directory"):
-    try:
-        os.add_dll_directory(str(VLC_DLL.parent))
-    except Exception as e:
-        _debug(f"add_dll_directory failed: {e}")
-
-# Show what we detected
-_debug(f"[VLC] DLL: {VLC_DLL}")
-_debug(f"[VLC] PLUGINS: {VLC_PLUGINS}")
-
-# Try several init styles
-_instance = None
-attempts = []
-
-# 1) Explicit plugin path
-if VLC_PLUGINS:
-    attempts.append((f"--plugin-path={VLC_PLUGINS}",))
-
-# 2) Minimal args
-attempts.append(("--no-video-title-show",))
-
-# 3) No args at all
-attempts.append(tuple())
-
-for args in attempts:
-    try:
-        _debug(f"[VLC] Trying vlc.Instance{args} ...")
-        _instance = vlc.Instance(*args)
-    except Exception as e:
-        _debug(f"[VLC] Instance error: {e}")
-        _instance = None
-    if _instance is not None:
-        break
-
-if _instance is None:
-    # Extra hint: print folder contents so we know what PyInstaller packed
-    try:
-        from glob import glob
-        _debug("[VLC] Listing DLL dir:")
-        _debug("\n".join(glob(str((VLC_DLL.parent if VLC_DLL else Path('.')) / "*.dll"))))
-        _debug("[VLC] Listing plugins dir:")
-        if VLC_PLUGINS:
-            _debug("\n".join(glob(str(Path(VLC_PLUGINS) / "**" / "*.dll"), recursive=True)[:20]) + "\n... (truncated)")
-    except Exception:
-        pass
-
-    raise RuntimeError(
-        "Failed to create VLC instance (vlc.Instance() returned None).\n"
-        f"Searched for libvlc.dll under:\n"
-        f"  {INTERNAL}\n  {BASE}\n  {VENDOR/'vlc'}\n"
-        "Make sure libvlc.dll is 64-bit and a 'plugins' folder exists.\n"
-        "Tip: your build currently has VLC under: "
-        f"{(INTERNAL/'vlc') if (INTERNAL/'vlc').exists() else '(not found)'}"
-    )
+from bootstrap import VlcLoader, load_layout, prepare_environment, report_first_window, resource_path
+from compcache import CompressionCache, app_cache_dir
+from engine import DISCORD_SOFT_LIMIT, VIDEO_EXTS, DiscordEngine
+from planner import MODES
+from jobs import Job, JobQueue, JobCancelled, UiDispatcher, fmt_eta, fmt_time
+from prefetch import Prefetcher
+from folderindex import FolderIndex, FolderWatcher
+from metadata import MetadataService
+from thumbs import SPRITE_MAX_BYTES, ThumbnailService
+from mediapool import MediaPool
+from catalogue import SORTS, Catalogue
+from cliplist import ClipList
+from urlcache import Download, UrlCache, is_url
+from clipboard import Clipboard, create_backend
+import tracing
+
+# -------- VLC / FFmpeg bootstrap (layout cached between runs, see bootstrap.py) --------
+LAYOUT = load_layout()
+prepare_environment(LAYOUT)
+FFMPEG  = LAYOUT.ffmpeg
+FFPROBE = LAYOUT.ffprobe
+_vlc_loader = VlcLoader(LAYOUT)     # libVLC loads while Tk builds the window
 
 # ============================================================
 # App logic
 # ============================================================
-VIDEO_EXTS = {".mp4", ".avi", ".mkv", ".mov", ".wmv", ".webm", ".m4v"}
-DISCORD_SOFT_LIMIT = 10_000_000  # 10 MB
-DISCORD_TARGET     = 9_500_000   # ~9.5 MB target
-
-def fmt_time(ms: int | None) -> str:
-    if ms is None or ms < 0:
-        return "00:00"
-    s = int(ms // 1000)
-    return f"{s//60:02d}:{s%60:02d}"
+ENCODE_MODE        = os.environ.get("CLIPVIEWER_ENCODE_MODE", "auto")  # auto | single | segmented
+CACHE_MAX_BYTES    = int(os.environ.get("CLIPVIEWER_CACHE_MB", "2048")) * 1024 * 1024
 
 class ClipViewer(tk.Tk):
     def __init__(self):
@@ -277,18 +53,68 @@ class ClipViewer(tk.Tk):
         
         
         self.title("Video Player")
-        self.geometry("960x640")
+        self.geometry("1240x640")
+        self.bind("<Map>", self._on_first_map, add="+")
 
         # state
         self.folder: Path | None = None
-        self.files: list[Path] = []
+        self.files: Catalogue | list[Path] = []
         self.index = -1
         self.seeking = False
         self.after_id = None
-        self._temp_dir = Path(tempfile.mkdtemp(prefix="clipviewer_"))
-        self._compressed_cache: dict[str, Path] = {}
+        self._vlc_time = -1
+        self._vlc_length = 0
+        self._time_post_pending = False
+        self._vlc_second = -1           # last whole second posted (the label's resolution)
+        self._events_attached = False
+        self._shown_time_text = ""
+        self._shown_pos = -1
+        self._cache = CompressionCache(max_bytes=CACHE_MAX_BYTES)
+        self._ui = UiDispatcher(self)
+        self._stalls = tracing.StallMonitor(self)
+        self._jobs = JobQueue(dispatch=self._ui.post)
+        self._folder_index = FolderIndex(app_cache_dir() / "folders.sqlite3", VIDEO_EXTS)
+        self._meta = MetadataService(
+            FFPROBE, app_cache_dir() / "probes.sqlite3",
+            on_probed=self._on_probed,
+        )
+        self._thumbs = ThumbnailService(
+            FFMPEG, CompressionCache(app_cache_dir() / "thumbs", max_bytes=SPRITE_MAX_BYTES),
+            JobQueue(dispatch=self._ui.post, max_workers=1), self._meta.get,
+        )
+        self._preview: tk.Toplevel | None = None
+        self._preview_img: tk.PhotoImage | None = None
+        self._preview_tile: tuple | None = None
+        self._engine = DiscordEngine(FFMPEG, FFPROBE, cache=self._cache, meta=self._meta, encode_mode=ENCODE_MODE)
+        self._estimates = JobQueue(dispatch=self._ui.post, max_workers=1)
+        self._downloads = UrlCache()
+        self._clipboard = Clipboard(create_backend(), dispatch=self._ui.post)
+        self._watcher: FolderWatcher | None = None
+        self.trim_in: float | None = None     # seconds
+        self.trim_out: float | None = None
+        self._prefetch = Prefetcher(
+            JobQueue(dispatch=self._ui.post, max_workers=1),
+            self._engine.compress, min_size=DISCORD_SOFT_LIMIT,
+            busy=lambda key: self._jobs.get(key) is not None, dispatch=self._ui.post,
+        )
 
         # layout
+        side = tk.Frame(self, width=300)
+        side.pack(side=tk.RIGHT, fill=tk.Y)
+        side.pack_propagate(False)
+        bar = tk.Frame(side)
+        bar.pack(side=tk.TOP, fill=tk.X, padx=4, pady=4)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *_: self._schedule_filter())
+        self._filter_after = None
+        self._probe_after = None
+        self._list_redraw = False
+        tk.Entry(bar, textvariable=self.filter_var).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.sort_var = tk.StringVar(value="date")
+        tk.OptionMenu(bar, self.sort_var, *SORTS, command=lambda _v: self._apply_view()).pack(side=tk.RIGHT)
+        self.clip_list = ClipList(side, on_select=self._jump_to, on_scroll=self._schedule_probe_window)
+        self.clip_list.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
         self.video_frame = tk.Frame(self, bg="black")
         self.video_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
@@ -308,6 +134,11 @@ class ClipViewer(tk.Tk):
         self.btn_next.grid(row=0, column=3, padx=6, pady=(10,4))
         self.btn_copy.grid(row=0, column=4, padx=6, pady=(10,4))
 
+        self.prefetch_var = tk.BooleanVar(value=False)
+        self.chk_prefetch = tk.Checkbutton(controls, text="Pre-compress next", variable=self.prefetch_var,
+                                           command=self._toggle_prefetch)
+        self.chk_prefetch.grid(row=0, column=5, padx=6, pady=(10,4))
+
         # row 2: seek + time
         self.pos_var = tk.DoubleVar(value=0.0)
         self.pos_slider = tk.Scale(
@@ -330,11 +161,40 @@ class ClipViewer(tk.Tk):
         )
         self.vol_slider.grid(row=2, column=1, columnspan=2, sticky="w", pady=(0,10))
 
+        # row 3 (right): background job status
+        self.status_label = tk.Label(controls, text="", anchor="e")
+        self.status_label.grid(row=2, column=3, columnspan=2, sticky="e", padx=6)
+        self.btn_cancel = tk.Button(controls, text="Cancel", width=10, command=self.cancel_current_job, state=tk.DISABLED)
+        self.btn_cancel.grid(row=2, column=5, padx=8, pady=(0,10))
+
+        # row 4: trim range (set from the seek slider)
+        self.btn_in = tk.Button(controls, text="Set In", width=10, command=self.set_trim_in)
+        self.btn_out = tk.Button(controls, text="Set Out", width=10, command=self.set_trim_out)
+        self.btn_clear_trim = tk.Button(controls, text="Clear Trim", width=12, command=self.clear_trim)
+        self.trim_label = tk.Label(controls, text="Full clip", anchor="w")
+        self.btn_in.grid(row=3, column=0, padx=6, pady=(0,10))
+        self.btn_out.grid(row=3, column=1, padx=6, pady=(0,10))
+        self.btn_clear_trim.grid(row=3, column=2, padx=6, pady=(0,10), sticky="w")
+        self.trim_label.grid(row=3, column=3, columnspan=2, sticky="w", padx=6, pady=(0,10))
+        self.btn_export = tk.Button(controls, text="MP4 + GIF", width=10, command=self.export_current)
+        self.btn_export.grid(row=3, column=5, padx=8, pady=(0,10))
+
+        # row 5: encode priority (time budget) and the plan it gives for this clip
+        tk.Label(controls, text="Encode for").grid(row=4, column=0, sticky="e", padx=(12,4), pady=(0,10))
+        self.priority_var = tk.StringVar(value=self._engine.priority)
+        self.opt_priority = tk.OptionMenu(controls, self.priority_var, *MODES, command=self._set_priority)
+        self.opt_priority.grid(row=4, column=1, sticky="w", pady=(0,10))
+        self.plan_label = tk.Label(controls, text="", anchor="w")
+        self.plan_label.grid(row=4, column=2, columnspan=3, sticky="w", padx=6, pady=(0,10))
+        self.btn_estimate = tk.Button(controls, text="Estimate", width=10, command=self.estimate_current)
+        self.btn_estimate.grid(row=4, column=5, padx=8, pady=(0,10))
+
         # VLC player setup — use the instance we created above
-        self.instance = _instance
+        self.instance = _vlc_loader.instance()
         self.player = self.instance.media_player_new()
         if self.player is None:
             raise RuntimeError("libVLC returned None for media_player_new — check VLC files and plugins directory.")
+        self._media_pool = MediaPool(self.instance, mrl=self._downloads.mrl)
 
         # attach video to Tk frame (Windows)
         self.update_idletasks()
@@ -343,46 +203,275 @@ class ClipViewer(tk.Tk):
             self.player.set_hwnd(handle)  # type: ignore[attr-defined]
 
         self.pos_slider.bind("<ButtonRelease-1>", self._on_seek_commit)
+        self.pos_slider.bind("<ButtonRelease-1>", lambda _e: self._hide_preview(), add="+")
+        self.pos_slider.bind("<Motion>", self._on_slider_hover)
+        self.pos_slider.bind("<B1-Motion>", self._on_slider_hover)
+        self.pos_slider.bind("<Leave>", lambda _e: self._hide_preview())
 
         # cleanup
         self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.bind("<Control-v>", self.paste_url)
 
-        self._tick()
+        # playback UI is driven by VLC events; polling is only the fallback
+        self._events_attached = self._attach_player_events()
+        if not self._events_attached:
+            self._tick()
 
     # ---------- UI Actions ----------
     def open_folder(self):
         path = filedialog.askdirectory(initialdir="C:/", title="Select your video folder")
         if not path:
             return
-        folder = Path(path)
-        files = [p for p in folder.iterdir() if p.is_file() and p.suffix.lower() in VIDEO_EXTS]
-        files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        self._open_folder(Path(path).resolve())
+
+    def paste_url(self, _evt=None):
+        """Ctrl+V with a Discord/CDN link on the clipboard: stream it while it downloads."""
+        if isinstance(self.focus_get(), tk.Entry):
+            return      # pasting into the filter box
+        try:
+            text = self.clipboard_get()
+        except tk.TclError:
+            return
+        if is_url(text):
+            self.open_url(text.strip())
+
+    def open_url(self, url: str):
+        d = self._downloads.open(url, on_complete=lambda d: self._ui.post(self._on_download_done, d))
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        self.folder = None
+        self.files = [d.path]
+        self.index = 0
+        self._media_pool.clear()
+        self._refresh_clip_list()
+        self._load_current(start_play=True)
+        self._refresh_nav_buttons()
+        self._set_volume()
+
+    def _on_download_done(self, d: Download):
+        if d.error is not None:
+            messagebox.showerror("Download failed", f"{d.url}\n\n{d.error}")
+            return
+        if d.done and d.path in self.files and self.files[self.index] == d.path:
+            # playback carries on from the loopback stream; probe / sprites / plan now read the local file
+            self._meta.submit(d.path, on_done=lambda _info: (self._ui.post(self._update_title),
+                                                             self._ui.post(self._refresh_plan)))
+            self._thumbs.request(d.path)
+
+    @tracing.traced("open_folder")
+    def _open_folder(self, folder: Path):
+        # show the last known listing right away and reconcile in the background;
+        # a folder we've never seen gets one synchronous scandir pass
+        rows = self._folder_index.rows(folder)
+        from_cache = bool(rows)
+        if not from_cache:
+            self._folder_index.refresh(folder)
+            rows = self._folder_index.rows(folder)
+        files = Catalogue(folder, rows)
 
         if not files:
             messagebox.showinfo("No videos", "No supported video files in this folder.")
             return
 
+        self.filter_var.set("")
+        files.set_view(self.sort_var.get(), "")
         self.folder = folder
         self.files = files
         self.index = 0
+        self._media_pool.clear()
+        self._refresh_clip_list()
         self._load_current(start_play=True)
         self._refresh_nav_buttons()
         self._set_volume()
+        self._watch_folder(folder, catch_up=from_cache)
+
+    def _watch_folder(self, folder: Path, catch_up: bool):
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._watcher = FolderWatcher(
+            folder, self._folder_index,
+            lambda added, removed: self._ui.post(self._on_folder_changed, folder, added, removed),
+            initial_refresh=catch_up,
+        )
 
+    def _on_folder_changed(self, folder: Path, added: list[Path], removed: list[Path]):
+        if folder != self.folder:
+            return
+        current = self.files[self.index] if 0 <= self.index < len(self.files) else None
+        known = self.files
+        fresh = [p for p in added if known.row_of(p) is None]
+        # the watcher already applied the diff to the index; a rebuild is one query + array fills
+        self.files = Catalogue(folder, self._folder_index.rows(folder))
+        self.files.set_view(known.sort, known.query, keep=current)
+        i = self.files.index_of(current) if current is not None else None
+        self.index = i if i is not None else min(self.index, len(self.files) - 1)
+        self._refresh_clip_list()
+        self._refresh_nav_buttons()
+        self._update_title()
+        self._prefetch.update(self.files, self.index)
+        if fresh:
+            self._meta.prefetch(self.files, self.index)
+
+    # ---------- Clip list ----------
+    def _refresh_clip_list(self):
+        self._list_redraw = False
+        files = self.files
+        label = files.label if isinstance(files, Catalogue) else (lambda i: (files[i].name, ""))
+        self.clip_list.set_source(len(files), label, self.index)
+
+    def _jump_to(self, i: int):
+        if i != self.index and 0 <= i < len(self.files):
+            self.index = i
+            self._load_current(start_play=True)
+            self._refresh_nav_buttons()
+
+    def _schedule_probe_window(self, middle: int):
+        # probe around what's on screen once scrolling settles
+        if self._probe_after is not None:
+            self.after_cancel(self._probe_after)
+        self._probe_after = self.after(200, self._probe_window, middle)
+
+    def _probe_window(self, middle: int):
+        self._probe_after = None
+        self._meta.prefetch(self.files, middle)
+
+    def _schedule_filter(self):
+        # typing filters after a short pause instead of on every keystroke
+        if self._filter_after is not None:
+            self.after_cancel(self._filter_after)
+        self._filter_after = self.after(150, self._apply_view)
+
+    def _apply_view(self):
+        self._filter_after = None
+        files = self.files
+        if not isinstance(files, Catalogue):
+            return
+        current = files[self.index] if 0 <= self.index < len(files) else None
+        with tracing.span("catalogue.view", rows=files.rows):
+            files.set_view(self.sort_var.get(), self.filter_var.get(), keep=current)
+        i = files.index_of(current) if current is not None else None
+        self.index = i if i is not None else (0 if files else -1)
+        self._refresh_clip_list()
+        self._refresh_nav_buttons()
+        self._update_title()
+        self._media_pool.update(files, self.index)
+        self._prefetch.update(files, self.index)
+        self._meta.prefetch(files, self.index)
+
+    def _on_probed(self, info):
+        """Probe thread: persist what the listing shows, and fill in the clip's length in the list."""
+        self._folder_index.store_probe(info.path, info.size, info.mtime_ns, info.duration, info.vcodec)
+        self._ui.post(self._note_duration, info.path, info.duration)
+
+    def _note_duration(self, path: Path, duration: float | None):
+        if isinstance(self.files, Catalogue) and path.parent == self.files.folder:
+            self.files.set_duration(path, duration)
+            if not self._list_redraw:       # one redraw per burst of probes
+                self._list_redraw = True
+                self.after_idle(self._durations_landed)
+
+    def _durations_landed(self):
+        files = self.files
+        if isinstance(files, Catalogue) and files.sort == "length" and 0 <= self.index < len(files):
+            # new lengths move rows: re-sort, keeping the current clip selected
+            current = files[self.index]
+            files.set_view(keep=current)
+            i = files.index_of(current)
+            self.index = i if i is not None else 0
+            self._refresh_nav_buttons()
+            self._media_pool.update(files, self.index)
+            self._prefetch.update(files, self.index)
+        self._refresh_clip_list()
+
+    @tracing.traced("load_current")
     def _load_current(self, start_play=False):
         if not (0 <= self.index < len(self.files)):
             return
+        self.clip_list.select(self.index)
         current = self.files[self.index].resolve()
-        media = self.instance.media_new(str(current))
-        self.player.set_media(media)
-        self.title(f"Video Player — {current.name}  ({self.index+1}/{len(self.files)})")
+        self.player.set_media(self._media_pool.get(current))
+        self._vlc_time, self._vlc_length = -1, 0
+        self._vlc_second = -1
+        self._update_time_widgets(0, 0)
+        self._update_title()
+        if self._meta.peek(current) is None:
+            self._meta.submit(current, on_done=lambda _info: (self._ui.post(self._update_title),
+                                                              self._ui.post(self._refresh_plan)))
+        self._thumbs.request(current)
         if start_play:
             self.player.play()
             self.btn_play.config(text="Pause")
         self.btn_play.config(state=tk.NORMAL)
         self.btn_copy.config(state=tk.NORMAL)
+        self.clear_trim()
+        self._refresh_plan()
+        self._media_pool.update(self.files, self.index)
+        self._prefetch.update(self.files, self.index)
+        self._meta.prefetch(self.files, self.index)
+
+    def _on_first_map(self, evt):
+        if evt.widget is self:
+            self.unbind("<Map>")
+            report_first_window(_vlc_loader)
+
+    def _update_title(self):
+        if not (0 <= self.index < len(self.files)):
+            return
+        current = self.files[self.index]
+        title = f"Video Player — {current.name}  ({self.index+1}/{len(self.files)})"
+        info = self._meta.peek(current.resolve())
+        if info is not None:
+            title += f"  —  {info.describe()}"
+        self.title(title)
+
+    def _set_priority(self, mode: str):
+        self._engine.priority = mode
+        self._refresh_plan()
+
+    def _refresh_plan(self):
+        """Show what a copy would do with the current clip before anything is encoded."""
+        if not (0 <= self.index < len(self.files)):
+            return
+        current = self.files[self.index].resolve()
+        info = self._meta.peek(current)
+        if info is None:
+            self.plan_label.config(text="")
+        elif info.size <= DISCORD_SOFT_LIMIT:
+            self.plan_label.config(text="Fits Discord as is")
+        else:
+            plan = self._engine.plan_for(current, info)
+            if plan is not None and not plan.fits:
+                self.plan_label.config(text=f"Too long for Discord, even at {plan.width}x{plan.height}@{plan.fps:g}")
+                return
+            text = f"Plan: {plan.describe()}, {self._engine.audio_plan(info).describe()}" if plan else ""
+            est = self._engine.cached_estimate(current, info) if plan else None
+            if est is not None:
+                text += f"  →  {est.describe()}"
+            elif self._estimates.get(("estimate", str(current))) is not None:
+                text += "  →  estimating…"
+            self.plan_label.config(text=text)
+
+    def estimate_current(self):
+        """Sample-encode the current clip (a second or two) to predict size, quality and time."""
+        if not (0 <= self.index < len(self.files)):
+            return
+        current = self.files[self.index].resolve()
+
+        def done(job: Job):
+            if job.error is not None and not isinstance(job.error, JobCancelled):
+                self.status_label.config(text=f"Estimate failed for {job.label}: {str(job.error).splitlines()[0]}")
+            self._refresh_plan()
+
+        self._estimates.submit(("estimate", str(current)), current.name,
+                               lambda job: self._engine.estimate(current, job), on_done=done)
+        self._refresh_plan()
+
+    def _toggle_prefetch(self):
+        self._prefetch.set_enabled(self.prefetch_var.get(), self.files, self.index)
 
     def toggle_play(self):
+        self._ui.poke()
         if self.player.is_playing():
             self.player.pause()
             self.btn_play.config(text="Play")
@@ -402,6 +491,43 @@ class ClipViewer(tk.Tk):
             self._load_current(start_play=True)
         self._refresh_nav_buttons()
 
+    # ---------- Trim range ----------
+    def _slider_seconds(self) -> float | None:
+        length = self.player.get_length()
+        if not length or length <= 0:
+            return None
+        return length / 1000.0 * self.pos_var.get() / 1000.0
+
+    def set_trim_in(self):
+        t = self._slider_seconds()
+        if t is None:
+            return
+        self.trim_in = t
+        if self.trim_out is not None and self.trim_out <= t:
+            self.trim_out = None
+        self._refresh_trim_label()
+
+    def set_trim_out(self):
+        t = self._slider_seconds()
+        if t is None:
+            return
+        self.trim_out = t
+        if self.trim_in is not None and self.trim_in >= t:
+            self.trim_in = None
+        self._refresh_trim_label()
+
+    def clear_trim(self):
+        self.trim_in = self.trim_out = None
+        self._refresh_trim_label()
+
+    def _refresh_trim_label(self):
+        if self.trim_in is None and self.trim_out is None:
+            self.trim_label.config(text="Full clip")
+            return
+        a = fmt_time(int((self.trim_in or 0) * 1000))
+        b = fmt_time(int(self.trim_out * 1000)) if self.trim_out is not None else "end"
+        self.trim_label.config(text=f"Trim {a} → {b}")
+
     def _refresh_nav_buttons(self):
         self.btn_prev.config(state=(tk.NORMAL if self.index > 0 else tk.DISABLED))
         self.btn_next.config(state=(tk.NORMAL if self.index < len(self.files) - 1 else tk.DISABLED))
@@ -411,128 +537,199 @@ class ClipViewer(tk.Tk):
         if not (0 <= self.index < len(self.files)):
             return
         src = self.files[self.index].resolve()
-        try:
-            if src.stat().st_size > DISCORD_SOFT_LIMIT:
-                dst = self._compress_for_discord(src)
-                path_to_copy = str(dst)
-                label = f"{dst.name} (compressed)"
-            else:
-                path_to_copy = str(src)
-                label = src.name
-
-            safe_path = path_to_copy.replace("'", "''")
-            ps = f"Set-Clipboard -Path '{safe_path}'"
-            subprocess.run(
-                ["powershell", "-NoProfile", "-Command", ps],
-                check=True, capture_output=True, text=True
+        on_progress = lambda _job: self._refresh_job_status()
+        download = self._downloads.pending(src)
+        if download is not None:
+            # finish the download (same bytes VLC is playing), then copy or compress the local file
+            def fetch_then_compress(job: Job) -> Path:
+                job.set_span(0.0, 0.3)
+                path = download.wait(job)
+                job.set_span(0.3, 1.0)
+                return path if path.stat().st_size <= DISCORD_SOFT_LIMIT else self._engine.compress(path, job)
+            self._jobs.submit(("compress", str(src)), src.name, fetch_then_compress,
+                              on_done=self._on_compress_done, on_progress=on_progress)
+            self._refresh_job_status()
+            return
+        if self.trim_in is not None or self.trim_out is not None:
+            start, end = self.trim_in or 0.0, self.trim_out
+            self._jobs.submit(
+                ("trim", str(src), start, end), src.name,
+                lambda job: self._engine.trim(src, start, end, job),
+                on_done=self._on_compress_done,
+                on_progress=on_progress,
             )
-            #self._toast(f"Copied to clipboard:\n{label}")
-        except subprocess.CalledProcessError as e:
-            messagebox.showerror("Clipboard error", e.stderr or e.stdout or str(e))
+            self._refresh_job_status()
+            return
+        try:
+            if src.stat().st_size <= DISCORD_SOFT_LIMIT:
+                self._set_clipboard(src)
+                return
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
 
-    def _compress_for_discord(self, src: Path) -> Path:
-        key = str(src)
-        if key in self._compressed_cache and self._compressed_cache[key].exists():
-            return self._compressed_cache[key]
-
-        duration = self._probe_duration(src)
-        out = Path(self._temp_dir) / (src.stem + "_dc9p5mb.mp4")
-
-        if duration and duration > 0:
-            target_bits_total = DISCORD_TARGET * 8
-            audio_kbps = 96
-            video_kbps = max(150, int((target_bits_total / duration) / 1000 - audio_kbps))
-            cmd = [
-                FFMPEG, "-y", "-i", str(src),
-                "-c:v", "libx264", "-preset", "veryfast",
-                "-b:v", f"{video_kbps}k", "-maxrate", f"{video_kbps}k", "-bufsize", f"{video_kbps*2}k",
-                "-c:a", "aac", "-b:a", f"{audio_kbps}k",
-                "-movflags", "+faststart",
-                str(out)
-            ]
-        else:
-            cmd = [
-                FFMPEG, "-y", "-i", str(src),
-                "-c:v", "libx264", "-preset", "veryfast", "-crf", "28",
-                "-c:a", "aac", "-b:a", "96k",
-                "-movflags", "+faststart",
-                "-fs", str(DISCORD_TARGET),
-                str(out)
-            ]
-
-        self._run_ffmpeg(cmd)
-
-        if out.exists() and out.stat().st_size > DISCORD_TARGET and duration and duration > 0:
-            try_kbps = max(120, int(self._extract_bitrate_kbps(cmd) * 0.85))
-            cmd2 = [
-                FFMPEG, "-y", "-i", str(src),
-                "-c:v", "libx264", "-preset", "veryfast",
-                "-b:v", f"{try_kbps}k", "-maxrate", f"{try_kbps}k", "-bufsize", f"{try_kbps*2}k",
-                "-c:a", "aac", "-b:a", "96k",
-                "-movflags", "+faststart",
-                str(out)
-            ]
-            self._run_ffmpeg(cmd2)
-
-        if not out.exists():
-            raise RuntimeError("ffmpeg did not produce output.")
-        self._compressed_cache[key] = out
-        return out
-
-    @staticmethod
-    def _extract_bitrate_kbps(cmd: list[str]) -> int:
-        if "-b:v" in cmd:
-            i = cmd.index("-b:v")
-            try:
-                return int(cmd[i+1].rstrip("k"))
-            except Exception:
-                return 800
-        return 800
-
-    @staticmethod
-    def _run_ffmpeg(cmd: list[str]):
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            out = (e.stderr or b"").decode(errors="ignore")
-            raise RuntimeError(f"ffmpeg failed:\n{out}") from e
+        # compress in the background; copy when the encode lands
+        if self._prefetch.claim(src, self._on_compress_done, on_progress) is not None:
+            self._refresh_job_status()
+            return
+        self._jobs.submit(
+            ("compress", str(src)), src.name,
+            lambda job: self._engine.compress(src, job),
+            on_done=self._on_compress_done,
+            on_progress=on_progress,
+        )
+        self._refresh_job_status()
 
-    @staticmethod
-    def _probe_duration(path: Path) -> float | None:
-        try:
-            r = subprocess.run(
-                [FFPROBE, "-v", "error", "-show_entries", "format=duration",
-                 "-of", "default=noprint_wrappers=1:nokey=1", str(path)],
-                check=True, capture_output=True, text=True
-            )
-            return float(r.stdout.strip())
-        except Exception:
-            return None
+    def export_current(self):
+        """Discord MP4 + preview GIF from one decode; both land on the clipboard."""
+        if not (0 <= self.index < len(self.files)):
+            return
+        src = self.files[self.index].resolve()
+        self._jobs.submit(
+            ("export", str(src)), src.name,
+            lambda job: self._engine.export(src, "mp4+gif", job),
+            on_done=self._on_export_done,
+            on_progress=lambda _job: self._refresh_job_status(),
+        )
+        self._refresh_job_status()
+
+    def _on_export_done(self, job: Job):
+        self._refresh_job_status()
+        if isinstance(job.error, JobCancelled):
+            return
+        if job.error is not None:
+            messagebox.showerror("Error", str(job.error))
+            return
+        self._set_clipboard(*job.result.values())
+        if not self._visible_jobs():
+            sizes = ", ".join(f"{fmt} {p.stat().st_size / 1e6:.1f} MB" for fmt, p in job.result.items())
+            self.status_label.config(text=f"Copied {job.label}: {sizes}")
+
+    def _on_compress_done(self, job: Job):
+        self._refresh_job_status()
+        if isinstance(job.error, JobCancelled):
+            return
+        if job.error is not None:
+            messagebox.showerror("Error", str(job.error))
+            return
+        self._set_clipboard(job.result)
+        report = self._engine.reports.get(str(job.result))
+        if report is not None and not self._visible_jobs():
+            self.status_label.config(text=f"Copied {job.label}: {report.summary()}")
+
+    def _set_clipboard(self, *paths: Path):
+        # returns at once; the backend (persistent PowerShell helper on Windows) copies in the background
+        self._clipboard.copy(list(paths), on_done=self._on_clipboard_done)
+
+    def _on_clipboard_done(self, paths: list[Path], error: BaseException | None):
+        if error is not None:
+            messagebox.showerror("Clipboard error", str(error))
+            return
+        #self._toast(f"Copied to clipboard:\n{paths[0].name}")
+
+    def _visible_jobs(self) -> list[Job]:
+        return self._jobs.active() + self._prefetch.visible_jobs()
+
+    def cancel_current_job(self):
+        jobs = self._visible_jobs()
+        if not jobs:
+            return
+        current = str(self.files[self.index].resolve()) if 0 <= self.index < len(self.files) else None
+        mine = [j for j in jobs if j.key == ("compress", current)]
+        (mine or jobs)[-1].cancel()
+        self._refresh_job_status()
+
+    def _refresh_job_status(self):
+        jobs = [j for j in self._visible_jobs() if not j.cancelled]
+        if not jobs:
+            self.status_label.config(text="")
+            self.btn_cancel.config(state=tk.DISABLED)
+            return
+        j = jobs[-1]
+        text = f"Compressing {j.label}: {int(j.fraction * 100)}%  ETA {fmt_eta(j.eta)}"
+        if len(jobs) > 1:
+            text += f"  (+{len(jobs) - 1} more)"
+        self.status_label.config(text=text)
+        self.btn_cancel.config(state=tk.NORMAL)
 
     # ---------- Sliders & UI updates ----------
+    def _attach_player_events(self) -> bool:
+        """Callbacks run on a libVLC thread: only stash values and post to Tk, never call the player."""
+        try:
+            import vlc
+            em = self.player.event_manager()
+            E = vlc.EventType
+            em.event_attach(E.MediaPlayerTimeChanged, self._vlc_time_changed)
+            em.event_attach(E.MediaPlayerLengthChanged, self._vlc_length_changed)
+            em.event_attach(E.MediaPlayerEndReached, lambda _e: self._ui.post(self._on_end_reached))
+            em.event_attach(E.MediaPlayerPlaying, lambda _e: self._ui.post(self._on_play_state, True))
+            em.event_attach(E.MediaPlayerPaused, lambda _e: self._ui.post(self._on_play_state, False))
+            em.event_attach(E.MediaPlayerStopped, lambda _e: self._ui.post(self._on_play_state, False))
+            return True
+        except Exception as e:
+            print("VLC events unavailable, polling instead:", e)
+            return False
+
+    def _vlc_time_changed(self, event):
+        self._vlc_time = event.u.new_time
+        # the label shows whole seconds: wake Tk once per second of playback, and
+        # coalesce to at most one pending update no matter how often VLC fires
+        second = self._vlc_time // 1000
+        if second != self._vlc_second and not self._time_post_pending:
+            self._vlc_second = second
+            self._time_post_pending = True
+            self._ui.post(self._apply_vlc_time)
+
+    def _vlc_length_changed(self, event):
+        self._vlc_length = event.u.new_length
+        self._ui.post(self._apply_vlc_time)
+
+    def _apply_vlc_time(self):
+        self._time_post_pending = False
+        self._update_time_widgets(self._vlc_time, self._vlc_length)
+
+    def _update_time_widgets(self, time_ms: int, length_ms: int):
+        """Touch the widgets only when what they display actually changes."""
+        text = f"{fmt_time(time_ms)} / {fmt_time(length_ms)}"
+        if text != self._shown_time_text:
+            self._shown_time_text = text
+            self.time_label.config(text=text)
+        if not self.seeking and length_ms and length_ms > 0 and time_ms >= 0:
+            pos = max(0, min(1000, int(1000 * time_ms / length_ms)))
+            if pos != self._shown_pos:
+                self._shown_pos = pos
+                self.pos_var.set(pos)
+
+    def _on_play_state(self, playing: bool):
+        self.btn_play.config(text="Pause" if playing else "Play")
+        if playing:
+            self._ui.poke()
+
+    def _on_end_reached(self):
+        if self.index < len(self.files) - 1:
+            self.index += 1
+            self._load_current(start_play=True)
+            self._refresh_nav_buttons()
+        else:
+            self.btn_play.config(text="Play")
+            self._update_time_widgets(self._vlc_length, self._vlc_length)
+
     def _tick(self):
+        """Fallback when VLC events can't be attached: adaptive polling."""
+        import vlc
+        playing = False
         try:
             length_ms = self.player.get_length()
             time_ms = self.player.get_time()
-            self.time_label.config(text=f"{fmt_time(time_ms)} / {fmt_time(length_ms)}")
-
-            if not self.seeking and length_ms and length_ms > 0 and time_ms >= 0:
-                pos = max(0, min(1000, int(1000 * time_ms / length_ms)))
-                self.pos_var.set(pos)
-
-            if length_ms and time_ms >= 0 and (length_ms - time_ms) < 250 and self.player.get_state() == vlc.State.Ended:
-                if self.index < len(self.files) - 1:
-                    self.index += 1
-                    self._load_current(start_play=True)
-                    self._refresh_nav_buttons()
-                else:
-                    self.btn_play.config(text="Play")
-        except Exception:
-            pass
+            self._update_time_widgets(time_ms, length_ms)
+            state = self.player.get_state()
+            playing = state == vlc.State.Playing
+            if state == vlc.State.Ended:
+                self._on_end_reached()
+        except Exception as e:
+            tracing.event("tick.error", error=str(e))
 
-        self.after_id = self.after(200, self._tick)
+        self.after_id = self.after(200 if playing else 1000, self._tick)
 
     def _on_seek_drag_start(self, _value):
         self.seeking = True
@@ -543,6 +740,41 @@ class ClipViewer(tk.Tk):
             pos = self.pos_var.get() / 1000.0
             self.player.set_time(int(length * pos))
         self.seeking = False
+        self._shown_pos = self.pos_var.get()
+        self._ui.poke()
+
+    # ---------- Seek preview ----------
+    def _on_slider_hover(self, evt):
+        if not (0 <= self.index < len(self.files)):
+            return
+        sheet = self._thumbs.sheet(self.files[self.index].resolve())
+        length = self.player.get_length()
+        if sheet is None or not length or length <= 0:
+            return
+        value = float(self.pos_slider.tk.call(self.pos_slider._w, "get", evt.x, evt.y))
+        seconds = length / 1000.0 * value / 1000.0
+        tile = (sheet.path, sheet.tile_index(seconds))
+
+        if self._preview is None:
+            self._preview = tk.Toplevel(self)
+            self._preview.overrideredirect(True)
+            self._preview.attributes("-topmost", True)
+            self._preview_label = tk.Label(self._preview, bd=1, relief="solid", compound="top", bg="black", fg="white")
+            self._preview_label.pack()
+        if tile != self._preview_tile:
+            # only this tile is read from the sheet on disk
+            self._preview_img = tk.PhotoImage(data=sheet.tile_ppm(tile[1]), format="ppm")
+            self._preview_tile = tile
+        self._preview_label.config(image=self._preview_img, text=fmt_time(int(seconds * 1000)))
+
+        x = self.pos_slider.winfo_rootx() + evt.x - sheet.tile_w // 2
+        y = self.pos_slider.winfo_rooty() - sheet.tile_h - 28
+        self._preview.geometry(f"+{x}+{y}")
+        self._preview.deiconify()
+
+    def _hide_preview(self):
+        if self._preview is not None:
+            self._preview.withdraw()
 
     def _set_volume(self):
         vol = int(self.vol_var.get())  # 0..100
@@ -562,11 +794,28 @@ class ClipViewer(tk.Tk):
                 self.after_cancel(self.after_id)
         except Exception:
             pass
+        if self._watcher is not None:
+            self._watcher.stop()
+        # first: callbacks posted by the workers finishing below are dropped, not run on a dying window
+        self._ui.close()
+        self._jobs.shutdown()
+        self._prefetch.jobs.shutdown()
+        self._thumbs.jobs.shutdown()
+        self._estimates.shutdown()
+        self._meta.close()
+        self._media_pool.clear()
+        self._downloads.close()
+        self._clipboard.close()
+        self._stalls.stop()
+        tracing.dump(app_cache_dir() / "traces")
         try:
-            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._cache.flush()
+            self._thumbs.cache.flush()
         finally:
             self.destroy()
 
 if __name__ == "__main__":
     app = ClipViewer()
+    if len(sys.argv) > 1 and is_url(sys.argv[1]):
+        app.after_idle(app.open_url, sys.argv[1])
     app.mainloop()
@@ -0,0 +1,89 @@
+# mediapool.py
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+# ============================================================
+# Pre-parsed libVLC media for the clips around the current one
+# ============================================================
+POOL_RADIUS   = 2         # neighbours kept parsed on each side of the current clip
+POOL_MAX      = 8         # hard cap on media objects held (each pins demux/parse state)
+PARSE_TIMEOUT_MS = 5000
+
+
+class MediaPool:
+    """
+    Small LRU of libVLC media objects for index ±radius. Neighbours are parsed
+    asynchronously (libVLC's preparser thread) as soon as the current index
+    moves, so stepping to them hands set_media an already-parsed media.
+    Tk thread only; vlc is imported lazily because main.py sets up the DLL
+    search path before the first `import vlc`.
+    """
+
+    def __init__(self, instance, radius: int = POOL_RADIUS, max_items: int = POOL_MAX,
+                 mrl: Callable[[Path], str | None] | None = None):
+        self.instance = instance
+        self.mrl = mrl          # stand-in location for a path (e.g. a download still in flight)
+        self.radius = radius
+        self.max_items = max(max_items, 2 * radius + 1)
+        self._media: OrderedDict[str, object] = OrderedDict()
+
+    def get(self, path: Path):
+        """Media for `path` (parsed if it was a neighbour); created on a miss."""
+        key = str(path)
+        media = self._media.get(key)
+        if media is None:
+            media = self._add(key)
+        self._media.move_to_end(key)
+        return media
+
+    def update(self, files: list[Path], index: int):
+        """Parse the window around `index`, nearest first; evict what fell far out of it."""
+        if not (0 <= index < len(files)):
+            return
+        window: list[str] = []
+        for d in range(1, self.radius + 1):
+            for i in (index + d, index - d):
+                if 0 <= i < len(files):
+                    window.append(str(files[i].resolve()))
+        for key in window:
+            if key not in self._media:
+                self._add(key)
+        # nearest clips become the most recently used, so eviction takes stale entries first
+        current = str(files[index].resolve())
+        for key in reversed([current] + window):
+            if key in self._media:
+                self._media.move_to_end(key)
+        while len(self._media) > self.max_items:
+            _key, media = self._media.popitem(last=False)
+            self._release(media)
+
+    def clear(self):
+        while self._media:
+            _key, media = self._media.popitem()
+            self._release(media)
+
+    # ---------- Internals ----------
+    def _add(self, key: str):
+        media = self.instance.media_new((self.mrl and self.mrl(Path(key))) or key)
+        self._media[key] = media
+        self._parse(media)
+        return media
+
+    @staticmethod
+    def _parse(media):
+        try:
+            import vlc
+            flags = vlc.MediaParseFlag.local | vlc.MediaParseFlag.network
+            media.parse_with_options(flags, PARSE_TIMEOUT_MS)
+        except Exception as e:
+            print("Media pre-parse failed:", e)
+
+    @staticmethod
+    def _release(media):
+        # the player keeps its own reference to whatever it's playing
+        try:
+            media.parse_stop()
+        except Exception:
+            pass
+        media.release()
@@ -0,0 +1,303 @@
+# metadata.py
+import os, json, sqlite3, threading, subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Sequence
+
+import tracing
+
+# ============================================================
+# ffprobe metadata service (one probe per file, ever)
+# ============================================================
+PROBE_WORKERS = 4
+PROBE_WINDOW  = 100     # rows either side of the selection a folder sweep covers
+
+
+@dataclass
+class VideoStream:
+    index: int
+    codec: str | None
+    profile: str | None
+    pix_fmt: str | None
+    width: int
+    height: int
+    fps: float | None
+    bit_rate: int | None        # bits/s
+
+
+@dataclass
+class AudioStream:
+    index: int
+    codec: str | None
+    channels: int
+    sample_rate: int | None
+    bit_rate: int | None        # bits/s
+
+
+@dataclass
+class MediaInfo:
+    path: Path
+    size: int
+    mtime_ns: int
+    duration: float | None
+    bit_rate: int | None
+    format_name: str | None
+    video: VideoStream | None = None
+    audio: list[AudioStream] = field(default_factory=list)
+    start_time: float = 0.0     # container timestamps begin here; input -ss / player time count from it
+
+    # shorthands used by the encoders
+    @property
+    def vcodec(self) -> str | None:
+        return self.video.codec if self.video else None
+
+    @property
+    def acodec(self) -> str | None:
+        return self.audio[0].codec if self.audio else None
+
+    @property
+    def has_audio(self) -> bool:
+        return bool(self.audio)
+
+    @property
+    def video_kbps(self) -> int | None:
+        if self.video and self.video.bit_rate:
+            return self.video.bit_rate // 1000
+        if self.bit_rate:
+            audio = sum(a.bit_rate or 0 for a in self.audio)
+            return max(1, (self.bit_rate - audio) // 1000)
+        return None
+
+    def describe(self) -> str:
+        parts = []
+        if self.video:
+            parts.append(f"{self.video.width}x{self.video.height}")
+            if self.video.fps:
+                parts.append(f"{self.video.fps:.0f}fps")
+            if self.video.codec:
+                parts.append(self.video.codec)
+        if self.duration:
+            s = int(self.duration)
+            parts.append(f"{s//60:02d}:{s%60:02d}")
+        return " ".join(parts)
+
+
+def _int(v) -> int | None:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate(v: str | None) -> float | None:
+    if not v or v in ("0/0", "N/A"):
+        return None
+    num, _, den = v.partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def parse_probe(path: Path, size: int, mtime_ns: int, data: dict) -> MediaInfo:
+    fmt = data.get("format", {})
+    try:
+        duration = float(fmt.get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    try:
+        start_time = float(fmt.get("start_time"))
+    except (TypeError, ValueError):
+        start_time = 0.0
+    info = MediaInfo(path, size, mtime_ns, duration, _int(fmt.get("bit_rate")), fmt.get("format_name"),
+                     start_time=start_time)
+    for s in data.get("streams", []):
+        kind = s.get("codec_type")
+        if kind == "video" and info.video is None and not s.get("disposition", {}).get("attached_pic"):
+            info.video = VideoStream(
+                _int(s.get("index")) or 0, s.get("codec_name"), s.get("profile"), s.get("pix_fmt"),
+                _int(s.get("width")) or 0, _int(s.get("height")) or 0,
+                _rate(s.get("avg_frame_rate")) or _rate(s.get("r_frame_rate")), _int(s.get("bit_rate")),
+            )
+        elif kind == "audio":
+            info.audio.append(AudioStream(
+                _int(s.get("index")) or 0, s.get("codec_name"), _int(s.get("channels")) or 0,
+                _int(s.get("sample_rate")), _int(s.get("bit_rate")),
+            ))
+    return info
+
+
+def run_ffprobe(ffprobe: str, path: Path) -> dict:
+    with tracing.span("ffprobe", kind="streams", file=path.name):
+        r = subprocess.run(
+            [ffprobe, "-v", "error", "-show_format", "-show_streams", "-of", "json", str(path)],
+            check=True, capture_output=True, text=True
+        )
+    return json.loads(r.stdout or "{}")
+
+
+def probe_file(ffprobe: str, path: Path) -> MediaInfo:
+    """Uncached probe (for callers without a service)."""
+    st = path.stat()
+    return parse_probe(path, st.st_size, st.st_mtime_ns, run_ffprobe(ffprobe, path))
+
+
+class MetadataService:
+    """
+    Memoized ffprobe results keyed by path + size + mtime, persisted in SQLite.
+    Lookups for known files are a dict hit; folders are probed concurrently
+    in the background; concurrent requests for one file share a single probe.
+    """
+
+    def __init__(self, ffprobe: str, db_path: Path | None = None, max_workers: int = PROBE_WORKERS,
+                 on_probed: Callable[[MediaInfo], None] | None = None):
+        self.ffprobe = ffprobe
+        self.on_probed = on_probed
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe")
+        self._lock = threading.RLock()
+        self._memo: dict[str, MediaInfo] = {}
+        self._queued: dict[tuple, Future] = {}     # background submissions
+        self._running: dict[tuple, Future] = {}    # probes currently spawned
+        self._sweep = 0
+        self._db = None
+        if db_path is not None:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS probes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, data TEXT)"
+            )
+
+    @staticmethod
+    def _key(path: Path) -> str:
+        return os.path.normcase(str(path))
+
+    def peek(self, path: Path) -> MediaInfo | None:
+        """Last known record without touching the disk (may be stale if the file changed)."""
+        return self._memo.get(self._key(path))
+
+    def get(self, path: Path) -> MediaInfo | None:
+        """Current record; probes (once) if the file is new or changed. None if unprobeable."""
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        info = self._lookup(path, st.st_size, st.st_mtime_ns)
+        if info is not None:
+            return info
+        # run inline rather than queueing behind a folder sweep
+        try:
+            return self._probe(path, st.st_size, st.st_mtime_ns)
+        except Exception:
+            return None
+
+    def submit(self, path: Path, on_done: Callable[[MediaInfo | None], None] | None = None) -> Future | None:
+        """Probe in the background; on_done runs on the probe thread."""
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        info = self._lookup(path, st.st_size, st.st_mtime_ns)
+        if info is not None:
+            if on_done:
+                on_done(info)
+            return None
+        fut = self._submit(path, st.st_size, st.st_mtime_ns)
+        if on_done:
+            fut.add_done_callback(lambda f: on_done(None if f.cancelled() or f.exception() else f.result()))
+        return fut
+
+    def prefetch(self, rows: Sequence[Path], centre: int = 0, window: int = PROBE_WINDOW):
+        """
+        Warm the store for the rows within `window` of `centre`, nearest first.
+        Rows are read (and their Paths built) on the sweep thread, not the caller's;
+        a newer prefetch supersedes this one.
+        """
+        self._sweep += 1
+        sweep = self._sweep
+
+        def run():
+            for d in range(window + 1):
+                for i in ((centre,) if d == 0 else (centre + d, centre - d)):
+                    if self._sweep != sweep:
+                        return
+                    if not 0 <= i < len(rows):
+                        continue
+                    try:
+                        p = rows[i]
+                    except IndexError:      # the view changed under us; the next sweep covers it
+                        return
+                    self.submit(p)
+                    # keep the queue shallow so a newer sweep isn't stuck behind this one
+                    while len(self._queued) > 4 * PROBE_WORKERS and self._sweep == sweep:
+                        threading.Event().wait(0.05)
+
+        threading.Thread(target=run, name="probe-sweep", daemon=True).start()
+
+    def close(self):
+        self._sweep += 1
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- Internals ----------
+    def _lookup(self, path: Path, size: int, mtime_ns: int) -> MediaInfo | None:
+        key = self._key(path)
+        info = self._memo.get(key)
+        if info is not None and info.size == size and info.mtime_ns == mtime_ns:
+            return info
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT data FROM probes WHERE path=? AND size=? AND mtime_ns=?",
+                                   (key, size, mtime_ns)).fetchone()
+        if row is None:
+            return None
+        info = parse_probe(path, size, mtime_ns, json.loads(row[0]))
+        self._memo[key] = info
+        return info
+
+    def _submit(self, path: Path, size: int, mtime_ns: int) -> Future:
+        ident = (self._key(path), size, mtime_ns)
+        with self._lock:
+            fut = self._queued.get(ident)
+            if fut is None:
+                fut = self._pool.submit(self._probe, path, size, mtime_ns)
+                self._queued[ident] = fut
+                fut.add_done_callback(lambda _f: self._queued.pop(ident, None))
+        return fut
+
+    def _probe(self, path: Path, size: int, mtime_ns: int) -> MediaInfo:
+        info = self._lookup(path, size, mtime_ns)
+        if info is not None:
+            return info
+        key = self._key(path)
+        ident = (key, size, mtime_ns)
+        with self._lock:
+            running = self._running.get(ident)
+            mine = running is None
+            if mine:
+                running = self._running[ident] = Future()
+        if not mine:
+            return running.result()
+
+        try:
+            data = run_ffprobe(self.ffprobe, path)
+            info = parse_probe(path, size, mtime_ns, data)
+            self._memo[key] = info
+            if self._db is not None:
+                with self._lock:
+                    self._db.execute("INSERT OR REPLACE INTO probes (path, size, mtime_ns, data) VALUES (?, ?, ?, ?)",
+                                     (key, size, mtime_ns, json.dumps(data)))
+            running.set_result(info)
+        except BaseException as e:
+            running.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._running.pop(ident, None)
+        if self.on_probed:
+            try:
+                self.on_probed(info)
+            except Exception:
+                pass
+        return info
@@ -0,0 +1,176 @@
+# planner.py
+import os, json, math, threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from compcache import atomic_write_text
+from metadata import MediaInfo
+from sizing import min_video_kbps
+
+# ============================================================
+# Encode planning: preset / resolution / fps for a size target and a deadline
+# ============================================================
+PRESETS = ["slow", "medium", "fast", "faster", "veryfast", "superfast", "ultrafast"]
+HEIGHTS = [2160, 1440, 1080, 720, 540, 480, 360]
+FPS_STEPS = [60, 30]
+
+# x264 throughput on one core, megapixels/s (rough seeds until this machine has been measured)
+SEED_MPPS_PER_CORE = {"slow": 3.5, "medium": 6, "fast": 8, "faster": 11, "veryfast": 18, "superfast": 28, "ultrafast": 40}
+# quality per bit relative to medium
+PRESET_EFFICIENCY = {"slow": 1.05, "medium": 1.0, "fast": 0.97, "faster": 0.93, "veryfast": 0.86, "superfast": 0.74, "ultrafast": 0.6}
+TWOPASS_COST = 1.45         # pass 1 (fast first pass) + pass 2, relative to one pass
+BPP_GOOD = 0.08             # bits per pixel per frame where H.264 stops looking smeared
+RESOLUTION_WEIGHT = 0.3     # how much a smaller frame costs vs starving bits
+FPS_WEIGHT = 0.15
+
+MODES = {                   # user-facing choice -> time budget in seconds (None = no deadline)
+    "speed": 15.0,
+    "balanced": 45.0,
+    "quality": None,
+}
+DEFAULT_MODE = os.environ.get("CLIPVIEWER_ENCODE_PRIORITY", "balanced")
+PROFILE_ALPHA = 0.3
+
+
+@dataclass
+class EncodePlan:
+    preset: str
+    width: int
+    height: int
+    fps: float
+    video_kbps: int
+    est_seconds: float
+    bpp: float              # effective bits per pixel per frame
+    scaled: bool
+    fps_capped: bool
+    fits: bool = True       # False: no size / fps takes the bitrate the target leaves
+
+    @property
+    def min_kbps(self) -> int:
+        """Bitrate floor at this size / fps (sizing.min_video_kbps)."""
+        return min_video_kbps(self.width, self.height, self.fps)
+
+    def vf(self) -> str:
+        """The scale / fps filter chain, "" when the source is kept as is."""
+        vf = []
+        if self.scaled:
+            vf.append(f"scale=-2:{self.height}")
+        if self.fps_capped:
+            vf.append(f"fps={self.fps:g}")
+        return ",".join(vf)
+
+    def filters(self) -> list[str]:
+        vf = self.vf()
+        return ["-vf", vf] if vf else []
+
+    def key(self) -> dict:
+        return {"preset": self.preset, "h": self.height if self.scaled else 0, "fps": self.fps if self.fps_capped else 0}
+
+    def describe(self) -> str:
+        return (f"{self.width}x{self.height}@{self.fps:g} {self.preset}, "
+                f"{self.video_kbps / 1000:.1f} Mbps, ~{self.est_seconds:.0f} s")
+
+
+class ThroughputProfile:
+    """Measured x264 speed on this machine (megapixels/s per preset), EMA over past encodes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            self._mpps: dict[str, float] = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._mpps = {}
+
+    @staticmethod
+    def _key(preset: str, threads: int | None) -> str:
+        return f"{preset}/t{threads}" if threads else preset
+
+    def mpps(self, preset: str, threads: int | None = None) -> float:
+        v = self._mpps.get(self._key(preset, threads))
+        if v:
+            return v
+        cores = threads or os.cpu_count() or 1
+        return SEED_MPPS_PER_CORE.get(preset, 10) * cores * 0.75    # imperfect scaling
+
+    def learn(self, preset: str, fps: float, width: int, height: int, threads: int | None = None):
+        if fps <= 0 or width <= 0 or height <= 0:
+            return
+        key = self._key(preset, threads)
+        measured = fps * width * height / 1e6
+        with self._lock:
+            old = self._mpps.get(key)
+            self._mpps[key] = measured if old is None else old + PROFILE_ALPHA * (measured - old)
+            text = json.dumps(self._mpps)
+        try:
+            atomic_write_text(self.path, text)
+        except OSError:
+            pass
+
+
+class EncodePlanner:
+    """
+    Enumerates preset × output height × fps, estimates encode time from the
+    throughput profile and quality from effective bits per pixel, and picks
+    the best-looking plan that fits the time budget (the fastest one if none does).
+    Sizes / rates whose bitrate floor is over `video_kbps` are left out, so long
+    clips step down in resolution or fps instead of overshooting the target.
+    """
+
+    def __init__(self, profile: ThroughputProfile, threads: int | None = None):
+        self.profile = profile
+        self.threads = threads
+
+    def plan(self, info: MediaInfo, video_kbps: int, twopass: bool, budget_s: float | None) -> EncodePlan | None:
+        """
+        `video_kbps`: what the size target leaves for video, unclamped. If no size / fps
+        can take it, returns the one with the lowest floor at that floor, with fits=False.
+        """
+        v = info.video
+        if v is None or not v.width or not v.height or not info.duration:
+            return None
+        src_fps = v.fps or 30.0
+        heights = [v.height] + [h for h in HEIGHTS if h < v.height]
+        rates = [src_fps] + [f for f in FPS_STEPS if f < src_fps - 1]
+        best: tuple[float, float, EncodePlan] | None = None
+        fastest: EncodePlan | None = None
+        for preset in PRESETS:
+            for h in heights:
+                w = int(round(v.width * h / v.height / 2)) * 2
+                for fps in rates:
+                    if video_kbps < min_video_kbps(w, h, fps):
+                        continue
+                    p = self._candidate(info, preset, w, h, fps, video_kbps, twopass, src_fps)
+                    if fastest is None or p.est_seconds < fastest.est_seconds:
+                        fastest = p
+                    if budget_s is not None and p.est_seconds > budget_s:
+                        continue
+                    q = self._quality(p, v.height, src_fps)
+                    if best is None or (q, -p.est_seconds) > best[:2]:
+                        best = (q, -p.est_seconds, p)
+        if best is None and fastest is None:
+            # nothing fits: the smallest frame at the lowest rate, for the caller to report
+            h = heights[-1]
+            w = int(round(v.width * h / v.height / 2)) * 2
+            fps = rates[-1]
+            p = self._candidate(info, PRESETS[-1], w, h, fps, min_video_kbps(w, h, fps), twopass, src_fps)
+            p.fits = False
+            return p
+        return best[2] if best else fastest
+
+    def _candidate(self, info, preset, w, h, fps, video_kbps, twopass, src_fps) -> EncodePlan:
+        frames = info.duration * fps
+        seconds = frames * w * h / 1e6 / self.profile.mpps(preset, self.threads)
+        if twopass:
+            seconds *= TWOPASS_COST
+        bpp = video_kbps * 1000 / (w * h * fps) * PRESET_EFFICIENCY[preset]
+        return EncodePlan(preset, w, h, fps, video_kbps, seconds, bpp,
+                          scaled=h != info.video.height, fps_capped=fps != src_fps)
+
+    @staticmethod
+    def _quality(p: EncodePlan, src_h: int, src_fps: float) -> float:
+        # starving bits is the worst outcome (diminishing returns past BPP_GOOD);
+        # shrinking the frame or fps costs a little
+        return ((1 - math.exp(-2 * p.bpp / BPP_GOOD))
+                * (p.height / src_h) ** RESOLUTION_WEIGHT
+                * (p.fps / src_fps) ** FPS_WEIGHT)
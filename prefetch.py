@@ -0,0 +1,135 @@
+# prefetch.py
+import threading
+from pathlib import Path
+from typing import Callable
+
+from jobs import Job, JobQueue, JobCancelled
+
+# ============================================================
+# Speculative pre-compression of upcoming clips
+# ============================================================
+PREFETCH_AHEAD = 3        # oversized clips to prepare ahead of the current one
+PREFETCH_SCAN  = 12       # how far past the current index to look for them
+
+
+class Prefetcher:
+    """
+    Pre-compresses the next few oversized clips after the current index, one
+    at a time on a low-priority queue. Moving through the folder re-plans the
+    window: work that fell out of it is cancelled, the nearest clip goes first.
+    Finding the oversized ones (resolve + stat) runs on a scan thread, and the
+    new window comes back through `dispatch` (Tk thread).
+    """
+
+    def __init__(self, jobs: JobQueue, work: Callable[[Path, Job], object],
+                 min_size: int, busy: Callable[[tuple], bool] = lambda _key: False,
+                 ahead: int = PREFETCH_AHEAD, dispatch: Callable[..., None] | None = None):
+        self.jobs = jobs
+        self.work = work
+        self.min_size = min_size
+        self.busy = busy
+        self.ahead = ahead
+        self._dispatch = dispatch or (lambda fn, *args: fn(*args))
+        self._scan = 0
+        self.enabled = False
+        self._wanted: list[Path] = []
+        self._finished: set[str] = set()
+        self._skip: set[str] = set()      # user cancelled these, don't retry
+        self._running: Job | None = None
+
+    @staticmethod
+    def key(path: Path) -> tuple:
+        return ("compress", str(path))
+
+    def set_enabled(self, on: bool, files: list[Path] | None = None, index: int = -1):
+        self.enabled = on
+        if on and files is not None:
+            self.update(files, index)
+        elif not on:
+            self._scan += 1
+            self._wanted = []
+            if self._running is not None and self._running.background:
+                self._running.cancel()
+
+    def update(self, files: list[Path], index: int):
+        """Re-plan after the current index changed (called on the Tk thread; no disk access here)."""
+        if not self.enabled:
+            return
+        self._scan += 1
+        scan = self._scan
+        window = files[index + 1: index + 1 + PREFETCH_SCAN]
+        done = self._finished | self._skip
+
+        def run():
+            wanted: list[Path] = []
+            for p in window:
+                if self._scan != scan:
+                    return
+                try:
+                    p = p.resolve()
+                    if str(p) in done or p.stat().st_size <= self.min_size:
+                        continue
+                except OSError:
+                    continue
+                wanted.append(p)
+                if len(wanted) >= self.ahead:
+                    break
+            self._dispatch(self._apply, scan, wanted)
+
+        threading.Thread(target=run, name="prefetch-scan", daemon=True).start()
+
+    def claim(self, path: Path, on_done: Callable[[Job], None],
+              on_progress: Callable[[Job], None] | None = None) -> Job | None:
+        """Attach the user to an in-flight prefetch of `path` and raise its priority."""
+        job = self.jobs.get(self.key(path))
+        if job is None or job.cancelled:
+            return None
+        self.jobs.submit(job.key, job.label, self._work_for(path), on_done=on_done, on_progress=on_progress)
+        job.set_background(False)
+        return job
+
+    def visible_jobs(self) -> list[Job]:
+        return [j for j in self.jobs.active() if not j.background and not j.cancelled]
+
+    # ---------- Internals ----------
+    @staticmethod
+    def _path(job: Job) -> Path:
+        return Path(job.key[1])
+
+    def _apply(self, scan: int, wanted: list[Path]):
+        if scan != self._scan or not self.enabled:
+            return      # a newer update (or disable) superseded this scan
+        self._wanted = [p for p in wanted if str(p) not in self._finished and str(p) not in self._skip]
+
+        job = self._running
+        if job is not None and job.background and self._path(job) not in wanted:
+            job.cancel()
+        self._kick()
+
+    def _work_for(self, path: Path) -> Callable[[Job], object]:
+        return lambda job: self.work(path, job)
+
+    def _kick(self):
+        if self._running is not None:
+            return
+        for p in self._wanted:
+            if self.busy(self.key(p)):
+                continue
+            self._running = self.jobs.submit(self.key(p), p.name, self._work_for(p),
+                                             on_done=self._on_done, background=True)
+            return
+
+    def _on_done(self, job: Job):
+        if self._running is job:
+            self._running = None
+        path = self._path(job)
+        if job.error is None:
+            self._finished.add(str(path))
+        elif isinstance(job.error, JobCancelled):
+            if not job.background:
+                self._skip.add(str(path))
+        else:
+            self._skip.add(str(path))     # failed encode, don't spin on it
+        if path in self._wanted:
+            self._wanted.remove(path)
+        self._kick()
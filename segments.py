@@ -0,0 +1,221 @@
+# segments.py
+import os, time, shutil, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import tracing
+from jobs import Job, run_ffmpeg
+from metadata import MediaInfo, probe_file
+from sizing import MIN_VIDEO_KBPS, SizeReport, SizeTargeter
+
+# ============================================================
+# Parallel segmented encoding (split at keyframes, concat copy)
+# ============================================================
+PARALLEL_MIN_SECONDS = 90     # shorter clips aren't worth the split/concat overhead
+PARALLEL_MIN_CPUS    = 8
+MIN_SEGMENT_SECONDS  = 10
+MAX_SEGMENTS         = 8
+STRATEGY_SEGMENTED   = "segmented"
+
+
+@dataclass
+class Segment:
+    index: int
+    start: float
+    end: float
+    src_bytes: int = 0
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def parallel_layout(cpu: int | None = None) -> tuple[int, int]:
+    """(segments, ffmpeg -threads each) for this machine; x264 scales well up to ~4 threads per job."""
+    cpu = cpu or os.cpu_count() or 1
+    segments = max(2, min(MAX_SEGMENTS, cpu // 4))
+    return segments, max(1, cpu // segments)
+
+
+def should_segment(duration: float | None, cpu: int | None = None) -> bool:
+    cpu = cpu or os.cpu_count() or 1
+    return bool(duration) and duration >= PARALLEL_MIN_SECONDS and cpu >= PARALLEL_MIN_CPUS
+
+
+def probe_packets(ffprobe: str, src: Path) -> tuple[list[float], list[tuple[float, int]]]:
+    """
+    Keyframe times and (pts, size) of every video packet — demux only, no decode.
+    Times are relative to the container's start_time, which is what input -ss seeks
+    by (OBS / ShadowPlay MP4s often start well after 0).
+    """
+    with tracing.span("ffprobe", kind="packets", file=src.name):
+        r = subprocess.run(
+            [ffprobe, "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "packet=pts_time,size,flags:format=start_time", "-of", "csv=p=0", str(src)],
+            check=True, capture_output=True, text=True
+        )
+    keyframes: list[float] = []
+    packets: list[tuple[float, int]] = []
+    start = 0.0
+    for line in r.stdout.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) == 1:         # the format section: start_time
+            try:
+                start = float(parts[0])
+            except ValueError:
+                pass
+            continue
+        if len(parts) < 3:
+            continue
+        try:
+            t, size = float(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        packets.append((t, size))
+        if "K" in parts[2]:
+            keyframes.append(t)
+    keyframes = sorted(k - start for k in keyframes)
+    return keyframes, [(t - start, size) for t, size in packets]
+
+
+def split_at_keyframes(duration: float, keyframes: list[float], packets: list[tuple[float, int]],
+                       n: int) -> list[Segment]:
+    """Cut near i*duration/n, snapped to the nearest keyframe so the joins need no re-encode."""
+    cuts: list[float] = []
+    prev = 0.0
+    for i in range(1, n):
+        ideal = duration * i / n
+        candidates = [k for k in keyframes
+                      if k - prev >= MIN_SEGMENT_SECONDS and duration - k >= MIN_SEGMENT_SECONDS]
+        if not candidates:
+            break
+        k = min(candidates, key=lambda t: abs(t - ideal))
+        if k <= prev:
+            continue
+        cuts.append(k)
+        prev = k
+
+    bounds = [0.0] + cuts + [duration]
+    segs = [Segment(i, bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+    j = 0
+    for t, size in sorted(packets):
+        while j < len(segs) - 1 and t >= segs[j].end:
+            j += 1
+        segs[j].src_bytes += size
+    return segs
+
+
+class SegmentedEncoder:
+    """
+    Encodes keyframe-aligned segments of one clip concurrently (one ffmpeg
+    process each), audio once on the side, then joins them with the concat
+    demuxer (-c copy). Each segment gets a share of the video bit budget
+    weighted by its length and by how many bytes it took in the source.
+    """
+
+    def __init__(self, ffmpeg: str, ffprobe: str, sizer: SizeTargeter,
+                 probe: Callable[[Path], MediaInfo | None] | None = None):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.sizer = sizer
+        self.probe = probe or (lambda p: probe_file(ffprobe, p))
+
+    def encode(self, src: Path, out: Path, ident: str, duration: float, target_bytes: int,
+               video_args: Callable[[int], list[str]], audio_args: list[str], audio_kbps: int,
+               job: Job | None = None, cpu: int | None = None, min_kbps: int = MIN_VIDEO_KBPS) -> SizeReport | None:
+        """
+        Returns None when the clip can't be split usefully, the budget is under `min_kbps`,
+        or the result stays over `target_bytes` after the redo (caller does a single encode).
+        `audio_args` select and code the audio for an audio-only output; audio_kbps 0 = no audio.
+        """
+        n, threads = parallel_layout(cpu)
+        keyframes, packets = probe_packets(self.ffprobe, src)
+        segs = split_at_keyframes(duration, keyframes, packets, n)
+        if len(segs) < 2:
+            return None
+
+        job = job or Job(("segments", str(src)), src.name)
+        t0 = time.monotonic()
+        info = self.probe(src)
+        with_audio = audio_kbps > 0 and info is not None and info.has_audio
+        plan = self.sizer.plan(ident, duration, target_bytes, audio_kbps if with_audio else 0, STRATEGY_SEGMENTED,
+                               min_kbps=min_kbps)
+        if not plan.fits:
+            return None
+        parts = out.with_name(out.name + ".parts")
+        parts.mkdir(parents=True, exist_ok=True)
+        try:
+            audio = parts / "audio.m4a" if with_audio else None
+            video_kbps = plan.video_kbps
+            self._encode_parts(src, segs, video_kbps, min_kbps, duration, video_args, threads, audio, audio_args,
+                               parts, job)
+            self._concat(segs, parts, audio, out, duration, job)
+            report = SizeReport(STRATEGY_SEGMENTED, target_bytes, plan.nominal_bytes, plan.expected_bytes,
+                                out.stat().st_size, 1, time.monotonic() - t0)
+            self.sizer.model.learn(ident, report)
+
+            # safety net: redo the video segments (audio is kept) at a scaled budget
+            if report.actual_bytes > target_bytes:
+                goal = target_bytes * (1 - self.sizer.tolerance / 2)
+                a_kbps = plan.audio_kbps
+                new_kbps = max(min_kbps, int((video_kbps + a_kbps) * goal / report.actual_bytes - a_kbps))
+                scale = (new_kbps + a_kbps) / (video_kbps + a_kbps)
+                self._encode_parts(src, segs, new_kbps, min_kbps, duration, video_args, threads, None, audio_args,
+                                   parts, job)
+                self._concat(segs, parts, audio, out, duration, job)
+                report = SizeReport(STRATEGY_SEGMENTED, target_bytes, int(plan.nominal_bytes * scale),
+                                    int(report.actual_bytes * scale), out.stat().st_size, 2, time.monotonic() - t0)
+                if report.actual_bytes > target_bytes:
+                    out.unlink(missing_ok=True)
+                    return None
+            return report
+        finally:
+            shutil.rmtree(parts, ignore_errors=True)
+
+    # ---------- Internals ----------
+    def _encode_parts(self, src, segs: list[Segment], video_kbps: int, min_kbps: int, duration: float, video_args,
+                      threads: int, audio: Path | None, audio_args: list[str], parts: Path, job: Job):
+        total_bits = video_kbps * 1000 * duration
+        total_src = sum(s.src_bytes for s in segs) or 1
+        job.clear_children()
+        job.set_span(0.0, 0.95)
+
+        tasks: list[tuple[list[str], Job, float]] = []
+        for s in segs:
+            share = 0.5 * s.duration / duration + 0.5 * s.src_bytes / total_src
+            kbps = max(min_kbps, int(total_bits * share / s.duration / 1000))
+            cmd = [self.ffmpeg, "-y", "-ss", f"{s.start:.6f}", "-i", str(src), "-t", f"{s.duration:.6f}",
+                   "-map", "0:v:0", "-an", *video_args(kbps), "-threads", str(threads),
+                   str(parts / f"seg{s.index:03d}.mp4")]
+            tasks.append((cmd, job.child(f"segment {s.index + 1}", s.duration), s.duration))
+        if audio is not None:
+            cmd = [self.ffmpeg, "-y", "-i", str(src), *audio_args, str(audio)]
+            # audio-only encode is ~50x realtime; weight it accordingly
+            tasks.append((cmd, job.child("audio", duration / 50), duration))
+
+        with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            futures = [pool.submit(run_ffmpeg, cmd, sub, dur) for cmd, sub, dur in tasks]
+            try:
+                for f in futures:
+                    f.result()
+            except BaseException:
+                for _cmd, sub, _dur in tasks:
+                    sub.cancel()
+                raise
+
+    def _concat(self, segs: list[Segment], parts: Path, audio: Path | None, out: Path, duration: float, job: Job):
+        listing = parts / "list.txt"
+        lines = []
+        for s in segs:
+            p = str((parts / f"seg{s.index:03d}.mp4").resolve()).replace("'", "'\\''")
+            lines.append(f"file '{p}'")
+        listing.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        cmd = [self.ffmpeg, "-y", "-f", "concat", "-safe", "0", "-i", str(listing)]
+        if audio is not None:
+            cmd += ["-i", str(audio), "-map", "0:v:0", "-map", "1:a:0"]
+        cmd += ["-c", "copy", "-movflags", "+faststart", str(out)]
+        job.set_span(0.95, 1.0)
+        run_ffmpeg(cmd, job, duration)
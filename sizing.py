@@ -0,0 +1,291 @@
+# sizing.py
+import os, json, time, hashlib, threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable
+
+from compcache import atomic_write_text
+from jobs import parse_out_time
+
+# ============================================================
+# Size targeting: hit a byte budget in one final encode
+# ============================================================
+SIZE_TOLERANCE = float(os.environ.get("CLIPVIEWER_SIZE_TOLERANCE", "0.04"))  # land within 4% under target
+MUX_OVERHEAD   = 0.012      # mp4 container overhead on top of the stream bitrates
+MIN_VIDEO_KBPS = 150        # lowest video bitrate worth encoding (at 720p30 and up, see min_video_kbps)
+MIN_FLOOR_KBPS = 32         # ... however small the frame
+REF_PIXEL_RATE = 1280 * 720 * 30
+HISTORY_LEN    = 200
+MAX_PASSLOGS   = 64         # cached pass-1 stat sets kept on disk
+MAX_RETRIES    = 2          # smaller re-encodes before giving up on an oversize output
+
+STRATEGY_TWOPASS = "twopass"
+STRATEGY_MODEL   = "model"
+
+
+@dataclass
+class SizePlan:
+    strategy: str
+    video_kbps: int
+    audio_kbps: int
+    nominal_bytes: int      # what the bitrates add up to
+    expected_bytes: int     # nominal corrected by the learned ratio
+    budget_kbps: int = 0    # video bitrate the target leaves, before the floor
+    fits: bool = True       # False: even the floor bitrate overshoots the target
+
+
+@dataclass
+class SizeReport:
+    strategy: str
+    target_bytes: int
+    nominal_bytes: int
+    expected_bytes: int
+    actual_bytes: int
+    attempts: int           # ffmpeg encodes run, an uncached pass 1 included
+    seconds: float
+
+    @property
+    def error(self) -> float:
+        """Relative error of actual vs expected size (+ = bigger than planned)."""
+        return (self.actual_bytes - self.expected_bytes) / self.expected_bytes if self.expected_bytes else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.actual_bytes / 1e6:.2f} MB "
+                f"(planned {self.expected_bytes / 1e6:.2f} MB, {self.error * 100:+.1f}%, {self.strategy})")
+
+
+class RateModel:
+    """
+    Learns actual/expected size ratios per strategy, globally and per source
+    clip (keyed by the cache's source identity), so the next encode of the
+    same clip (e.g. a different target) is corrected up front.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ratios: dict[str, list[float]] = {}   # key -> [ratio, samples]
+        self.history: list[dict] = []
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            self._ratios = data.get("ratios", {})
+            self.history = data.get("history", [])
+        except (OSError, ValueError):
+            pass
+
+    def ratio(self, ident: str, strategy: str) -> tuple[float, int]:
+        """(ratio, samples) for this clip if known, else the global one."""
+        with self._lock:
+            for key in (f"{ident}:{strategy}", f"*:{strategy}"):
+                if key in self._ratios:
+                    r, n = self._ratios[key]
+                    return r, int(n)
+        return 1.0, 0
+
+    def has_clip(self, ident: str) -> bool:
+        """Calibrated for x264 on this clip (other encoders' ratios don't count)."""
+        with self._lock:
+            return any(f"{ident}:{s}" in self._ratios for s in (STRATEGY_TWOPASS, STRATEGY_MODEL))
+
+    def learn(self, ident: str, report: SizeReport):
+        ratio = report.actual_bytes / max(1, report.nominal_bytes)
+        with self._lock:
+            for key, alpha in ((f"{ident}:{report.strategy}", 0.6), (f"*:{report.strategy}", 0.25)):
+                r, n = self._ratios.get(key, [ratio, 0])
+                self._ratios[key] = [r + alpha * (ratio - r) if n else ratio, n + 1]
+            self.history.append({"t": int(time.time()), **asdict(report)})
+            del self.history[:-HISTORY_LEN]
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write_text(self.path, json.dumps({"ratios": self._ratios, "history": self.history}))
+            except OSError:
+                pass
+
+    def seed(self, ident: str, strategy: str, ratio: float):
+        """Prior for a clip not encoded yet (e.g. from sample encodes); global stats untouched."""
+        with self._lock:
+            if any(f"{ident}:{s}" in self._ratios for s in (STRATEGY_TWOPASS, STRATEGY_MODEL)):
+                return
+            self._ratios[f"{ident}:{strategy}"] = [ratio, 0]
+            text = json.dumps({"ratios": self._ratios, "history": self.history})
+        try:
+            atomic_write_text(self.path, text)
+        except OSError:
+            pass
+
+    def accuracy(self) -> dict:
+        """Mean absolute / worst size error over the recorded history."""
+        errs = [(h["actual_bytes"] - h["expected_bytes"]) / h["expected_bytes"]
+                for h in self.history if h.get("expected_bytes")]
+        if not errs:
+            return {"samples": 0}
+        return {
+            "samples": len(errs),
+            "mean_abs_error": sum(abs(e) for e in errs) / len(errs),
+            "worst_overshoot": max(errs),
+            "over_target": sum(1 for h in self.history if h["actual_bytes"] > h["target_bytes"]),
+        }
+
+
+class SizeTargeter:
+    """
+    Picks the video bitrate for a byte budget and runs the encode:
+      - twopass: libx264 pass 1 (stats cached per source) + one final pass 2
+      - model:   one ABR pass at a bitrate corrected by the learned rate model
+    """
+
+    def __init__(self, ffmpeg: str, root: Path, tolerance: float = SIZE_TOLERANCE):
+        self.ffmpeg = ffmpeg
+        self.tolerance = tolerance
+        self.passlog_dir = root / "passlog"
+        self.passlog_dir.mkdir(parents=True, exist_ok=True)
+        self.model = RateModel(root / "ratemodel.json")
+
+    def choose_strategy(self, ident: str, preset: str) -> str:
+        # cached pass-1 stats make two-pass a single encode; otherwise a clip we've
+        # encoded before has a calibrated ratio, so skip the analysis pass
+        if self._passlog_cached(self._passlog_path(ident, preset)):
+            return STRATEGY_TWOPASS
+        return STRATEGY_MODEL if self.model.has_clip(ident) else STRATEGY_TWOPASS
+
+    def plan(self, ident: str, duration: float, target_bytes: int, audio_kbps: int,
+             strategy: str | None = None, preset: str = "veryfast", min_kbps: int = MIN_VIDEO_KBPS) -> SizePlan:
+        """Cheap. `fits` is False when the target leaves video less than `min_kbps` (don't encode)."""
+        strategy = strategy or self.choose_strategy(ident, preset)
+        ratio, _n = self.model.ratio(ident, strategy)
+        # aim for the middle of the tolerance band
+        goal = target_bytes * (1 - self.tolerance / 2)
+        total_kbps = goal * 8 / (duration * 1000 * (1 + MUX_OVERHEAD) * ratio)
+        budget = int(total_kbps - audio_kbps)
+        video_kbps = max(min_kbps, budget)
+        nominal = int((video_kbps + audio_kbps) * 1000 / 8 * duration * (1 + MUX_OVERHEAD))
+        return SizePlan(strategy, video_kbps, audio_kbps, nominal, int(nominal * ratio), budget, budget >= min_kbps)
+
+    def encode(self, src: Path, out: Path, ident: str, duration: float, target_bytes: int,
+               video_args: Callable[[int], list[str]], audio_args: list[str], audio_kbps: int,
+               run: Callable[[list[str], float], None], set_span: Callable[[float, float], None] = lambda a, b: None,
+               strategy: str | None = None, min_kbps: int = MIN_VIDEO_KBPS) -> SizeReport:
+        """
+        `video_args(kbps)` returns the codec args for a given bitrate, `run(cmd, duration)`
+        executes ffmpeg. Returns the expected-vs-actual report and feeds the model;
+        raises RuntimeError if the output can't be brought under `target_bytes` — up front,
+        without encoding, when the plan doesn't fit at `min_kbps`.
+        """
+        t0 = time.monotonic()
+        plan = self.plan(ident, duration, target_bytes, audio_kbps, strategy, _variant(video_args(0)), min_kbps)
+        if not plan.fits:
+            raise too_long(src, duration, target_bytes, min_kbps)
+        passlog = None
+        attempts = 1
+        if plan.strategy == STRATEGY_TWOPASS:
+            passlog, ran = self._passlog(ident, video_args(plan.video_kbps), run, src, duration, set_span)
+            attempts += ran
+            set_span(0.35, 1.0)
+        else:
+            set_span(0.0, 1.0)
+        self._final_pass(src, out, video_args(plan.video_kbps), audio_args, passlog, run, duration)
+
+        report = SizeReport(plan.strategy, target_bytes, plan.nominal_bytes, plan.expected_bytes,
+                            out.stat().st_size, attempts, time.monotonic() - t0)
+        self.model.learn(ident, report)
+
+        # safety net: re-encode smaller until it fits; never hand back something over the limit
+        video_kbps = plan.video_kbps
+        for _retry in range(MAX_RETRIES):
+            if report.actual_bytes <= target_bytes:
+                break
+            goal = target_bytes * (1 - self.tolerance / 2)
+            total_kbps = (video_kbps + audio_kbps) * goal / report.actual_bytes
+            new_kbps = max(min_kbps, int(total_kbps - audio_kbps))
+            if new_kbps >= video_kbps:
+                break       # already at the floor
+            scale = (new_kbps + audio_kbps) / (video_kbps + audio_kbps)
+            video_kbps = new_kbps
+            set_span(0.0, 1.0)
+            self._final_pass(src, out, video_args(video_kbps), audio_args, passlog, run, duration)
+            report = SizeReport(plan.strategy, target_bytes, int(report.nominal_bytes * scale),
+                                int(report.actual_bytes * scale), out.stat().st_size, report.attempts + 1,
+                                time.monotonic() - t0)
+        if report.actual_bytes > target_bytes:
+            raise RuntimeError(f"Could not get {src.name} under {target_bytes / 1e6:.1f} MB "
+                               f"({report.actual_bytes / 1e6:.2f} MB at {video_kbps} kbps).")
+        return report
+
+    # ---------- Internals ----------
+    def _cmd(self, src: Path, out: Path, vargs: list[str], aargs: list[str]) -> list[str]:
+        return [self.ffmpeg, "-y", "-i", str(src), *vargs, *aargs, "-movflags", "+faststart", str(out)]
+
+    def _final_pass(self, src, out, vargs, aargs, passlog: Path | None, run, duration):
+        if passlog is not None:
+            vargs = vargs + ["-pass", "2", "-passlogfile", str(passlog)]
+        run(self._cmd(src, out, vargs, aargs), duration)
+
+    def _passlog_path(self, ident: str, preset: str) -> Path:
+        return self.passlog_dir / f"{ident}-{preset}"
+
+    @staticmethod
+    def _passlog_cached(prefix: Path) -> bool:
+        return Path(f"{prefix}-0.log").exists() and Path(f"{prefix}-0.log.mbtree").exists()
+
+    def _passlog(self, ident: str, vargs: list[str], run, src: Path, duration: float,
+                 set_span) -> tuple[Path, bool]:
+        """
+        Pass-1 stats depend only on the source, preset and filters, so they're cached
+        and reused. Returns (passlog prefix, whether pass 1 had to run).
+        """
+        final = self._passlog_path(ident, _variant(vargs))
+        if self._passlog_cached(final):
+            return final, False
+
+        tmp = final.with_name(f"{final.name}.{os.getpid()}.{threading.get_ident()}")
+        set_span(0.0, 0.35)
+        try:
+            run([self.ffmpeg, "-y", "-i", str(src), *vargs, "-pass", "1", "-passlogfile", str(tmp),
+                 "-an", "-f", "null", "-"], duration)
+            for suffix in ("-0.log.mbtree", "-0.log"):
+                os.replace(f"{tmp}{suffix}", f"{final}{suffix}")
+            self._prune_passlogs()
+        finally:
+            for suffix in ("-0.log", "-0.log.mbtree", "-0.log.temp", "-0.log.mbtree.temp"):
+                try:
+                    os.unlink(f"{tmp}{suffix}")
+                except OSError:
+                    pass
+        return final, True
+
+    def _prune_passlogs(self):
+        logs = sorted(self.passlog_dir.glob("*-0.log"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in logs[MAX_PASSLOGS:]:
+            for p in (old, Path(f"{old}.mbtree")):
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+
+
+def min_video_kbps(width: int | None = None, height: int | None = None, fps: float | None = None) -> int:
+    """Bitrate floor for a frame size / rate: MIN_VIDEO_KBPS from REF_PIXEL_RATE up, less below it."""
+    if not (width and height and fps):
+        return MIN_VIDEO_KBPS
+    return max(MIN_FLOOR_KBPS, int(MIN_VIDEO_KBPS * min(1.0, width * height * fps / REF_PIXEL_RATE)))
+
+
+def too_long(src: Path, duration: float, target_bytes: int, min_kbps: int) -> RuntimeError:
+    return RuntimeError(f"{src.name} is too long for {target_bytes / 1e6:.1f} MB: {duration:.0f} s leaves "
+                        f"video less than the {min_kbps} kbps floor.")
+
+
+def _variant(vargs: list[str]) -> str:
+    """Preset, plus a tag for any -vf (pass-1 stats of a scaled encode don't fit another size)."""
+    preset = vargs[vargs.index("-preset") + 1] if "-preset" in vargs else "medium"
+    if "-vf" in vargs:
+        vf = vargs[vargs.index("-vf") + 1]
+        preset += "-" + hashlib.blake2b(vf.encode(), digest_size=4).hexdigest()
+    return preset
+
+
+def demux_duration(ffmpeg: str, src: Path, run: Callable[[list[str]], dict]) -> float | None:
+    """Duration by stream-copying to null (no decode) when the container has none."""
+    last = run([ffmpeg, "-y", "-i", str(src), "-map", "0:v:0", "-c", "copy", "-f", "null", "-"])
+    out_s = parse_out_time(last or {})
+    return out_s if out_s and out_s > 0 else None
@@ -0,0 +1,6 @@
+# conftest.py
+import sys
+from pathlib import Path
+
+# the app is a flat set of modules at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
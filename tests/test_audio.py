@@ -0,0 +1,62 @@
+# test_audio.py
+import json, os
+from pathlib import Path
+
+import pytest
+
+from audio import LADDER, AudioPlan, AudioPlanner
+from metadata import AudioStream, MediaInfo, VideoStream
+
+TARGET = 9_500_000
+LIVE, SILENT = (-20.0, -1.0), (-91.0, -80.0)
+
+
+def _info(duration, *tracks) -> MediaInfo:
+    """tracks: (codec, channels, kbps) per audio stream."""
+    return MediaInfo(Path("clip.mp4"), 50_000_000, 1, duration, None, "mp4",
+                     VideoStream(0, "h264", None, None, 1920, 1080, 60.0, None),
+                     [AudioStream(i + 1, codec, ch, 48000, kbps * 1000 if kbps else None)
+                      for i, (codec, ch, kbps) in enumerate(tracks)])
+
+
+def _planner(tmp_path, levels=None, tracks="mix") -> AudioPlanner:
+    path = tmp_path / "audio.json"
+    if levels is not None:
+        key = f"{os.path.normcase('clip.mp4')}|50000000|1"
+        path.write_text(json.dumps({key: [list(lv) for lv in levels]}))
+    return AudioPlanner("ffmpeg", path, tracks)
+
+
+@pytest.mark.parametrize("duration, tracks, levels, expected", [
+    # short clip: top of the ladder; AAC already at or under it is copied
+    (30, [("aac", 2, 160)], None, AudioPlan((0,), False, 96)),
+    (30, [("aac", 2, 96)], None, AudioPlan((0,), True, 96)),
+    (30, [("opus", 2, 96)], None, AudioPlan((0,), False, 96)),
+    (30, [("aac", 1, 128)], None, AudioPlan((0,), False, 64)),
+    # longer clips step down the ladder (at most a fifth of the total bitrate), then to mono
+    (180, [("aac", 2, 160)], None, AudioPlan((0,), False, 80)),
+    (300, [("aac", 2, 160)], None, AudioPlan((0,), False, 48, 1)),
+    (600, [("aac", 2, 160)], None, AudioPlan((0,), False, 32, 1)),
+    (3600, [("aac", 2, 160)], None, AudioPlan((0,), False, LADDER[-1][0], LADDER[-1][1])),
+    # silent tracks are dropped; several live ones are mixed
+    (30, [("aac", 2, 160)], [SILENT], AudioPlan(dropped=1)),
+    (30, [("aac", 2, 160), ("aac", 2, 160)], [SILENT, LIVE], AudioPlan((1,), False, 96, dropped=1)),
+    (30, [("aac", 2, 160), ("aac", 1, 64)], [LIVE, LIVE], AudioPlan((0, 1), False, 96)),
+    # not analysed yet: every track counts as live
+    (30, [("aac", 2, 160), ("aac", 2, 160)], None, AudioPlan((0, 1), False, 96)),
+    # no audio at all
+    (30, [], None, AudioPlan()),
+])
+def test_plan(tmp_path, duration, tracks, levels, expected):
+    assert _planner(tmp_path, levels).plan(_info(duration, *tracks), TARGET) == expected
+
+
+@pytest.mark.parametrize("mode, expected", [("mix", (0, 1)), ("loudest", (1,)), ("first", (0,))])
+def test_track_selection(tmp_path, mode, expected):
+    planner = _planner(tmp_path, [(-30.0, -5.0), (-18.0, -1.0)], mode)
+    assert planner.plan(_info(30, ("aac", 2, 160), ("aac", 2, 160)), TARGET).tracks == expected
+
+
+def test_at_floor():
+    assert AudioPlan((0,), True, 96).at_floor() == AudioPlan((0,), False, LADDER[-1][0], LADDER[-1][1])
+    assert AudioPlan(dropped=2).at_floor() == AudioPlan(dropped=2)
@@ -0,0 +1,41 @@
+# test_catalogue.py
+from pathlib import Path
+
+from catalogue import Catalogue
+
+FOLDER = Path("clips")
+
+
+def _names(cat: Catalogue) -> list[str]:
+    return [p.name for p in cat]
+
+
+def test_length_order_follows_probed_durations():
+    cat = Catalogue(FOLDER, [("a.mp4", 30, 3, None), ("b.mp4", 20, 2, None), ("c.mp4", 10, 1, None)])
+    cat.set_view("length")
+    assert _names(cat) == ["a.mp4", "b.mp4", "c.mp4"]      # nothing probed: row order
+
+    for name, duration in (("a.mp4", 12.0), ("b.mp4", 5.0), ("c.mp4", 40.0)):
+        cat.set_duration(FOLDER / name, duration)
+    cat.set_view("length")
+    assert _names(cat) == ["c.mp4", "a.mp4", "b.mp4"]
+
+
+def test_unprobed_clips_sort_last():
+    cat = Catalogue(FOLDER, [("a.mp4", 1, 3, None), ("b.mp4", 1, 2, 5.0), ("c.mp4", 1, 1, 9.0)])
+    cat.set_view("length")
+    assert _names(cat) == ["c.mp4", "b.mp4", "a.mp4"]
+    cat.set_duration(FOLDER / "a.mp4", 7.0)
+    cat.set_view("length")
+    assert _names(cat) == ["c.mp4", "a.mp4", "b.mp4"]
+
+
+def test_filter_keeps_the_current_clip():
+    cat = Catalogue(FOLDER, [("match one.mp4", 1, 3, None), ("other.mp4", 1, 2, None), ("Match two.mp4", 1, 1, None)])
+    cat.set_view("name", "match")
+    assert _names(cat) == ["match one.mp4", "Match two.mp4"]
+    cat.set_view(query="^oth")
+    assert _names(cat) == ["other.mp4"]
+    cat.set_view(query="two", keep=FOLDER / "other.mp4")
+    assert _names(cat) == ["Match two.mp4", "other.mp4"]
+    assert cat.index_of(FOLDER / "other.mp4") == 1 and cat.index_of(FOLDER / "nope.mp4") is None
@@ -0,0 +1,112 @@
+# test_clipboard.py
+import queue, threading
+from contextlib import closing
+
+from clipboard import Clipboard, ClipboardBackend, FakeBackend
+
+
+class GatedBackend(FakeBackend):
+    """FakeBackend whose first copy blocks until the test lets it go."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.closed = False
+
+    def copy_files(self, paths):
+        if not self.copies:
+            self.entered.set()
+            assert self.release.wait(5)
+        super().copy_files(paths)
+
+    def close(self):
+        self.closed = True
+
+
+class Dispatcher:
+    """Stands in for UiDispatcher.post: queues callbacks for the test thread to run."""
+
+    def __init__(self):
+        self.calls: queue.Queue = queue.Queue()
+        self.thread = None
+
+    def post(self, fn, *args):
+        self.thread = threading.current_thread()
+        self.calls.put((fn, args))
+
+    def run_one(self, timeout=5):
+        fn, args = self.calls.get(timeout=timeout)
+        fn(*args)
+
+
+def test_copy_reaches_backend_and_on_done(tmp_path):
+    backend, ui = FakeBackend(), Dispatcher()
+    with closing(Clipboard(backend, ui.post)) as c:
+        done = []
+        c.copy([tmp_path / "a.mp4"], on_done=lambda paths, error: done.append((paths, error)))
+        ui.run_one()
+        assert done == [([tmp_path / "a.mp4"], None)]
+        assert backend.copies == [[tmp_path / "a.mp4"]]
+        assert c.last_seconds is not None
+
+
+def test_only_newest_pending_request_runs(tmp_path):
+    backend, ui = GatedBackend(), Dispatcher()
+    with closing(Clipboard(backend, ui.post)) as c:
+        done = []
+        on_done = lambda paths, error: done.append(paths[0].name)
+        c.copy([tmp_path / "first.mp4"], on_done)
+        assert backend.entered.wait(5)
+        # the backend is busy with "first"; of the requests queued behind it only the last survives
+        for name in ("second.mp4", "third.mp4", "fourth.mp4"):
+            c.copy([tmp_path / name], on_done)
+        backend.release.set()
+        ui.run_one()
+        ui.run_one()
+        assert done == ["first.mp4", "fourth.mp4"]
+        assert [p[0].name for p in backend.copies] == ["first.mp4", "fourth.mp4"]
+        assert ui.calls.empty()
+
+
+def test_backend_error_reaches_on_done_through_dispatch(tmp_path, capsys):
+    ui = Dispatcher()
+    with closing(Clipboard(FakeBackend(fail="clipboard is locked"), ui.post)) as c:
+        done = []
+        c.copy([tmp_path / "a.mp4"], on_done=lambda paths, error: done.append((paths, error)))
+        ui.run_one()
+        assert ui.thread is not threading.current_thread()    # posted from the clipboard thread
+        [(paths, error)] = done
+        assert paths == [tmp_path / "a.mp4"]
+        assert isinstance(error, RuntimeError) and str(error) == "clipboard is locked"
+        assert capsys.readouterr().out == ""
+
+
+def test_no_backend_reports_an_error(tmp_path):
+    ui = Dispatcher()
+    with closing(Clipboard(ClipboardBackend(), ui.post)) as c:
+        done = []
+        c.copy([tmp_path / "a.mp4"], on_done=lambda _paths, error: done.append(error))
+        ui.run_one()
+        assert isinstance(done[0], RuntimeError)
+
+
+def test_close_drains_pending_copies_then_closes_the_backend(tmp_path):
+    backend, ui = GatedBackend(), Dispatcher()
+    c = Clipboard(backend, ui.post)
+    c.copy([tmp_path / "first.mp4"], lambda *_a: None)
+    assert backend.entered.wait(5)
+    c.copy([tmp_path / "second.mp4"], lambda *_a: None)
+    threading.Timer(0.1, backend.release.set).start()
+    c.close()
+    assert not c._thread.is_alive()
+    assert backend.closed
+    assert [p[0].name for p in backend.copies] == ["first.mp4", "second.mp4"]
+
+
+def test_close_when_idle(tmp_path):
+    backend = GatedBackend()
+    c = Clipboard(backend)
+    c.close()
+    assert not c._thread.is_alive() and backend.closed
+    assert backend.copies == []
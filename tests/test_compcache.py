@@ -0,0 +1,69 @@
+# test_compcache.py
+import json
+
+import compcache
+from compcache import CompressionCache
+
+KB = 1024
+
+
+def _put(cache: CompressionCache, src, name: str, size: int):
+    key = cache.key_for(src, name=name)
+    tmp = cache.temp_path(key)
+    tmp.write_bytes(b"x" * size)
+    return key, cache.put(key, tmp, name)
+
+
+def test_lru_eviction_and_index_round_trip(tmp_path):
+    src = tmp_path / "clip.mp4"
+    src.write_bytes(b"source")
+    cache = CompressionCache(tmp_path / "cache", max_bytes=10 * KB)
+    a, path_a = _put(cache, src, "a.mp4", 4 * KB)
+    b, path_b = _put(cache, src, "b.mp4", 4 * KB)
+    assert cache.get(a) == path_a           # a is now the most recently used
+    c, path_c = _put(cache, src, "c.mp4", 4 * KB)
+
+    # 12 KB over a 10 KB budget: b (least recently used) goes, its folder with it
+    assert cache.get(b) is None and not path_b.parent.exists()
+    assert cache.get(a) == path_a and cache.get(c) == path_c
+    assert cache.total_bytes() == 8 * KB
+    cache.flush()
+
+    index = json.loads((tmp_path / "cache" / compcache.INDEX_NAME).read_text())
+    assert [k for k, _e in index["entries"]] == [a, c]
+    reopened = CompressionCache(tmp_path / "cache", max_bytes=10 * KB)
+    assert reopened.total_bytes() == 8 * KB
+    assert reopened.get(a) == path_a and reopened.get(c) == path_c and reopened.get(b) is None
+
+
+def test_entry_larger_than_the_budget_is_kept(tmp_path):
+    src = tmp_path / "clip.mp4"
+    src.write_bytes(b"source")
+    cache = CompressionCache(tmp_path / "cache", max_bytes=2 * KB)
+    a, _path = _put(cache, src, "a.mp4", 1 * KB)
+    b, path_b = _put(cache, src, "b.mp4", 3 * KB)
+    assert cache.get(a) is None and cache.get(b) == path_b
+
+
+def test_missing_file_drops_the_entry(tmp_path):
+    src = tmp_path / "clip.mp4"
+    src.write_bytes(b"source")
+    cache = CompressionCache(tmp_path / "cache")
+    a, path_a = _put(cache, src, "a.mp4", KB)
+    path_a.unlink()
+    assert cache.get(a) is None and cache.total_bytes() == 0
+
+
+def test_identity_follows_the_file_and_the_memo_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(compcache, "IDENT_MEMO_MAX", 3)
+    cache = CompressionCache(tmp_path / "cache")
+    clips = []
+    for i in range(5):
+        clips.append(tmp_path / f"{i}.mp4")
+        clips[-1].write_bytes(bytes([i]) * 100)
+    idents = [cache.source_identity(p) for p in clips]
+    assert len(set(idents)) == 5 and len(cache._ident_memo) == 3
+    assert cache.source_identity(clips[0]) == idents[0]
+
+    clips[1].write_bytes(b"changed" * 100)
+    assert cache.source_identity(clips[1]) != idents[1]
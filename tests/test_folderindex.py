@@ -0,0 +1,27 @@
+# test_folderindex.py
+import os
+
+from folderindex import FolderIndex
+
+
+def test_refresh_reports_only_the_diff(tmp_path):
+    folder = tmp_path / "clips"
+    folder.mkdir()
+    (folder / "old.mp4").write_bytes(b"a")
+    (folder / "new.mp4").write_bytes(b"b")
+    os.utime(folder / "old.mp4", ns=(1_000_000_000, 1_000_000_000))
+    (folder / "notes.txt").write_text("skip")
+    index = FolderIndex(tmp_path / "index.db", {".mp4"})
+
+    added, removed = index.refresh(folder)
+    assert [p.name for p in added] == ["new.mp4", "old.mp4"]
+    assert removed == []
+    assert index.refresh(folder) == ([], [])
+
+    (folder / "old.mp4").unlink()
+    (folder / "later.mp4").write_bytes(b"c")
+    added, removed = index.refresh(folder)
+    assert [p.name for p in added] == ["later.mp4"]
+    assert [p.name for p in removed] == ["old.mp4"]
+    assert [e.path.name for e in index.cached(folder)] == ["later.mp4", "new.mp4"]
+    index.close()
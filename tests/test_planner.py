@@ -0,0 +1,43 @@
+# test_planner.py
+from pathlib import Path
+
+import pytest
+
+from metadata import MediaInfo, VideoStream
+from planner import EncodePlanner, ThroughputProfile
+from sizing import min_video_kbps
+
+
+def _info(duration=600.0, width=1920, height=1080, fps=60.0) -> MediaInfo:
+    return MediaInfo(Path("clip.mp4"), 500_000_000, 0, duration, None, "mp4",
+                     VideoStream(0, "h264", "High", "yuv420p", width, height, fps, None))
+
+
+@pytest.fixture
+def planner(tmp_path):
+    return EncodePlanner(ThroughputProfile(tmp_path / "throughput.json"), threads=8)
+
+
+def test_ample_budget_keeps_the_source_size(planner):
+    p = planner.plan(_info(duration=30), 20000, True, None)
+    assert p.fits and (p.height, p.fps) == (1080, 60) and p.video_kbps == 20000
+
+
+@pytest.mark.parametrize("kbps", [140, 90, 60, 40])
+def test_budget_under_the_floor_picks_a_size_that_takes_it(planner, kbps):
+    p = planner.plan(_info(), kbps, True, None)
+    assert p.fits and p.video_kbps == kbps
+    assert p.min_kbps <= kbps and p.filters()
+    assert (p.height, p.fps) < (1080, 60)
+
+
+def test_nothing_fits(planner):
+    p = planner.plan(_info(), 20, True, None)
+    assert not p.fits
+    assert (p.height, p.fps) == (360, 30) and p.video_kbps == min_video_kbps(640, 360, 30)
+
+
+def test_unprobed_video_has_no_plan(planner):
+    info = _info()
+    info.video = None
+    assert planner.plan(info, 1000, True, None) is None
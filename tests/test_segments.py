@@ -0,0 +1,48 @@
+# test_segments.py
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import segments
+from segments import MIN_SEGMENT_SECONDS, probe_packets, split_at_keyframes
+
+
+def _bounds(segs):
+    return [(s.start, s.end) for s in segs]
+
+
+def test_cuts_snap_to_the_nearest_keyframe():
+    keyframes = [0.0, 20.0, 28.0, 41.0, 59.0, 62.0, 80.0, 95.0]
+    segs = split_at_keyframes(120.0, keyframes, [], 4)
+    assert _bounds(segs) == [(0.0, 28.0), (28.0, 59.0), (59.0, 95.0), (95.0, 120.0)]
+    assert [s.index for s in segs] == [0, 1, 2, 3]
+
+
+def test_segments_keep_a_minimum_length():
+    # keyframes every second: no segment may be shorter than MIN_SEGMENT_SECONDS, the tail included
+    keyframes = [float(t) for t in range(0, 30)]
+    segs = split_at_keyframes(30.0, keyframes, [], 8)
+    assert all(s.duration >= MIN_SEGMENT_SECONDS for s in segs)
+    assert segs[0].start == 0.0 and segs[-1].end == 30.0
+    assert all(a.end == b.start for a, b in zip(segs, segs[1:]))
+
+
+def test_no_usable_keyframe_gives_one_segment():
+    assert _bounds(split_at_keyframes(100.0, [0.0, 95.0], [], 4)) == [(0.0, 100.0)]
+
+
+def test_source_bytes_are_attributed_by_packet_time():
+    packets = [(0.0, 100), (10.0, 100), (29.9, 50), (30.0, 7), (45.0, 3), (59.9, 1)]
+    segs = split_at_keyframes(60.0, [0.0, 30.0], packets, 2)
+    assert _bounds(segs) == [(0.0, 30.0), (30.0, 60.0)]
+    assert [s.src_bytes for s in segs] == [250, 11]
+
+
+def test_packet_times_are_relative_to_start_time(monkeypatch):
+    out = "10.500000,900,K__\n10.533333,100,___\n40.500000,800,K__\n70.500000,700,K_\n10.500000\n"
+    monkeypatch.setattr(segments.subprocess, "run",
+                        lambda cmd, **kw: subprocess.CompletedProcess(cmd, 0, stdout=out, stderr=""))
+    keyframes, packets = probe_packets("ffprobe", Path("clip.mp4"))
+    assert keyframes == [0.0, 30.0, 60.0]
+    assert packets[:2] == [(0.0, 900), (pytest.approx(0.033333), 100)]
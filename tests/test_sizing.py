@@ -0,0 +1,51 @@
+# test_sizing.py
+from pathlib import Path
+
+import pytest
+
+from sizing import MIN_FLOOR_KBPS, MIN_VIDEO_KBPS, STRATEGY_TWOPASS, SizeTargeter, min_video_kbps
+
+MB = 1_000_000
+
+
+@pytest.fixture
+def sizer(tmp_path):
+    return SizeTargeter("ffmpeg", tmp_path)
+
+
+@pytest.mark.parametrize("duration, fits", [(30, True), (300, True), (600, False), (3600, False)])
+def test_plan_flags_a_budget_under_the_floor(sizer, duration, fits):
+    plan = sizer.plan("clip", duration, 10 * MB, 96, STRATEGY_TWOPASS)
+    assert plan.fits is fits
+    assert plan.video_kbps == max(MIN_VIDEO_KBPS, plan.budget_kbps)
+    if fits:
+        assert plan.expected_bytes <= 10 * MB
+    else:
+        assert plan.expected_bytes > 10 * MB
+
+
+def test_lower_floor_lets_a_long_clip_fit(sizer):
+    assert not sizer.plan("clip", 600, 10 * MB, 32, STRATEGY_TWOPASS).fits
+    plan = sizer.plan("clip", 600, 10 * MB, 32, STRATEGY_TWOPASS, min_kbps=60)
+    assert plan.fits and plan.expected_bytes <= 10 * MB
+
+
+def test_encode_refuses_up_front_when_nothing_fits(sizer, tmp_path):
+    ran = []
+    with pytest.raises(RuntimeError, match="too long"):
+        sizer.encode(tmp_path / "long.mp4", tmp_path / "out.mp4", "clip", 600, 10 * MB,
+                     lambda kbps: ["-c:v", "libx264", "-preset", "veryfast", "-b:v", f"{kbps}k"],
+                     ["-c:a", "aac"], 96, run=lambda cmd, dur: ran.append(cmd))
+    assert ran == []
+
+
+@pytest.mark.parametrize("size, floor", [
+    ((None, None, None), MIN_VIDEO_KBPS),
+    ((1920, 1080, 60), MIN_VIDEO_KBPS),
+    ((1280, 720, 30), MIN_VIDEO_KBPS),
+    ((960, 540, 30), MIN_VIDEO_KBPS * 9 // 16),
+    ((640, 360, 30), MIN_VIDEO_KBPS // 4),
+    ((320, 180, 15), MIN_FLOOR_KBPS),
+])
+def test_min_video_kbps_scales_with_pixel_rate(size, floor):
+    assert min_video_kbps(*size) == floor
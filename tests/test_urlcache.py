@@ -0,0 +1,178 @@
+# test_urlcache.py
+import os, json, time, threading, urllib.error, urllib.request
+
+import pytest
+
+import urlcache
+from urlcache import Download, FileSource, UrlCache, serve_files, url_key
+
+CHUNK = 64 * 1024
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(urlcache, "CHUNK_SIZE", CHUNK)
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(os.urandom(10 * CHUNK + 1234))
+    return path
+
+
+@pytest.fixture
+def url(clip):
+    server, base = serve_files({clip.name: clip})
+    yield f"{base}/{clip.name}"
+    server.shutdown()
+    server.server_close()
+
+
+def _read_log(monkeypatch, delay=0.0):
+    """Records (offset, length) of every read the stand-in server does, and peak concurrency."""
+    log, active, peak = [], [0], [0]
+    lock = threading.Lock()
+    original = FileSource.read_at
+
+    def read_at(self, offset, length):
+        with lock:
+            log.append((offset, length))
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            time.sleep(delay)
+            return original(self, offset, length)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(FileSource, "read_at", read_at)
+    return log, peak
+
+
+def _download(url, folder, **kw):
+    done = threading.Event()
+    d = Download(url, folder, on_complete=lambda _d: done.set(), **kw)
+    folder.mkdir(parents=True, exist_ok=True)
+    d.start()
+    assert done.wait(20), "download did not finish"
+    return d
+
+
+def test_parallel_range_fetches(url, clip, tmp_path, monkeypatch):
+    _log, peak = _read_log(monkeypatch, delay=0.02)
+    d = _download(url, tmp_path / "dl", connections=4)
+    assert d.error is None and d.done and d.ranges
+    assert d.path.read_bytes() == clip.read_bytes()
+    assert not d.part.exists() and not (d.dir / urlcache.STATE_NAME).exists()
+    assert peak[0] > 1
+
+
+def test_resume_from_state(url, clip, tmp_path, monkeypatch):
+    folder = tmp_path / "dl"
+    folder.mkdir()
+    data = clip.read_bytes()
+    n = len(data) // CHUNK + 1
+    have = [1 <= i <= 4 for i in range(n)]
+    # a previous run got chunks 1-4 on disk before it stopped
+    part = folder / (clip.name + ".part")
+    with open(part, "wb") as f:
+        f.truncate(len(data))
+        f.seek(CHUNK)
+        f.write(data[CHUNK:5 * CHUNK])
+    (folder / urlcache.STATE_NAME).write_text(json.dumps(
+        {"url": url, "size": len(data), "etag": "", "have": "".join("1" if h else "0" for h in have)}))
+
+    log, _peak = _read_log(monkeypatch)
+    d = _download(url, folder)
+    assert d.error is None and d.done
+    assert d.path.read_bytes() == data
+    assert not any(CHUNK <= off < 5 * CHUNK for off, _n in log)
+
+
+def test_stale_state_is_ignored(url, clip, tmp_path):
+    folder = tmp_path / "dl"
+    folder.mkdir()
+    (folder / (clip.name + ".part")).write_bytes(b"\0" * 10)
+    (folder / urlcache.STATE_NAME).write_text(json.dumps({"size": 5, "etag": "", "have": "1"}))
+    d = _download(url, folder)
+    assert d.path.read_bytes() == clip.read_bytes()
+
+
+def test_no_range_support_falls_back_to_one_stream(clip, tmp_path, monkeypatch):
+    log, _peak = _read_log(monkeypatch)
+    server, base = serve_files({clip.name: clip}, ranges=False)
+    try:
+        d = _download(f"{base}/{clip.name}", tmp_path / "dl", connections=4)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert d.error is None and d.done and not d.ranges
+    assert d.path.read_bytes() == clip.read_bytes()
+    # probe + one full stream, each read from the start
+    assert [off for off, _n in log if off == 0] == [0, 0]
+
+
+def test_missing_file_is_an_error(url, tmp_path):
+    d = _download(url.replace("clip.mp4", "nope.mp4"), tmp_path / "dl")
+    assert isinstance(d.error, urllib.error.HTTPError) and d.error.code == 404
+    assert not d.done
+
+
+def _get(url, range_=None):
+    req = urllib.request.Request(url, headers={"Range": range_} if range_ else {})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_range_handler_responses(url, clip):
+    data = clip.read_bytes()
+    size = len(data)
+
+    status, headers, body = _get(url)
+    assert status == 200 and body == data and headers["Accept-Ranges"] == "bytes"
+
+    status, headers, body = _get(url, "bytes=100-199")
+    assert status == 206 and body == data[100:200]
+    assert headers["Content-Range"] == f"bytes 100-199/{size}"
+
+    status, headers, body = _get(url, "bytes=-50")
+    assert status == 206 and body == data[-50:]
+
+    status, headers, body = _get(url, f"bytes={size - 10}-{size + 100}")
+    assert status == 206 and body == data[-10:]
+
+    status, headers, body = _get(url, f"bytes={size}-")
+    assert status == 416 and headers["Content-Range"] == f"bytes */{size}" and body == b""
+
+    status, _headers, _body = _get(url.replace("clip.mp4", "nope.mp4"))
+    assert status == 404
+
+
+def test_eviction_by_total_bytes(tmp_path):
+    files = {}
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        files[name] = tmp_path / name
+        files[name].write_bytes(os.urandom(3 * CHUNK))
+    server, base = serve_files(files)
+    cache = UrlCache(tmp_path / "cache", max_bytes=7 * CHUNK)
+    try:
+        for name in files:
+            done = threading.Event()
+            d = cache.open(f"{base}/{name}", on_complete=lambda _d: done.set())
+            assert done.wait(20) and d.done
+        # a + b + c is 9 chunks; the least recently opened one goes
+        assert cache.total_bytes() <= 7 * CHUNK
+        assert not (cache.root / url_key(f"{base}/a.mp4")).exists()
+        for name in ("b.mp4", "c.mp4"):
+            assert (cache.root / url_key(f"{base}/{name}") / name).read_bytes() == files[name].read_bytes()
+        index = json.loads((cache.root / urlcache.INDEX_NAME).read_text())
+        assert [k for k, _e in index["entries"]] == [url_key(f"{base}/b.mp4"), url_key(f"{base}/c.mp4")]
+    finally:
+        cache.close()
+        server.shutdown()
+        server.server_close()
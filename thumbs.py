@@ -0,0 +1,128 @@
+# thumbs.py
+import re, math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from compcache import CompressionCache
+from jobs import Job, JobQueue, run_ffmpeg
+from metadata import MediaInfo
+
+# ============================================================
+# Seek-preview sprite sheets (one ffmpeg pass per clip)
+# ============================================================
+SPRITE_COLS   = 10
+SPRITE_ROWS   = 10
+SPRITE_TILE_W = 128
+SPRITE_MAX_BYTES = 512 * 1024 * 1024
+
+_NAME_RE = re.compile(r"sprite_c(\d+)_r(\d+)_i(\d+)_n(\d+)\.ppm$")
+_PPM_HEADER_RE = re.compile(rb"P6\s+(\d+)\s+(\d+)\s+(\d+)\s")
+
+
+@dataclass
+class SpriteSheet:
+    """
+    Raw PPM sheet on disk. Tiles are read straight out of the file on demand,
+    so only the tile being shown is ever loaded/decoded.
+    """
+    path: Path
+    cols: int
+    rows: int
+    interval: float     # seconds between tiles
+    count: int          # tiles actually filled
+    width: int = 0
+    height: int = 0
+    _data_offset: int = 0
+
+    @classmethod
+    def open(cls, path: Path) -> "SpriteSheet | None":
+        m = _NAME_RE.search(path.name)
+        if not m:
+            return None
+        cols, rows, interval_ms, count = map(int, m.groups())
+        sheet = cls(path, cols, rows, interval_ms / 1000.0, count)
+        with open(path, "rb") as f:
+            m = _PPM_HEADER_RE.match(f.read(64))
+        if not m:
+            return None
+        sheet.width, sheet.height = int(m.group(1)), int(m.group(2))
+        sheet._data_offset = m.end()
+        return sheet
+
+    @property
+    def tile_w(self) -> int:
+        return self.width // self.cols
+
+    @property
+    def tile_h(self) -> int:
+        return self.height // self.rows
+
+    def tile_index(self, seconds: float) -> int:
+        return max(0, min(self.count - 1, int(seconds / self.interval)))
+
+    def tile_ppm(self, index: int) -> bytes:
+        """The tile as a standalone binary PPM (Tk PhotoImage accepts this as data)."""
+        tw, th = self.tile_w, self.tile_h
+        col, row = index % self.cols, index // self.cols
+        stride = self.width * 3
+        out = bytearray(f"P6\n{tw} {th}\n255\n".encode())
+        with open(self.path, "rb") as f:
+            for y in range(row * th, row * th + th):
+                f.seek(self._data_offset + y * stride + col * tw * 3)
+                out += f.read(tw * 3)
+        return bytes(out)
+
+
+class ThumbnailService:
+    """Builds sprite sheets in the background (idle priority) and caches them on disk."""
+
+    def __init__(self, ffmpeg: str, cache: CompressionCache, jobs: JobQueue,
+                 probe: Callable[[Path], MediaInfo | None]):
+        self.ffmpeg = ffmpeg
+        self.cache = cache
+        self.jobs = jobs
+        self.probe = probe
+        self._sheets: dict[str, SpriteSheet] = {}
+
+    def sheet(self, src: Path) -> SpriteSheet | None:
+        return self._sheets.get(str(src))
+
+    def request(self, src: Path, on_ready: Callable[[Path], None] | None = None):
+        if str(src) in self._sheets:
+            return
+        def done(job: Job):
+            if job.error is None and job.result is not None:
+                self._sheets[str(src)] = job.result
+                if on_ready:
+                    on_ready(src)
+        self.jobs.submit(("sprite", str(src)), src.name, lambda job: self._build(src, job),
+                         on_done=done, background=True)
+
+    def _build(self, src: Path, job: Job) -> SpriteSheet | None:
+        info = self.probe(src)
+        if info is None or not info.duration or info.video is None:
+            return None
+        n = SPRITE_COLS * SPRITE_ROWS
+        interval = max(1.0, info.duration / n)
+        interval_ms = int(math.ceil(interval * 1000))
+        count = min(n, int(math.ceil(info.duration / (interval_ms / 1000.0))))
+
+        key = self.cache.key_for(src, kind="sprite", cols=SPRITE_COLS, rows=SPRITE_ROWS, tile_w=SPRITE_TILE_W)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return SpriteSheet.open(cached)
+
+        out = self.cache.temp_path(key, ".ppm")
+        # keyframes only: a multi-GB recording is sampled without decoding every frame
+        vf = (f"fps=1000/{interval_ms},scale={SPRITE_TILE_W}:-2,"
+              f"tile={SPRITE_COLS}x{SPRITE_ROWS}")
+        try:
+            run_ffmpeg([self.ffmpeg, "-y", "-skip_frame", "nokey", "-i", str(src), "-map", "0:v:0", "-an",
+                        "-vf", vf, "-frames:v", "1", "-f", "image2", "-c:v", "ppm", "-pix_fmt", "rgb24", str(out)],
+                       job, info.duration)
+        except BaseException:
+            out.unlink(missing_ok=True)
+            raise
+        name = f"sprite_c{SPRITE_COLS}_r{SPRITE_ROWS}_i{interval_ms}_n{count}.ppm"
+        return SpriteSheet.open(self.cache.put(key, out, name))
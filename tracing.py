@@ -0,0 +1,177 @@
+# tracing.py
+import os, json, time, functools, threading
+from collections import deque
+from pathlib import Path
+
+# ============================================================
+# Hot-path spans: ring buffer, Chrome trace export, p50/p95 summary
+# ============================================================
+# CLIPVIEWER_TRACE=1 turns recording on; when off, span() hands back one shared
+# no-op object, so an instrumented call costs a global lookup and a call.
+ENABLED = os.environ.get("CLIPVIEWER_TRACE", "") not in ("", "0")
+BUFFER_SIZE = int(os.environ.get("CLIPVIEWER_TRACE_BUFFER", "8192"))
+STALL_MS = 150          # Tk event loop this late counts as a stall
+
+_T0 = time.perf_counter()
+_events: deque[tuple] = deque(maxlen=BUFFER_SIZE)   # (name, ph, start_s, dur_s, tid, args)
+
+
+def _now() -> float:
+    return time.perf_counter() - _T0
+
+
+class Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = _now()
+        return self
+
+    def __exit__(self, exc_type, exc, _tb):
+        if exc is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        _events.append((self.name, "X", self.start, _now() - self.start, threading.get_ident(), self.args))
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **args) -> Span | _NoSpan:
+    """`with span("ffmpeg", tool=...) as s: ... s.set(speed=...)`"""
+    if not ENABLED:
+        return _NO_SPAN
+    return Span(name, args)
+
+
+def traced(name: str):
+    """Decorator form of span(); leaves the function untouched when tracing is off."""
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def record(name: str, start: float, duration: float, **args):
+    """A span measured elsewhere; `start` is a time.perf_counter() value."""
+    if ENABLED:
+        _events.append((name, "X", start - _T0, duration, threading.get_ident(), args))
+
+
+def event(name: str, **args):
+    """Instant event (errors, markers)."""
+    if ENABLED:
+        _events.append((name, "i", _now(), 0.0, threading.get_ident(), args))
+
+
+def export_chrome(path: Path) -> Path:
+    """Write the buffer as Chrome trace-event JSON (chrome://tracing, Perfetto)."""
+    pid = os.getpid()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    out = []
+    for tid in {e[4] for e in list(_events)}:
+        out.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                    "args": {"name": names.get(tid, str(tid))}})
+    for name, ph, start, dur, tid, args in list(_events):
+        ev = {"name": name, "cat": name.split(".")[0], "ph": ph, "ts": round(start * 1e6),
+              "pid": pid, "tid": tid, "args": args}
+        if ph == "X":
+            ev["dur"] = round(dur * 1e6)
+        else:
+            ev["s"] = "t"
+        out.append(ev)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"traceEvents": out, "displayTimeUnit": "ms"}), encoding="utf-8")
+    return path
+
+
+def _pct(xs: list[float], p: float) -> float:
+    return xs[min(len(xs) - 1, int(round(p * (len(xs) - 1))))]
+
+
+def summary() -> dict[str, dict]:
+    """name -> count / p50 / p95 / max in milliseconds, over what's in the buffer."""
+    by_name: dict[str, list[float]] = {}
+    for name, ph, _start, dur, _tid, _args in list(_events):
+        if ph == "X":
+            by_name.setdefault(name, []).append(dur * 1000)
+    out = {}
+    for name, xs in sorted(by_name.items()):
+        xs.sort()
+        out[name] = {"count": len(xs), "p50_ms": _pct(xs, 0.5), "p95_ms": _pct(xs, 0.95), "max_ms": xs[-1]}
+    return out
+
+
+def format_summary() -> str:
+    lines = [f"{'operation':<28}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+    for name, s in summary().items():
+        lines.append(f"{name:<28}{s['count']:>6}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    return "\n".join(lines)
+
+
+def dump(folder: Path) -> Path | None:
+    """Export + print the summary (called at exit when tracing is on)."""
+    if not ENABLED or not _events:
+        return None
+    path = export_chrome(folder / time.strftime("trace-%Y%m%d-%H%M%S.json"))
+    print(format_summary())
+    print(f"[trace] written to {path}")
+    return path
+
+
+class StallMonitor:
+    """
+    Heartbeat on the Tk loop: if an after() callback runs much later than
+    asked, whatever ran in between blocked the UI; record it as a span.
+    """
+
+    def __init__(self, root, interval_ms: int = 100, threshold_ms: int = STALL_MS):
+        self.root = root
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self._after_id = None
+        if ENABLED:
+            self._due = time.perf_counter() + self.interval
+            self._after_id = root.after(interval_ms, self._beat)
+
+    def _beat(self):
+        now = time.perf_counter()
+        late = now - self._due
+        if late > self.threshold:
+            record("tk.stall", self._due, late)
+        self._due = now + self.interval
+        self._after_id = self.root.after(int(self.interval * 1000), self._beat)
+
+    def stop(self):
+        if self._after_id:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
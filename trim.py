@@ -0,0 +1,146 @@
+# trim.py
+import shutil, subprocess
+from pathlib import Path
+from typing import Callable
+
+import tracing
+from jobs import Job, run_ffmpeg
+from metadata import MediaInfo, probe_file
+
+# ============================================================
+# Trimming: stream copy when possible, smart cut otherwise
+# ============================================================
+KEYFRAME_WINDOW = 20.0          # seconds after the in-point scanned for the next keyframe
+COPY_AUDIO_CODECS = {"aac", "mp3"}
+ANNEXB_BSF = {"h264": "h264_mp4toannexb", "hevc": "hevc_mp4toannexb"}
+SMART_CUT_ENCODERS = {"h264": "libx264"}
+X264_PROFILES = {
+    "baseline": "baseline", "constrained baseline": "baseline", "main": "main", "high": "high",
+    "high 10": "high10", "high 4:2:2": "high422", "high 4:4:4 predictive": "high444",
+}
+
+
+def keyframes_after(ffprobe: str, src: Path, t: float, window: float = KEYFRAME_WINDOW,
+                    start_time: float = 0.0) -> list[float]:
+    """
+    Keyframe times from the GOP containing `t` up to `t + window` (reads only that interval).
+    `t` and the result count from the container's `start_time`, like input -ss; ffprobe's
+    intervals and pts_time are absolute.
+    """
+    with tracing.span("ffprobe", kind="keyframes", file=src.name):
+        r = subprocess.run(
+            [ffprobe, "-v", "error", "-select_streams", "v:0",
+             "-read_intervals", f"{max(0.0, t) + start_time}%+{window}",
+             "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(src)],
+            check=True, capture_output=True, text=True
+        )
+    out = []
+    for line in r.stdout.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) >= 2 and "K" in parts[1]:
+            try:
+                out.append(float(parts[0]) - start_time)
+            except ValueError:
+                pass
+    return sorted(out)
+
+
+class Trimmer:
+    """
+    Cuts [start, end) out of a clip as cheaply as the source allows:
+      copy   - start lands on a keyframe: plain -c copy
+      smart  - re-encode only start..next keyframe, stream-copy the rest
+      encode - codec we can't splice: re-encode the range
+    """
+
+    def __init__(self, ffmpeg: str, ffprobe: str, probe: Callable[[Path], MediaInfo | None] | None = None):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.probe = probe or (lambda p: probe_file(ffprobe, p))
+
+    def _info(self, src: Path) -> MediaInfo:
+        info = self.probe(src)
+        if info is None:
+            raise RuntimeError(f"Could not read stream info of {src.name}.")
+        return info
+
+    def plan(self, src: Path, start: float, end: float, info: MediaInfo | None = None) -> tuple[str, float | None]:
+        """(mode, first keyframe at/after start)."""
+        info = info or self._info(src)
+        if info.vcodec not in ANNEXB_BSF:
+            return "encode", None
+        kfs = [k for k in keyframes_after(self.ffprobe, src, start, start_time=info.start_time)
+               if k >= start - 0.001]
+        if not kfs:
+            return "encode", None
+        kf = kfs[0]
+        if kf - start < 0.02:          # within about a frame
+            return "copy", kf
+        if kf >= end or info.vcodec not in SMART_CUT_ENCODERS:
+            return "encode", kf
+        return "smart", kf
+
+    def export(self, src: Path, out: Path, start: float, end: float, job: Job | None = None) -> str:
+        """Write the trimmed clip to `out` (mp4). Returns the mode used."""
+        info = self._info(src)
+        end = min(end, info.duration or end)
+        mode, kf = self.plan(src, start, end, info)
+        if mode == "copy":
+            self._copy(src, out, start, end, info, job)
+        elif mode == "smart":
+            self._smart(src, out, start, kf, end, info, job)
+        else:
+            self._encode(src, out, start, end, info, job)
+        return mode
+
+    # ---------- Internals ----------
+    def _audio_args(self, info: MediaInfo) -> list[str]:
+        if info.acodec is None:
+            return []
+        if info.acodec in COPY_AUDIO_CODECS:
+            return ["-c:a", "copy"]
+        return ["-c:a", "aac", "-b:a", "128k"]
+
+    def _copy(self, src, out, start, end, info, job):
+        run_ffmpeg([self.ffmpeg, "-y", "-ss", f"{start:.3f}", "-i", str(src), "-t", f"{end - start:.3f}",
+                    "-map", "0:v:0", "-map", "0:a:0?", "-c:v", "copy", *self._audio_args(info),
+                    "-avoid_negative_ts", "make_zero", "-movflags", "+faststart", str(out)],
+                   job, end - start)
+
+    def _encode(self, src, out, start, end, info, job):
+        kbps = max(500, info.video_kbps or 4000)
+        run_ffmpeg([self.ffmpeg, "-y", "-ss", f"{start:.3f}", "-i", str(src), "-t", f"{end - start:.3f}",
+                    "-map", "0:v:0", "-map", "0:a:0?", "-c:v", "libx264", "-preset", "veryfast",
+                    "-b:v", f"{kbps}k", "-c:a", "aac", "-b:a", "128k",
+                    "-movflags", "+faststart", str(out)],
+                   job, end - start)
+
+    def _smart(self, src, out, start, kf, end, info, job):
+        parts = out.with_name(out.name + ".parts")
+        parts.mkdir(parents=True, exist_ok=True)
+        bsf = ANNEXB_BSF[info.vcodec]
+        head, mid, audio = parts / "head.ts", parts / "mid.ts", parts / "audio.mka"
+        try:
+            # head GOP: re-encode start..kf with parameters the copied stream will accept
+            kbps = max(500, info.video_kbps or 4000)
+            venc = [SMART_CUT_ENCODERS[info.vcodec], "-preset", "veryfast", "-b:v", f"{kbps}k"]
+            if info.video.pix_fmt:
+                venc += ["-pix_fmt", info.video.pix_fmt]
+            profile = X264_PROFILES.get((info.video.profile or "").lower())
+            if profile:
+                venc += ["-profile:v", profile]
+            run_ffmpeg([self.ffmpeg, "-y", "-ss", f"{start:.3f}", "-i", str(src), "-t", f"{kf - start:.6f}",
+                        "-map", "0:v:0", "-an", "-c:v", *venc, "-bsf:v", bsf, "-f", "mpegts", str(head)], job)
+            # the rest: copied from the keyframe, timestamps shifted to follow the head
+            run_ffmpeg([self.ffmpeg, "-y", "-ss", f"{kf:.6f}", "-i", str(src), "-t", f"{end - kf:.6f}",
+                        "-map", "0:v:0", "-an", "-c:v", "copy", "-bsf:v", bsf,
+                        "-output_ts_offset", f"{kf - start:.6f}", "-f", "mpegts", str(mid)], job)
+            cmd = [self.ffmpeg, "-y", "-i", f"concat:{head}|{mid}"]
+            if info.acodec is not None:
+                run_ffmpeg([self.ffmpeg, "-y", "-ss", f"{start:.3f}", "-i", str(src), "-t", f"{end - start:.3f}",
+                            "-map", "0:a:0", "-vn", *self._audio_args(info), str(audio)], job)
+                cmd += ["-i", str(audio), "-map", "0:v:0", "-map", "1:a:0"]
+            cmd += ["-c", "copy", "-movflags", "+faststart", str(out)]
+            run_ffmpeg(cmd, job)
+        finally:
+            shutil.rmtree(parts, ignore_errors=True)
@@ -0,0 +1,539 @@
+# urlcache.py
+import os, re, json, time, shutil, hashlib, mimetypes, threading, urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable
+from urllib.parse import quote, unquote, urlsplit
+
+import tracing
+from compcache import app_cache_dir, atomic_write_text
+from jobs import Job
+
+# ============================================================
+# URL ingestion: parallel range downloads into a sparse on-disk cache,
+# served to VLC over loopback while they're still arriving
+# ============================================================
+CHUNK_SIZE        = 1 << 20     # unit of fetching, resuming and waiting
+CONNECTIONS       = 4
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+TIMEOUT_S         = 20
+RETRIES           = 3
+SERVE_BLOCK       = 256 * 1024
+STATE_EVERY_S     = 1.0         # how often the chunk bitmap is saved (resume after a crash)
+READ_BLOCK        = 64 * 1024
+USER_AGENT        = "ClipViewer"
+INDEX_NAME        = "index.json"
+STATE_NAME        = "state.json"
+
+
+def is_url(text: str) -> bool:
+    return re.match(r"https?://\S+$", text.strip(), re.IGNORECASE) is not None
+
+
+def url_key(url: str) -> str:
+    """Host + path only: Discord's CDN re-signs the query string, the attachment stays the same."""
+    parts = urlsplit(url.strip())
+    return hashlib.blake2b(f"{parts.netloc.lower()}{parts.path}".encode(), digest_size=12).hexdigest()
+
+
+def url_name(url: str) -> str:
+    name = unquote(Path(urlsplit(url.strip()).path).name)
+    name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name)[:120] or "download"
+    return name if Path(name).suffix else name + ".mp4"
+
+
+class Download:
+    """
+    One URL fetched in CHUNK_SIZE pieces over up to CONNECTIONS parallel range
+    requests into a sparse `<name>.part`, renamed to `<name>` once complete
+    (so probes and encodes never see a half file). Readers block in
+    wait_range() for just the bytes they need; prioritize() moves the fetch
+    cursor there (playback seeks). Servers without range support get one
+    sequential stream.
+    """
+
+    def __init__(self, url: str, folder: Path, on_complete: Callable[["Download"], None] | None = None,
+                 connections: int = CONNECTIONS):
+        self.url = url
+        self.key = folder.name
+        self.dir = folder
+        self.path = folder / url_name(url)
+        self.part = folder / (self.path.name + ".part")
+        self.size: int | None = None
+        self.ranges = True
+        self.error: BaseException | None = None
+        self.done = self.path.exists()
+        self.connections = connections
+        self._etag = ""
+        self._have = bytearray()
+        self._inflight: set[int] = set()
+        self._urgent: list[int] = []
+        self._cursor = 0
+        self._cond = threading.Condition()
+        self._cancel = threading.Event()
+        self._saved = 0.0
+        self._on_complete = on_complete
+        self._thread: threading.Thread | None = None
+        if self.done:
+            self.size = self.path.stat().st_size
+            self._have = bytearray(b"\x01" * _chunks(self.size))
+
+    def start(self):
+        if not self.done and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"download-{self.key}", daemon=True)
+            self._thread.start()
+
+    @property
+    def fraction(self) -> float:
+        if self.done:
+            return 1.0
+        with self._cond:
+            return sum(self._have) / len(self._have) if self._have else 0.0
+
+    def prioritize(self, offset: int):
+        """Fetch from here next (a reader is waiting on it)."""
+        with self._cond:
+            i = offset // CHUNK_SIZE
+            if i < len(self._have) and not self._have[i]:
+                self._cursor = i
+                self._urgent.insert(0, i)
+
+    def wait_range(self, offset: int, length: int, timeout: float | None = None) -> int:
+        """Block until bytes from `offset` are on disk; how many (≤ length) can be read now."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self.error is not None:
+                    raise self.error
+                if self.size is not None:
+                    if offset >= self.size:
+                        return 0
+                    n = 0
+                    i = offset // CHUNK_SIZE
+                    while n < length and i < len(self._have) and self._have[i]:
+                        n = min(length, (i + 1) * CHUNK_SIZE - offset, self.size - offset)
+                        i += 1
+                    if n:
+                        return n
+                if self.done:
+                    return 0
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    raise TimeoutError(f"{self.path.name}: byte {offset} not downloaded yet")
+                self._cond.wait(left if left is not None else 1.0)
+
+    def read_at(self, offset: int, length: int) -> bytes:
+        self.prioritize(offset)
+        n = self.wait_range(offset, length)
+        for p in (self.part, self.path):     # renamed under us when the last chunk lands
+            try:
+                with open(p, "rb") as f:
+                    f.seek(offset)
+                    return f.read(n)
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(self.path)
+
+    def wait(self, job: Job | None = None) -> Path:
+        """Block until complete (progress into `job`); the finished local file."""
+        with self._cond:
+            while not self.done:
+                if self.error is not None:
+                    raise self.error
+                if job is not None:
+                    job.check_cancelled()
+                    job.report(sum(self._have) / len(self._have) if self._have else 0.0)
+                self._cond.wait(0.25)
+        return self.path
+
+    def cancel(self):
+        self._cancel.set()
+
+    # ---------- Internals ----------
+    def _run(self):
+        t0 = time.perf_counter()
+        try:
+            self._probe()
+            self._resume()
+            if self.ranges:
+                workers = [threading.Thread(target=self._worker, name=f"download-{self.key}-{n}", daemon=True)
+                           for n in range(max(1, min(self.connections, len(self._have))))]
+                for w in workers:
+                    w.start()
+                for w in workers:
+                    w.join()
+            else:
+                self._stream()
+            if self.error is None and not self._cancel.is_set():
+                self._finish()
+        except BaseException as e:
+            with self._cond:
+                self.error = e
+                self._cond.notify_all()
+        tracing.record("download", t0, time.perf_counter() - t0, bytes=self.size, ranges=self.ranges,
+                       ok=self.done)
+        if self._on_complete is not None:
+            self._on_complete(self)
+
+    def _request(self, headers: dict | None = None):
+        req = urllib.request.Request(self.url, headers={"User-Agent": USER_AGENT, **(headers or {})})
+        return urllib.request.urlopen(req, timeout=TIMEOUT_S)
+
+    def _probe(self):
+        """Size, range support and validator from a one-byte range request."""
+        with self._request({"Range": "bytes=0-0"}) as resp:
+            self._etag = resp.headers.get("ETag", "") or resp.headers.get("Last-Modified", "")
+            total = (resp.headers.get("Content-Range") or "").rpartition("/")[2]
+            if resp.status == 206 and total.isdigit():
+                size = int(total)
+            else:
+                self.ranges = False
+                size = int(resp.headers.get("Content-Length") or 0) or None
+        with self._cond:
+            self.size = size
+            self._have = bytearray(_chunks(size)) if size else bytearray()
+            self._urgent = [0, len(self._have) - 1] if self._have else []    # header + moov at the tail
+            self._cond.notify_all()
+
+    def _resume(self):
+        if not self.ranges or not self.size:
+            return
+        try:
+            state = json.loads((self.dir / STATE_NAME).read_text(encoding="utf-8"))
+            if (state.get("size") == self.size and state.get("etag") == self._etag and self.part.exists()
+                    and len(state.get("have", "")) == len(self._have)):
+                with self._cond:
+                    self._have = bytearray(c == "1" for c in state["have"])
+        except (OSError, ValueError):
+            pass
+        with open(self.part, "r+b" if self.part.exists() else "w+b") as f:
+            f.truncate(self.size)   # sparse where the filesystem allows it
+
+    def _next_chunk(self) -> int | None:
+        while self._urgent:
+            i = self._urgent.pop(0)
+            if not self._have[i] and i not in self._inflight:
+                return i
+        n = len(self._have)
+        for i in (*range(self._cursor, n), *range(0, self._cursor)):
+            if not self._have[i] and i not in self._inflight:
+                return i
+        return None
+
+    def _worker(self):
+        with open(self.part, "r+b") as f:
+            while not self._cancel.is_set():
+                with self._cond:
+                    if self.error is not None:
+                        return
+                    i = self._next_chunk()
+                    if i is None:
+                        return
+                    self._inflight.add(i)
+                try:
+                    data = self._fetch(i)
+                    f.seek(i * CHUNK_SIZE)
+                    f.write(data)
+                    f.flush()
+                except BaseException as e:
+                    with self._cond:
+                        self._inflight.discard(i)
+                        self.error = e
+                        self._cond.notify_all()
+                    return
+                with self._cond:
+                    self._inflight.discard(i)
+                    self._have[i] = 1
+                    self._cond.notify_all()
+                self._save_state()
+
+    def _fetch(self, i: int) -> bytes:
+        lo = i * CHUNK_SIZE
+        hi = min(self.size, lo + CHUNK_SIZE) - 1
+        for attempt in range(RETRIES):
+            try:
+                with self._request({"Range": f"bytes={lo}-{hi}"}) as resp:
+                    if resp.status != 206:
+                        raise OSError(f"server ignored the range request (HTTP {resp.status})")
+                    data = resp.read()
+                if len(data) == hi - lo + 1:
+                    return data
+                raise OSError(f"short read for bytes {lo}-{hi}")
+            except OSError:
+                if attempt == RETRIES - 1 or self._cancel.is_set():
+                    raise
+                time.sleep(0.5 * (attempt + 1))
+
+    def _stream(self):
+        """No range support: one sequential GET; chunks become readable as the stream passes them."""
+        with self._request() as resp, open(self.part, "wb") as f:
+            pos = 0
+            while not self._cancel.is_set():
+                block = resp.read(READ_BLOCK)
+                if not block:
+                    break
+                f.write(block)
+                pos += len(block)
+                if self.size and (pos % CHUNK_SIZE < len(block) or pos == self.size):
+                    f.flush()
+                    with self._cond:
+                        for i in range(min(pos // CHUNK_SIZE, len(self._have))):
+                            self._have[i] = 1
+                        self._cond.notify_all()
+        if not self.size:
+            with self._cond:
+                self.size = pos
+                self._have = bytearray(b"\x01" * _chunks(pos))
+
+    def _save_state(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._saved < STATE_EVERY_S:
+            return
+        self._saved = now
+        with self._cond:
+            text = json.dumps({"url": self.url, "size": self.size, "etag": self._etag,
+                               "have": "".join("1" if c else "0" for c in self._have)})
+        try:
+            atomic_write_text(self.dir / STATE_NAME, text)
+        except OSError:
+            pass
+
+    def _finish(self):
+        with self._cond:
+            self._have = bytearray(b"\x01" * len(self._have))
+        # a reader may have the .part open for a moment (Windows won't rename it then)
+        for attempt in range(20):
+            try:
+                os.replace(self.part, self.path)
+                break
+            except PermissionError:
+                if attempt == 19:
+                    raise
+                time.sleep(0.05)
+        try:
+            (self.dir / STATE_NAME).unlink()
+        except OSError:
+            pass
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+
+class UrlCache:
+    """
+    Downloads keyed by url_key(), kept in <root>/<key>/ and evicted by total
+    bytes, least recently opened first (never one that's still downloading).
+    Also owns the loopback server VLC plays unfinished downloads from.
+    """
+
+    def __init__(self, root: Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root) if root else app_cache_dir() / "downloads"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._entries: OrderedDict[str, dict] = OrderedDict()   # key -> {"url", "size"}; oldest first
+        self._active: dict[str, Download] = {}
+        self._server: "_LoopbackServer | None" = None
+        try:
+            data = json.loads((self.root / INDEX_NAME).read_text(encoding="utf-8"))
+            self._entries.update((k, e) for k, e in data.get("entries", []) if (self.root / k).is_dir())
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def open(self, url: str, on_complete: Callable[[Download], None] | None = None) -> Download:
+        """Start (or resume, or reuse) the download; returns at once, the fetch runs on its own threads."""
+        key = url_key(url)
+        with self._lock:
+            d = self._active.get(key)
+            if d is None or d.error is not None:
+                d = Download(url, self.root / key, on_complete=self._completed_cb(on_complete))
+                d.dir.mkdir(parents=True, exist_ok=True)
+                self._active[key] = d
+            self._entries.pop(key, None)
+            self._entries[key] = {"url": url, "size": d.size or 0}
+            self._save_index()
+        if d.done and on_complete is not None:
+            on_complete(d)
+        d.start()
+        return d
+
+    def pending(self, path: Path) -> Download | None:
+        """The unfinished download that will produce `path`, if any."""
+        with self._lock:
+            d = self._active.get(path.parent.name)
+        return d if d is not None and d.path == path and not d.done else None
+
+    def mrl(self, path: Path) -> str | None:
+        """Loopback URL to play `path` from while it's still downloading (None once it's local)."""
+        d = self.pending(path)
+        if d is None:
+            return None
+        with self._lock:
+            if self._server is None:
+                self._server = _LoopbackServer(self._source)
+                threading.Thread(target=self._server.serve_forever, name="url-proxy", daemon=True).start()
+            port = self._server.server_address[1]
+        return f"http://127.0.0.1:{port}/{d.key}/{quote(d.path.name)}"
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e["size"] for e in self._entries.values())
+
+    def close(self):
+        with self._lock:
+            for d in self._active.values():
+                d.cancel()
+                if not d.done:
+                    d._save_state(force=True)
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+                self._server = None
+
+    # ---------- Internals ----------
+    def _source(self, key: str) -> Download | None:
+        with self._lock:
+            return self._active.get(key)
+
+    def _completed_cb(self, user_cb):
+        def done(d: Download):
+            if d.done:
+                with self._lock:
+                    if d.key in self._entries:
+                        self._entries[d.key]["size"] = d.size or 0
+                    self._evict(keep=d.key)
+                    self._save_index()
+            if user_cb is not None:
+                user_cb(d)
+        return done
+
+    def _evict(self, keep: str | None = None):
+        total = sum(e["size"] for e in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            d = self._active.get(key)
+            if key == keep or (d is not None and not d.done and d.error is None):
+                continue
+            total -= self._entries.pop(key)["size"]
+            self._active.pop(key, None)
+            shutil.rmtree(self.root / key, ignore_errors=True)
+
+    def _save_index(self):
+        try:
+            atomic_write_text(self.root / INDEX_NAME,
+                              json.dumps({"version": 1, "entries": list(self._entries.items())}))
+        except OSError:
+            pass
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    GET / HEAD with single byte ranges. `server.resolve(path)` returns a source
+    with `size` and `read_at(offset, n)` (a Download, or a local file for a
+    stand-in CDN), or None for 404. With `server.ranges` False, Range headers
+    are ignored (an origin without range support).
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body: bool):
+        src = self.server.resolve(self.path)
+        size = src.size if src is not None else None
+        if src is not None and size is None:     # unknown until the origin answers
+            try:
+                src.wait_range(0, 1, TIMEOUT_S)
+            except Exception:
+                pass
+            size = src.size
+        if size is None:
+            self.send_error(404)
+            return
+        start, end = 0, size - 1
+        ranges = self.server.ranges
+        m = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range", "")) if ranges else None
+        if m and (m[1] or m[2]):
+            if m[1]:
+                start, end = int(m[1]), min(int(m[2]) if m[2] else size - 1, size - 1)
+            else:
+                start = max(0, size - int(m[2]))
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes" if ranges else "none")
+        self.send_header("Content-Type", mimetypes.guess_type(self.path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not body:
+            return
+        pos = start
+        try:
+            while pos <= end:
+                data = src.read_at(pos, min(SERVE_BLOCK, end - pos + 1))
+                if not data:
+                    break
+                self.wfile.write(data)
+                pos += len(data)
+        except Exception:
+            pass    # player seeked away / closed the connection, or the download failed
+
+
+class _LoopbackServer(ThreadingHTTPServer):
+    daemon_threads = True
+    ranges = True
+
+    def __init__(self, source: Callable[[str], Download | None], port: int = 0):
+        super().__init__(("127.0.0.1", port), RangeHandler)
+        self._source = source
+
+    def resolve(self, path: str):
+        key = urlsplit(path).path.lstrip("/").split("/", 1)[0]
+        return self._source(key)
+
+
+class FileSource:
+    """A local file behind RangeHandler (stand-in CDN for benchmarks and manual testing)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.size = path.stat().st_size
+
+    def wait_range(self, offset: int, length: int, timeout: float | None = None) -> int:
+        return max(0, min(length, self.size - offset))
+
+    def read_at(self, offset: int, length: int) -> bytes:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+def serve_files(files: dict[str, Path], port: int = 0, ranges: bool = True) -> tuple[ThreadingHTTPServer, str]:
+    """
+    HTTP server on loopback for `{name: path}`, range-capable unless `ranges` is
+    False; (server, base URL). Call shutdown() when done.
+    """
+    sources = {quote(name): FileSource(p) for name, p in files.items()}
+    server = _LoopbackServer(lambda key: sources.get(key), port)
+    server.ranges = ranges
+    threading.Thread(target=server.serve_forever, name="url-standin", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _chunks(size: int) -> int:
+    return max(1, (size + CHUNK_SIZE - 1) // CHUNK_SIZE)